@@ -9,9 +9,23 @@ Input:
   Body: {
     "embedding": [512 floats],
     "threshold": 0.3,  // optional, default 0.3
-    "topN": 5          // optional, return top N matches
+    "topN": 5,         // optional, return top N matches (positive integer; null = all)
+    "nprobe": 16,      // optional, IVF cells scanned when IDENTIFY_SEARCH=ivf (positive integer)
+    "shortlist": 50    // optional, persons rescored exactly when IDENTIFY_SEARCH=prototypes
+                       // (positive integer; raised to topN)
   }
 
+  Batch form (e.g. every face in a group photo, scored in one gallery pass):
+  Body: {
+    "queries": [
+      { "embedding": [512 floats], "threshold": 0.4, "topN": 3 },  // per-query overrides optional
+      ...
+    ],
+    "threshold": 0.3,  // optional default for all queries
+    "topN": 5          // optional default for all queries
+  }
+  or { "embeddings": [[512 floats], ...], "threshold": 0.3, "topN": 5 }
+
 Output:
   {
     "matches": [
@@ -24,6 +38,9 @@ Output:
       }
     ]
   }
+
+  Batch output: { "results": [{ "matches": [...], "threshold": 0.3, "topN": 5 }, ...],
+                  "timings": { "loadMs": 1.2, "computeMs": 8.4 }, ... }
 """
 
 import azure.functions as func
@@ -31,25 +48,92 @@ import logging
 import json
 import sys
 import os
-import pyodbc
+import math
+import time
 import numpy as np
 
 # Add shared_python to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from shared_python.insightface_utils import match_face_against_embeddings, cosine_similarity
+from shared_python.db_pool import get_pool
+from shared_python.embedding_index import get_embedding_index
+
+EMBEDDING_DIMENSIONS = 512
+MAX_BATCH_QUERIES = 64
+
+
+def _threshold_error(value):
+    """Error message if value is not a usable similarity threshold, else None."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        return f'threshold must be a number, got {value!r}'
+    return None
 
 
-def get_db_connection():
-    """Get database connection using environment variables."""
-    conn_str = (
-        f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-        f"SERVER={os.environ['DB_SERVER']};"
-        f"DATABASE={os.environ['DB_DATABASE']};"
-        f"UID={os.environ['DB_USER']};"
-        f"PWD={os.environ['DB_PASSWORD']}"
-    )
-    return pyodbc.connect(conn_str)
+def _positive_int_error(name, value):
+    """Error message if value is neither a positive integer nor null, else None."""
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        return f'{name} must be a positive integer, got {value!r}'
+    return None
+
+
+def parse_queries(req_body):
+    """
+    Normalize single and batch request bodies to a list of queries.
+    
+    Returns:
+        (queries, error): queries is a list of dicts with embedding, threshold, topN;
+        error is a message string if the body is invalid
+    """
+    default_threshold = req_body.get('threshold', 0.3)  # Default 0.3 for cosine similarity
+    default_top_n = req_body.get('topN', 5)  # Return top 5 by default
+    error = _threshold_error(default_threshold) or _positive_int_error('topN', default_top_n)
+    if error:
+        return None, error
+    
+    if 'queries' in req_body:
+        items = req_body.get('queries')
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return None, 'queries must be a list of objects'
+    elif 'embeddings' in req_body:
+        items = req_body.get('embeddings')
+        if not isinstance(items, list):
+            return None, 'embeddings must be a list of embedding arrays'
+        items = [{'embedding': embedding} for embedding in items]
+    else:
+        items = [{'embedding': req_body.get('embedding')}]
+    
+    if not items:
+        return None, 'at least one query embedding is required'
+    if len(items) > MAX_BATCH_QUERIES:
+        return None, f'At most {MAX_BATCH_QUERIES} queries per request, got {len(items)}'
+    
+    queries = []
+    for i, item in enumerate(items):
+        embedding = item.get('embedding')
+        prefix = f'queries[{i}]: ' if len(items) > 1 else ''
+        
+        if not embedding or not isinstance(embedding, list):
+            return None, f'{prefix}embedding array required in request body'
+        
+        # Validate embedding dimensions
+        if len(embedding) != EMBEDDING_DIMENSIONS:
+            return None, f'{prefix}Expected {EMBEDDING_DIMENSIONS}-dim embedding, got {len(embedding)}'
+        
+        threshold = item.get('threshold', default_threshold)
+        top_n = item.get('topN', default_top_n)
+        error = _threshold_error(threshold) or _positive_int_error('topN', top_n)
+        if error:
+            return None, f'{prefix}{error}'
+        
+        queries.append({
+            'embedding': embedding,
+            'threshold': threshold,
+            'topN': top_n
+        })
+    
+    return queries, None
 
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
@@ -66,109 +150,90 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 mimetype='application/json'
             )
         
-        # Extract parameters
-        embedding = req_body.get('embedding')
-        if not embedding or not isinstance(embedding, list):
-            return func.HttpResponse(
-                json.dumps({'error': 'embedding array required in request body'}),
-                status_code=400,
-                mimetype='application/json'
+        is_batch = 'queries' in req_body or 'embeddings' in req_body
+        queries, error = parse_queries(req_body)
+        if not error:
+            error = (
+                _positive_int_error('nprobe', req_body.get('nprobe'))
+                or _positive_int_error('shortlist', req_body.get('shortlist'))
             )
-        
-        # Validate embedding dimensions
-        if len(embedding) != 512:
+        if error:
             return func.HttpResponse(
-                json.dumps({'error': f'Expected 512-dim embedding, got {len(embedding)}'}),
+                json.dumps({'error': error}),
                 status_code=400,
                 mimetype='application/json'
             )
         
-        # Convert to numpy array
-        query_embedding = np.array(embedding, dtype=np.float32)
-        
-        # Get threshold and topN from request (with defaults)
-        threshold = req_body.get('threshold', 0.3)  # Default 0.3 for cosine similarity
-        top_n = req_body.get('topN', 5)  # Return top 5 by default
-        
-        logging.info(f"Matching face with threshold={threshold}, topN={top_n}")
-        
-        # Get all InsightFace embeddings from database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Only fetch InsightFace embeddings (512-dim)
-        query = """
-            SELECT 
-                fe.ID,
-                fe.PersonID,
-                ne.neName as PersonName,
-                fe.Embedding,
-                fe.PhotoFileName
-            FROM FaceEmbeddings fe
-            JOIN NameEvent ne ON fe.PersonID = ne.ID
-            WHERE fe.ModelVersion = 'insightface-arcface'
-            AND fe.EmbeddingDimensions = 512
-        """
-        
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        
-        if len(rows) == 0:
+        # Convert to numpy matrix (one row per query face)
+        query_embeddings = np.array([q['embedding'] for q in queries], dtype=np.float32)
+        
+        logging.info(f"Matching {len(queries)} face(s), thresholds={[q['threshold'] for q in queries]}")
+        
+        # Get InsightFace embeddings from the in-process index (refreshed incrementally)
+        load_started = time.perf_counter()
+        index = get_embedding_index(get_pool().acquire)
+        gallery = index.get_gallery()
+        load_ms = (time.perf_counter() - load_started) * 1000
+        
+        if len(gallery) == 0:
             logging.warning("No InsightFace embeddings found in database")
+            empty_body = {
+                'matches': [],
+                'message': 'No InsightFace embeddings in database. Train faces first with InsightFace model.'
+            }
+            if is_batch:
+                empty_body['results'] = [
+                    {'matches': [], 'threshold': q['threshold'], 'topN': q['topN']} for q in queries
+                ]
             return func.HttpResponse(
-                json.dumps({
-                    'matches': [],
-                    'message': 'No InsightFace embeddings in database. Train faces first with InsightFace model.'
-                }),
+                json.dumps(empty_body),
                 status_code=200,
                 mimetype='application/json'
             )
         
-        logging.info(f"Loaded {len(rows)} InsightFace embeddings from database")
-        
-        # Convert rows to list of dicts
-        stored_embeddings = []
-        for row in rows:
-            try:
-                embedding_json = json.loads(row.Embedding)
-                stored_embeddings.append({
-                    'ID': row.ID,
-                    'PersonID': row.PersonID,
-                    'PersonName': row.PersonName,
-                    'Embedding': embedding_json,
-                    'PhotoFileName': row.PhotoFileName
-                })
-            except json.JSONDecodeError:
-                logging.error(f"Failed to parse embedding for ID {row.ID}")
-                continue
-        
-        cursor.close()
-        conn.close()
-        
-        # Match faces using InsightFace utilities
-        matches = match_face_against_embeddings(
-            query_embedding,
-            stored_embeddings,
-            threshold=threshold
+        logging.info(f"Using {len(gallery)} InsightFace embeddings from index")
+        
+        # Match all query faces in one pass over the gallery (exact, IVF or prototypes, per IDENTIFY_SEARCH)
+        compute_started = time.perf_counter()
+        results = index.match_faces(
+            gallery,
+            query_embeddings,
+            thresholds=[q['threshold'] for q in queries],
+            top_ks=[q['topN'] for q in queries],
+            nprobe=req_body.get('nprobe'),
+            shortlist=req_body.get('shortlist')
         )
-        
-        # Limit to topN results
-        matches = matches[:top_n]
+        compute_ms = (time.perf_counter() - compute_started) * 1000
         
         # Log top matches
-        if len(matches) > 0:
-            logging.info(f"Top 3 matches: {[f\"{m['personName']}: {m['similarity']:.2%}\" for m in matches[:3]]}")
+        for matches in results:
+            if len(matches) > 0:
+                top_matches = [f"{m['personName']}: {m['similarity']:.2%}" for m in matches[:3]]
+                logging.info(f"Top 3 matches: {top_matches}")
+            else:
+                logging.info("No matches above threshold")
+        
+        response = {
+            'totalEmbeddings': len(gallery),
+            'model': index.model_version,
+            'dimensions': EMBEDDING_DIMENSIONS,
+            'timings': {
+                'loadMs': round(load_ms, 2),
+                'computeMs': round(compute_ms, 2)
+            }
+        }
+        
+        if is_batch:
+            response['results'] = [
+                {'matches': matches, 'threshold': q['threshold'], 'topN': q['topN']}
+                for q, matches in zip(queries, results)
+            ]
         else:
-            logging.info(f"No matches above threshold {threshold}")
+            response['matches'] = results[0]
+            response['threshold'] = queries[0]['threshold']
         
         return func.HttpResponse(
-            json.dumps({
-                'matches': matches,
-                'totalEmbeddings': len(stored_embeddings),
-                'threshold': threshold,
-                'model': 'insightface-arcface',
-                'dimensions': 512
-            }),
+            json.dumps(response),
             status_code=200,
             mimetype='application/json'
         )
@@ -3,10 +3,11 @@ import logging
 import azure.functions as func
 import sys
 import os
+from itertools import groupby
 
 # Add parent directory to path for shared utilities
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from shared_python.utils import check_authorization, query_db, execute_db
+from shared_python.utils import check_authorization, query_db, execute_db, db_transaction
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """
@@ -15,9 +16,22 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     GET /api/faces/review?limit=50
     Returns unconfirmed face suggestions
     
+    GET /api/faces/review?view=clusters&limit=20&samples=6
+    Returns clusters of unlabeled faces (scripts/cluster_faces.py), largest first
+    
     POST /api/faces/review
     Body: { "action": "confirm|reject", "faceId": 123, "personId": 5 }
     Confirms or rejects a face match
+    
+    POST /api/faces/review
+    Body: { "action": "confirmCluster", "clusterId": 42, "personId": 5, "excludeFaceIds": [7] }
+    Confirms every unlabeled face of a cluster as one person, except the excluded ones
+    
+    POST /api/faces/review
+    Body: { "actions": [ { "action": "confirm", "faceId": 123, "personId": 5 },
+                         { "action": "reject", "faceId": 124 } ] }
+    Applies up to MAX_BULK_ACTIONS confirm/reject actions in one transaction and
+    returns one result per action (invalid or unknown items are skipped, not applied)
     """
     logging.info('Face review function processing request')
     
@@ -33,6 +47,8 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     method = req.method
     
     if method == 'GET':
+        if req.params.get('view') == 'clusters':
+            return handle_get_clusters(req)
         return handle_get_faces_for_review(req)
     elif method == 'POST':
         return handle_confirm_or_reject(req)
@@ -93,6 +109,246 @@ def handle_get_faces_for_review(req):
             mimetype='application/json'
         )
 
+def handle_get_clusters(req):
+    """Get clusters of unlabeled faces with a few sample faces each"""
+    try:
+        limit = int(req.params.get('limit', '20'))
+        samples = int(req.params.get('samples', '6'))
+        
+        clusters = query_db("""
+        SELECT TOP (?)
+            ClusterID,
+            COUNT(*) as FaceCount,
+            COUNT(DISTINCT PFileName) as PhotoCount
+        FROM dbo.FaceEncodings
+        WHERE ClusterID IS NOT NULL
+            AND PersonID IS NULL
+        GROUP BY ClusterID
+        ORDER BY COUNT(*) DESC, ClusterID
+        """, (limit,))
+        
+        if clusters:
+            placeholders = ','.join('?' * len(clusters))
+            sample_faces = query_db(f"""
+            SELECT ClusterID, FaceID, PFileName, BoundingBox
+            FROM (
+                SELECT
+                    ClusterID, FaceID, PFileName, BoundingBox,
+                    ROW_NUMBER() OVER (PARTITION BY ClusterID ORDER BY Confidence DESC, FaceID) as rn
+                FROM dbo.FaceEncodings
+                WHERE ClusterID IN ({placeholders})
+                    AND PersonID IS NULL
+            ) s
+            WHERE rn <= ?
+            ORDER BY ClusterID, rn
+            """, tuple(c['ClusterID'] for c in clusters) + (samples,))
+            
+            by_cluster = {c['ClusterID']: c for c in clusters}
+            for cluster in clusters:
+                cluster['SampleFaces'] = []
+            for face in sample_faces:
+                cluster_id = face.pop('ClusterID')
+                if face['BoundingBox']:
+                    face['BoundingBox'] = json.loads(face['BoundingBox'])
+                by_cluster[cluster_id]['SampleFaces'].append(face)
+        
+        return func.HttpResponse(
+            json.dumps({
+                'success': True,
+                'clusters': clusters,
+                'count': len(clusters)
+            }),
+            status_code=200,
+            mimetype='application/json'
+        )
+    
+    except Exception as e:
+        logging.error(f"Failed to get face clusters: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({'error': f'Failed to get clusters: {str(e)}'}),
+            status_code=500,
+            mimetype='application/json'
+        )
+
+def _is_id(value):
+    """True for a JSON integer (JSON true/false would otherwise pass as 1/0)"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def handle_confirm_cluster(req_body):
+    """Confirm all unlabeled faces of a cluster as one person"""
+    cluster_id = req_body.get('clusterId')
+    person_id = req_body.get('personId')
+    exclude_face_ids = req_body.get('excludeFaceIds') or []
+    
+    if not _is_id(cluster_id) or not _is_id(person_id):
+        return func.HttpResponse(
+            json.dumps({'error': 'clusterId and personId (integers) are required for confirmCluster action'}),
+            status_code=400,
+            mimetype='application/json'
+        )
+    if not isinstance(exclude_face_ids, list) or not all(_is_id(face_id) for face_id in exclude_face_ids):
+        return func.HttpResponse(
+            json.dumps({'error': 'excludeFaceIds must be a list of face IDs (integers)'}),
+            status_code=400,
+            mimetype='application/json'
+        )
+    exclude = set(exclude_face_ids)
+    
+    try:
+        # One transaction: the cluster is confirmed completely or not at all
+        with db_transaction() as conn:
+            face_ids = [
+                row['FaceID']
+                for row in query_db(
+                    "SELECT FaceID FROM dbo.FaceEncodings WITH (UPDLOCK) "
+                    "WHERE ClusterID = ? AND PersonID IS NULL ORDER BY FaceID",
+                    (cluster_id,)
+                )
+                if row['FaceID'] not in exclude
+            ]
+            
+            if face_ids:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    "EXEC dbo.sp_ConfirmFaceMatch ?, ?",
+                    [(face_id, person_id) for face_id in face_ids]
+                )
+                cursor.close()
+        
+        if not face_ids:
+            # Unknown cluster, already confirmed, or from an earlier clustering run
+            return func.HttpResponse(
+                json.dumps({'error': f'No unlabeled faces in cluster {cluster_id}'}),
+                status_code=404,
+                mimetype='application/json'
+            )
+        
+        logging.info(f"Confirmed {len(face_ids)} faces of cluster {cluster_id} as person {person_id}")
+        
+        return func.HttpResponse(
+            json.dumps({
+                'success': True,
+                'message': 'Face cluster confirmed',
+                'clusterId': cluster_id,
+                'personId': person_id,
+                'confirmed': len(face_ids),
+                'faceIds': face_ids
+            }),
+            status_code=200,
+            mimetype='application/json'
+        )
+    
+    except Exception as e:
+        logging.error(f"Failed to confirm face cluster {cluster_id}: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({'error': f'Failed to confirm face cluster: {str(e)}'}),
+            status_code=500,
+            mimetype='application/json'
+        )
+
+# Stored procedure call and parameters per review action
+BULK_ACTIONS = {
+    'confirm': ("EXEC dbo.sp_ConfirmFaceMatch ?, ?", lambda item: (item['faceId'], item['personId'])),
+    'reject': ("EXEC dbo.sp_RejectFaceMatch ?", lambda item: (item['faceId'],))
+}
+
+# Keeps the IN lists of the existence checks well under SQL Server's 2100 parameters
+MAX_BULK_ACTIONS = 500
+
+def _validate_bulk_item(item):
+    """Return an error message for a malformed bulk action, or None"""
+    if not isinstance(item, dict):
+        return 'Each action must be an object'
+    if item.get('action') not in BULK_ACTIONS:
+        return f'Invalid action: {item.get("action")}. Must be "confirm" or "reject"'
+    if not _is_id(item.get('faceId')):
+        return 'faceId is required'
+    if item['action'] == 'confirm' and not _is_id(item.get('personId')):
+        return 'personId is required for confirm action'
+    return None
+
+def _existing_ids(sql, ids):
+    """Subset of ids returned by sql, which selects one column WHERE ... IN ({placeholders})"""
+    ids = sorted(set(ids))
+    if not ids:
+        return set()
+    rows = query_db(sql.format(placeholders=','.join('?' * len(ids))), tuple(ids))
+    return {next(iter(row.values())) for row in rows}
+
+def handle_bulk_actions(actions):
+    """Apply a list of confirm/reject actions in one connection and transaction"""
+    if not isinstance(actions, list) or not actions:
+        return func.HttpResponse(
+            json.dumps({'error': 'actions must be a non-empty list'}),
+            status_code=400,
+            mimetype='application/json'
+        )
+    if len(actions) > MAX_BULK_ACTIONS:
+        return func.HttpResponse(
+            json.dumps({'error': f'At most {MAX_BULK_ACTIONS} actions per request'}),
+            status_code=400,
+            mimetype='application/json'
+        )
+    
+    results = []
+    for index, item in enumerate(actions):
+        error = _validate_bulk_item(item)
+        result = {'index': index, 'success': error is None}
+        if isinstance(item, dict):
+            result.update({k: item.get(k) for k in ('action', 'faceId', 'personId') if item.get(k) is not None})
+        if error:
+            result['error'] = error
+        results.append(result)
+    
+    try:
+        with db_transaction() as conn:
+            valid = [(result, actions[result['index']]) for result in results if result['success']]
+            
+            # Unknown faces/persons are reported per item instead of failing the whole batch
+            faces = _existing_ids(
+                "SELECT FaceID FROM dbo.FaceEncodings WHERE FaceID IN ({placeholders})",
+                [item['faceId'] for _, item in valid]
+            )
+            persons = _existing_ids(
+                "SELECT ID FROM dbo.NameEvent WHERE ID IN ({placeholders})",
+                [item['personId'] for _, item in valid if item['action'] == 'confirm']
+            )
+            for result, item in valid:
+                if item['faceId'] not in faces:
+                    result.update(success=False, error=f'Face {item["faceId"]} not found')
+                elif item['action'] == 'confirm' and item['personId'] not in persons:
+                    result.update(success=False, error=f'Person {item["personId"]} not found')
+            
+            applied = [item for result, item in valid if result['success']]
+            cursor = conn.cursor()
+            # Consecutive actions of one kind share an executemany; runs keep request order
+            for action, run in groupby(applied, key=lambda item: item['action']):
+                sql, params = BULK_ACTIONS[action]
+                cursor.executemany(sql, [params(item) for item in run])
+            cursor.close()
+    
+    except Exception as e:
+        logging.error(f"Failed to apply {len(actions)} face review actions: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({'error': f'Failed to apply face review actions, none were applied: {str(e)}'}),
+            status_code=500,
+            mimetype='application/json'
+        )
+    
+    succeeded = sum(1 for result in results if result['success'])
+    logging.info(f"Applied {succeeded} of {len(actions)} face review actions")
+    
+    return func.HttpResponse(
+        json.dumps({
+            'success': True,
+            'applied': succeeded,
+            'failed': len(results) - succeeded,
+            'results': results
+        }),
+        status_code=200,
+        mimetype='application/json'
+    )
+
 def handle_confirm_or_reject(req):
     """Confirm or reject a face match"""
     try:
@@ -104,7 +360,13 @@ def handle_confirm_or_reject(req):
             mimetype='application/json'
         )
     
+    if 'actions' in req_body:
+        return handle_bulk_actions(req_body.get('actions'))
+    
     action = req_body.get('action')
+    if action == 'confirmCluster':
+        return handle_confirm_cluster(req_body)
+    
     face_id = req_body.get('faceId')
     person_id = req_body.get('personId')  # Can be different from suggested
     
@@ -160,7 +422,7 @@ def handle_confirm_or_reject(req):
         
         else:
             return func.HttpResponse(
-                json.dumps({'error': f'Invalid action: {action}. Must be "confirm" or "reject"'}),
+                json.dumps({'error': f'Invalid action: {action}. Must be "confirm", "reject" or "confirmCluster"'}),
                 status_code=400,
                 mimetype='application/json'
             )
@@ -8,6 +8,30 @@ Input:
   POST /api/generate-embeddings
   Body: { "imageUrl": "https://..." } or multipart/form-data with image file
 
+  Every-face mode (group photos, one detection pass), via query string or JSON body:
+    allFaces=true
+    minFaceSize=40          // optional, skip faces smaller than this (pixels)
+    minScore=0.5            // optional, skip faces with lower detection confidence
+    maxFaces=20             // optional, keep the largest N faces
+    embeddingFormat=json    // json (default) | base64 | base64-float16 (see embedding_codec)
+
+  Count-only mode (detector only, no embeddings): countOnly=true, with optional
+  minFaceSize / minScore as above. Returns { "success": true, "faceCount": 4, "model": ... }
+
+  Batch mode (JSON body):
+  Body: {
+    "images": ["photo1.jpg", "https://<account>.blob.core.windows.net/...", ...],  // blob names or URLs
+    "allFaces": true,   // optional, every-face options above apply to each image
+    "countOnly": true,  // optional, face counts only
+    "maxFaces": 3       // optional, single-face mode limit
+  }
+  Images are downloaded and decoded concurrently while the model runs;
+  the response is NDJSON (application/x-ndjson), one line per image in
+  completion order, followed by a summary line:
+    {"index": 2, "source": "photo3.jpg", "success": true, ..., "timings": {...}}
+    {"index": 0, "source": "photo1.jpg", "success": false, "error": "...", "timings": {...}}
+    {"done": true, "total": 3, "succeeded": 2, "failed": 1, "elapsedMs": 840.5}
+
 Output:
   {
     "success": true,
@@ -15,7 +39,22 @@ Output:
     "confidence": 0.99,
     "faceCount": 1,
     "dimensions": 512,
-    "model": "buffalo_l_arcface"
+    "model": "buffalo_l_arcface",         // <INSIGHTFACE_MODEL_PACK>_arcface
+    "modelVersion": "insightface-arcface" // FaceEmbeddings.ModelVersion to store with the embedding
+  }
+
+  Every-face output:
+  {
+    "success": true,
+    "faces": [
+      { "embedding": [512 floats] or "<base64>", "bbox": [x1, y1, x2, y2],
+        "landmarks": [[x, y] x 5], "score": 0.99 }
+    ],
+    "faceCount": 4,
+    "dimensions": 512,
+    "model": "buffalo_l_arcface",
+    "modelVersion": "insightface-arcface",
+    "embeddingFormat": "json"
   }
 """
 
@@ -24,15 +63,250 @@ import logging
 import json
 import sys
 import os
+import time
+import base64
 
 # Add shared_python to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from shared_python.insightface_utils import generate_face_embedding
+from shared_python.insightface_utils import (
+    MODEL_PACK,
+    count_faces,
+    load_detection_input,
+    extract_all_faces,
+    generate_face_embedding,
+    get_model_version
+)
+from shared_python.embedding_codec import encode_embedding
+from shared_python.embedding_pipeline import fetch_url, iter_pipeline, make_blob_fetcher
+from shared_python.model_startup import record_embedding, start_background_load
 from azure.storage.blob import BlobServiceClient
 from io import BytesIO
 import requests
 
+EMBEDDING_FORMATS = {'json', 'base64', 'base64-float16'}
+MODEL_NAME = f'{MODEL_PACK}_arcface'
+
+# Batch mode limits (one HTTP call must finish within the function timeout)
+MAX_BATCH_IMAGES = 200
+BATCH_WORKERS = int(os.environ.get('EMBEDDING_BATCH_WORKERS', '8'))
+BATCH_QUEUE_SIZE = int(os.environ.get('EMBEDDING_BATCH_QUEUE_SIZE', '8'))
+
+# Load and warm up the model while the worker starts, not in the first request
+start_background_load()
+
+
+def get_option(req, req_body, name):
+    """Read an option from the query string, falling back to the JSON body."""
+    value = req.params.get(name)
+    if value is None and isinstance(req_body, dict):
+        value = req_body.get(name)
+    return value
+
+
+def parse_flag(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+def format_embedding(embedding, embedding_format):
+    """Serialize an embedding compactly: rounded floats or base64 of the binary codec."""
+    if embedding_format == 'json':
+        return [round(float(v), 6) for v in embedding]
+    dtype = 'float16' if embedding_format == 'base64-float16' else 'float32'
+    return base64.b64encode(encode_embedding(embedding, dtype=dtype)).decode('ascii')
+
+
+def format_face(face, embedding_format):
+    landmarks = face['landmarks']
+    return {
+        'embedding': format_embedding(face['embedding'], embedding_format),
+        'bbox': [round(v, 1) for v in face['bbox']],
+        'landmarks': [[round(x, 1), round(y, 1)] for x, y in landmarks] if landmarks else None,
+        'score': round(face['det_score'], 4)
+    }
+
+
+def parse_all_faces_options(req, req_body):
+    """
+    Read the every-face filters and output format.
+    
+    Returns:
+        (options, error): options holds extract_all_faces kwargs plus
+        embedding_format; error is a message string if an option is invalid
+    """
+    try:
+        min_face_size = int(get_option(req, req_body, 'minFaceSize') or 0)
+        min_score = float(get_option(req, req_body, 'minScore') or 0)
+        max_faces = get_option(req, req_body, 'maxFaces')
+        max_faces = int(max_faces) if max_faces is not None else None
+    except (TypeError, ValueError):
+        return None, 'minFaceSize, minScore and maxFaces must be numbers'
+    
+    embedding_format = get_option(req, req_body, 'embeddingFormat') or 'json'
+    if embedding_format not in EMBEDDING_FORMATS:
+        return None, f"embeddingFormat must be one of {sorted(EMBEDDING_FORMATS)}"
+    
+    return {
+        'min_face_size': min_face_size,
+        'min_det_score': min_score,
+        'max_faces': max_faces,
+        'embedding_format': embedding_format
+    }, None
+
+
+def all_faces_result(image, options):
+    """Every face from one detection pass, as a response dict."""
+    faces = extract_all_faces(
+        image,
+        min_face_size=options['min_face_size'],
+        min_det_score=options['min_det_score'],
+        max_faces=options['max_faces']
+    )
+    if faces:
+        record_embedding()
+    return {
+        'success': True,
+        'faces': [format_face(face, options['embedding_format']) for face in faces],
+        'faceCount': len(faces),
+        'dimensions': len(faces[0]['embedding']) if faces else 512,
+        'model': MODEL_NAME,
+        'modelVersion': get_model_version(),
+        'embeddingFormat': options['embedding_format']
+    }
+
+
+def count_result(image, options):
+    """Face count from the detector alone, as a response dict."""
+    return {
+        'success': True,
+        'faceCount': count_faces(
+            image,
+            min_face_size=options['min_face_size'],
+            min_det_score=options['min_det_score']
+        ),
+        'model': MODEL_NAME
+    }
+
+
+def single_face_result(image, max_faces):
+    """Embedding of the main subject, as a response dict."""
+    result = generate_face_embedding(image, max_faces=max_faces)
+    
+    if result is None:
+        return {
+            'success': False,
+            'error': 'No suitable face found in image'
+        }
+    
+    record_embedding()
+    
+    # Convert numpy array to list for JSON serialization
+    embedding_list = result['embedding'].tolist()
+    
+    return {
+        'success': True,
+        'embedding': embedding_list,
+        'confidence': result['confidence'],
+        'faceCount': result['face_count'],
+        'dimensions': len(embedding_list),
+        'model': MODEL_NAME,
+        'modelVersion': get_model_version()
+    }
+
+
+def parse_max_faces(req, req_body, default=3):
+    try:
+        return int(get_option(req, req_body, 'maxFaces') or default)
+    except (TypeError, ValueError):
+        return default
+
+
+def batch_response(req, req_body):
+    """
+    Handle { "images": [...] }: pipelined download/decode/inference, NDJSON out.
+    
+    One line per image in completion order (with its input "index"), then a
+    summary line. Per-image failures are reported inline.
+    """
+    images = req_body.get('images')
+    if not isinstance(images, list) or not images or not all(isinstance(i, str) and i for i in images):
+        return func.HttpResponse(
+            json.dumps({'error': 'images must be a non-empty list of blob names or URLs'}),
+            status_code=400,
+            mimetype='application/json'
+        )
+    
+    if len(images) > MAX_BATCH_IMAGES:
+        return func.HttpResponse(
+            json.dumps({'error': f'At most {MAX_BATCH_IMAGES} images per batch'}),
+            status_code=400,
+            mimetype='application/json'
+        )
+    
+    count_only = parse_flag(get_option(req, req_body, 'countOnly'))
+    if count_only or parse_flag(get_option(req, req_body, 'allFaces')):
+        options, error = parse_all_faces_options(req, req_body)
+        if error:
+            return func.HttpResponse(
+                json.dumps({'error': error}),
+                status_code=400,
+                mimetype='application/json'
+            )
+        if count_only:
+            infer = lambda image: count_result(image, options)
+        else:
+            infer = lambda image: all_faces_result(image, options)
+    else:
+        max_faces = parse_max_faces(req, req_body)
+        infer = lambda image: single_face_result(image, max_faces)
+    
+    connection_string = os.environ.get('AZURE_STORAGE_CONNECTION_STRING')
+    if connection_string:
+        fetch = make_blob_fetcher(
+            connection_string,
+            os.environ.get('BLOB_CONTAINER_NAME', 'family-album-media')
+        )
+    else:
+        fetch = fetch_url
+    
+    started = time.perf_counter()
+    lines = []
+    succeeded = 0
+    for item in iter_pipeline(
+        images,
+        fetch=fetch,
+        decode=load_detection_input,
+        infer=infer,
+        workers=BATCH_WORKERS,
+        queue_size=BATCH_QUEUE_SIZE
+    ):
+        line = {'index': item['index'], 'source': item['source']}
+        if 'error' in item:
+            line.update({'success': False, 'error': item['error']})
+        else:
+            line.update(item['result'])
+        line['timings'] = item['timings']
+        succeeded += int(line['success'])
+        lines.append(json.dumps(line, separators=(',', ':')))
+    
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    logging.info(f"Batch embedded {succeeded}/{len(images)} images in {elapsed_ms:.0f}ms")
+    lines.append(json.dumps({
+        'done': True,
+        'total': len(images),
+        'succeeded': succeeded,
+        'failed': len(images) - succeeded,
+        'elapsedMs': round(elapsed_ms, 1)
+    }))
+    
+    return func.HttpResponse(
+        '\n'.join(lines) + '\n',
+        status_code=200,
+        mimetype='application/x-ndjson'
+    )
+
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Generate embeddings endpoint called')
@@ -40,6 +314,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     try:
         # Get image from request (either URL or file upload)
         content_type = req.headers.get('Content-Type', '')
+        req_body = None
         
         if 'multipart/form-data' in content_type:
             # Handle file upload
@@ -65,6 +340,10 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                     mimetype='application/json'
                 )
             
+            # Batch mode: many images in one call, NDJSON response
+            if isinstance(req_body, dict) and 'images' in req_body:
+                return batch_response(req, req_body)
+            
             image_url = req_body.get('imageUrl')
             if not image_url:
                 return func.HttpResponse(
@@ -94,39 +373,28 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                     mimetype='application/json'
                 )
         
-        # Optional: max_faces parameter (default 3)
-        max_faces = 3
-        if req.params.get('maxFaces'):
-            try:
-                max_faces = int(req.params.get('maxFaces'))
-            except ValueError:
-                pass
-        
-        # Generate embedding using InsightFace
-        result = generate_face_embedding(image_bytes, max_faces=max_faces)
-        
-        if result is None:
+        # Count-only mode (detector only) or every-face mode instead of the main subject
+        count_only = parse_flag(get_option(req, req_body, 'countOnly'))
+        if count_only or parse_flag(get_option(req, req_body, 'allFaces')):
+            options, error = parse_all_faces_options(req, req_body)
+            if error:
+                return func.HttpResponse(
+                    json.dumps({'error': error}),
+                    status_code=400,
+                    mimetype='application/json'
+                )
+            result = count_result(image_bytes, options) if count_only else all_faces_result(image_bytes, options)
             return func.HttpResponse(
-                json.dumps({
-                    'success': False,
-                    'error': 'No suitable face found in image'
-                }),
+                json.dumps(result, separators=(',', ':')),
                 status_code=200,
                 mimetype='application/json'
             )
         
-        # Convert numpy array to list for JSON serialization
-        embedding_list = result['embedding'].tolist()
+        # Generate embedding using InsightFace (optional maxFaces, default 3)
+        result = single_face_result(image_bytes, parse_max_faces(req, None))
         
         return func.HttpResponse(
-            json.dumps({
-                'success': True,
-                'embedding': embedding_list,
-                'confidence': result['confidence'],
-                'faceCount': result['face_count'],
-                'dimensions': len(embedding_list),
-                'model': 'buffalo_l_arcface'
-            }),
+            json.dumps(result),
             status_code=200,
             mimetype='application/json'
         )
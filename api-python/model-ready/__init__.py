@@ -0,0 +1,67 @@
+"""
+Azure Function: InsightFace model readiness
+
+GET /api/model-ready
+  200 when the model is loaded and warmed up, 503 while loading or after a
+  failed load, so a warm-up ping or health check can wait for the worker.
+
+  Anonymous callers only get the status:
+  { "ready": true, "status": "ready" }   // status: idle | loading | ready | failed
+
+  Admin users (Static Web Apps authentication) also get timings, configuration,
+  cache stats (model, embedding and authorization caches) and the load error:
+  {
+    "ready": true,
+    "status": "ready",
+    "pack": "buffalo_l",
+    "modules": ["detection", "recognition"],
+    "loadMs": 2140.3,
+    "warmupMs": 180.6,
+    "timeToFirstEmbeddingMs": 9120.4,  // null until the first embedding
+    "uptimeMs": 45012.7,
+    "failures": 0,
+    "onnxCache": { "cache_hits": 2, "cache_writes": 0, "cache_errors": 0 },
+    "embeddingCache": { "enabled": true, "hits": 41, "memory_hits": 30, "disk_hits": 11,
+                        "misses": 9, "hit_rate": 0.82, "memory": {...}, "disk": {...}, ... },
+    "authCache": { "size": 3, "hits": 120, "misses": 14, "hit_rate": 0.8955, "db_calls_saved": 120, ... },
+    "error": null
+  }
+
+A call to a worker that has not started loading (INSIGHTFACE_EAGER_LOAD=false),
+or whose load failed longer ago than the retry backoff, starts the background load.
+"""
+
+import azure.functions as func
+import logging
+import json
+import sys
+import os
+
+# Add shared_python to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_python.model_startup import get_readiness, start_background_load
+from shared_python.utils import check_authorization, get_user_cache_stats
+
+start_background_load()
+
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    start_background_load(force=True)
+    readiness = get_readiness()
+
+    if readiness['status'] == 'failed':
+        logging.warning(f"Model readiness check: load failed: {readiness['error']}")
+
+    # Errors and cache internals are for admins; health checks only need the status
+    authorized, _, _ = check_authorization(req, 'Admin')
+    if authorized:
+        body = dict(readiness, authCache=get_user_cache_stats())
+    else:
+        body = {'ready': readiness['ready'], 'status': readiness['status']}
+
+    return func.HttpResponse(
+        json.dumps(body),
+        status_code=200 if readiness['ready'] else 503,
+        mimetype='application/json'
+    )
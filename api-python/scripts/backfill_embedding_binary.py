@@ -0,0 +1,133 @@
+"""
+Backfill FaceEmbeddings.EmbeddingBinary from the JSON Embedding column.
+
+Converts rows in ID order, one batch per transaction. Only rows with
+EmbeddingBinary IS NULL are read, so the job can be stopped at any time and
+simply re-run to continue; --start-after-id skips ahead explicitly.
+
+Requires database/add-embedding-binary-column.sql and AZURE_SQL_CONNECTIONSTRING.
+
+Usage:
+    python scripts/backfill_embedding_binary.py --batch-size 500
+    python scripts/backfill_embedding_binary.py --dtype float16 --model-version insightface-arcface
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_python.utils import get_db_connection
+from shared_python.embedding_codec import decode_embedding, encode_embedding
+
+SELECT_BATCH = """
+    SELECT TOP (?) ID, Embedding, EmbeddingDimensions,
+        CAST(UpdatedDate AS DATETIME2(6)) AS UpdatedDate
+    FROM dbo.FaceEmbeddings
+    WHERE EmbeddingBinary IS NULL
+    AND ID > ?
+    {model_filter}
+    ORDER BY ID
+"""
+
+# UpdatedDate guard: skip rows whose JSON changed after we read them.
+# Compared at microsecond precision on both sides: GETDATE() fills the 100ns
+# digit of DATETIME2(7), which a Python datetime cannot send back
+UPDATE_ROW = """
+    UPDATE dbo.FaceEmbeddings
+    SET EmbeddingBinary = ?
+    WHERE ID = ?
+    AND EmbeddingBinary IS NULL
+    AND CAST(UpdatedDate AS DATETIME2(6)) = ?
+"""
+
+
+def backfill(batch_size, dtype, model_version=None, start_after_id=0, dry_run=False):
+    model_filter = 'AND ModelVersion = ?' if model_version else ''
+    select_sql = SELECT_BATCH.format(model_filter=model_filter)
+
+    last_id = start_after_id
+    converted = 0
+    skipped = 0
+    failed = 0
+    json_bytes = 0
+    binary_bytes = 0
+    started = time.perf_counter()
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        while True:
+            params = [batch_size, last_id] + ([model_version] if model_version else [])
+            cursor.execute(select_sql, params)
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            updates = []
+            for row in rows:
+                try:
+                    embedding = decode_embedding(row.Embedding, row.EmbeddingDimensions)
+                except ValueError as e:
+                    logging.error(f"Skipping ID {row.ID}: {e}")
+                    failed += 1
+                    continue
+
+                updates.append((encode_embedding(embedding, dtype=dtype), row.ID, row.UpdatedDate, row.Embedding))
+
+            for encoded, row_id, updated_date, json_value in updates:
+                if not dry_run:
+                    # One statement per row (as executemany does without
+                    # fast_executemany) so each row's rowcount is known
+                    cursor.execute(UPDATE_ROW, encoded, row_id, updated_date)
+                    if cursor.rowcount != 1:
+                        skipped += 1
+                        continue
+                converted += 1
+                # NVARCHAR is UTF-16 on the wire: two bytes per character
+                json_bytes += len(json_value) * 2
+                binary_bytes += len(encoded)
+            if updates and not dry_run:
+                conn.commit()
+
+            last_id = rows[-1].ID
+            elapsed = time.perf_counter() - started
+            print(
+                f"Converted {converted} rows (last ID {last_id}, {skipped} changed since read, {failed} failed), "
+                f"{converted / elapsed:.0f} rows/sec"
+            )
+    finally:
+        conn.close()
+
+    print('')
+    print(f"Done{' (dry run)' if dry_run else ''}: {converted} converted, {skipped} skipped, {failed} failed")
+    if skipped:
+        print(f"{skipped} rows changed or were converted elsewhere after they were read; re-run to pick them up")
+    if converted:
+        print(
+            f"Wire size: {json_bytes / converted:.0f} bytes/row JSON -> "
+            f"{binary_bytes / converted:.0f} bytes/row binary "
+            f"({json_bytes / max(binary_bytes, 1):.1f}x smaller)"
+        )
+    print(f"Resume with --start-after-id {last_id} to skip converted IDs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=500, help='Rows per transaction (default 500)')
+    parser.add_argument('--dtype', choices=['float32', 'float16'], default='float32',
+                        help='Storage precision (default float32, lossless)')
+    parser.add_argument('--model-version', help='Only convert this ModelVersion (default: all)')
+    parser.add_argument('--start-after-id', type=int, default=0, help='Resume after this FaceEmbeddings.ID')
+    parser.add_argument('--dry-run', action='store_true', help='Read and encode but do not write')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    backfill(args.batch_size, args.dtype, args.model_version, args.start_after_id, args.dry_run)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark: IVF-flat identify vs exact matching on a synthetic gallery.
+
+For several nprobe values, reports mean latency per query and recall of the
+exact top-N persons. Similarities of every returned person are checked
+against the exact result (exact rescoring means they must agree).
+
+Usage:
+    python scripts/benchmark_ann.py --embeddings 200000 --persons 5000 --nprobe 4 8 16 32
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_python.ann_index import IVFFlatIndex, match_faces_ivf
+from shared_python.insightface_utils import (
+    group_by_person,
+    match_faces_against_matrix,
+    normalize_embeddings,
+    row_segments
+)
+from benchmark_match import build_gallery
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--embeddings', type=int, default=200000)
+    parser.add_argument('--persons', type=int, default=5000)
+    parser.add_argument('--dimensions', type=int, default=512)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--top-n', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.3)
+    parser.add_argument('--shortlist', type=int, default=50)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16, 32])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    embeddings, person_ids, names, centers = build_gallery(
+        args.embeddings, args.persons, args.dimensions, args.seed
+    )
+    groups = group_by_person(person_ids)
+    segments = row_segments(groups)
+
+    started = time.perf_counter()
+    index = IVFFlatIndex.build(embeddings)
+    print(f"Built IVF index: {index.nlist} cells in {time.perf_counter() - started:.1f}s")
+
+    rng = np.random.default_rng(args.seed + 1)
+    targets = rng.integers(0, args.persons, size=args.queries)
+    queries = normalize_embeddings(
+        centers[targets] + rng.normal(scale=1.2, size=(args.queries, args.dimensions))
+    )
+    thresholds = [args.threshold] * args.queries
+    top_ks = [args.top_n] * args.queries
+
+    started = time.perf_counter()
+    exact = [
+        match_faces_against_matrix(
+            queries[i:i + 1], embeddings, person_ids, names,
+            args.threshold, args.top_n, groups, normalized=True
+        )[0]
+        for i in range(args.queries)
+    ]
+    exact_ms = (time.perf_counter() - started) / args.queries * 1000
+    print(f"Exact:        {exact_ms:8.2f} ms/query")
+
+    for nprobe in args.nprobe:
+        started = time.perf_counter()
+        approx = match_faces_ivf(
+            queries, embeddings, person_ids, names, groups, segments, index,
+            thresholds, top_ks, nprobe=nprobe, shortlist=args.shortlist
+        )
+        ivf_ms = (time.perf_counter() - started) / args.queries * 1000
+
+        found = 0
+        expected = 0
+        for exact_matches, approx_matches in zip(exact, approx):
+            exact_scores = {m['personId']: m['similarity'] for m in exact_matches}
+            expected += len(exact_scores)
+            found += sum(1 for m in approx_matches if m['personId'] in exact_scores)
+            for m in approx_matches:
+                if m['personId'] in exact_scores:
+                    assert abs(exact_scores[m['personId']] - m['similarity']) < 1e-5
+
+        recall = found / expected if expected else 1.0
+        print(f"nprobe={nprobe:<5d} {ivf_ms:8.2f} ms/query  recall@{args.top_n} {recall:.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: sequential synchronous blob downloads vs async download_many.
+
+Uploads --blobs random blobs to a scratch container with upload_many,
+downloads them once with the shared synchronous client (one after the
+other, like download_blob) and once with download_many, checks the bytes,
+and deletes the container.
+
+Runs against any storage account, including the Azurite emulator:
+
+    azurite-blob --location /tmp/azurite
+    AZURE_STORAGE_CONNECTION_STRING="UseDevelopmentStorage=true" python scripts/benchmark_async_storage.py
+
+Usage:
+    python scripts/benchmark_async_storage.py --blobs 200 --size-kb 500 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_python.storage import get_service_client
+from shared_python.async_storage import (
+    close_async_storage,
+    download_many,
+    get_async_service_client,
+    upload_many
+)
+
+
+async def run(args, connection_string, container_name, blobs):
+    service = get_async_service_client(connection_string)
+    await service.create_container(container_name)
+    try:
+        started = time.perf_counter()
+        errors = await upload_many(blobs.items(), container_name, connection_string, args.concurrency)
+        failed = [e for e in errors if e is not None]
+        print(f"upload_many:   {len(blobs)} blobs in {time.perf_counter() - started:.2f}s ({len(failed)} failed)")
+        if failed:
+            raise failed[0]
+
+        container = get_service_client(connection_string).get_container_client(container_name)
+        started = time.perf_counter()
+        for name in blobs:
+            container.download_blob(name).readall()
+        sync_seconds = time.perf_counter() - started
+        print(f"sequential:    {len(blobs)} blobs in {sync_seconds:.2f}s")
+
+        started = time.perf_counter()
+        results = await download_many(list(blobs), container_name, connection_string, args.concurrency, max_bytes=0)
+        async_seconds = time.perf_counter() - started
+        mismatched = sum(1 for name, data in zip(blobs, results) if data != blobs[name])
+        print(f"download_many: {len(blobs)} blobs in {async_seconds:.2f}s "
+              f"({sync_seconds / async_seconds:.1f}x, {mismatched} mismatched)")
+    finally:
+        try:
+            await service.delete_container(container_name)
+        finally:
+            await close_async_storage()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--blobs', type=int, default=200)
+    parser.add_argument('--size-kb', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    connection_string = os.environ.get('AZURE_STORAGE_CONNECTION_STRING')
+    if not connection_string:
+        sys.exit('Set AZURE_STORAGE_CONNECTION_STRING (e.g. "UseDevelopmentStorage=true" for Azurite)')
+
+    container_name = f"benchmark-{uuid.uuid4().hex[:12]}"
+    blobs = {f"blob-{i:05d}.bin": os.urandom(args.size_kb * 1024) for i in range(args.blobs)}
+    asyncio.run(run(args, connection_string, container_name, blobs))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Benchmark: full-resolution decode vs draft-mode decode_image for detection input.
+
+"legacy" is the previous path (PIL full decode -> np.array -> cv2.cvtColor);
+"draft" is insightface_utils.decode_image. Each variant runs in a fresh
+process so peak RSS reflects only that decode. Without --image a synthetic
+24 MP JPEG is generated.
+
+Peak RSS is read from /proc (VmHWM, reset before decoding) on Linux and from
+ru_maxrss elsewhere; it is not available on Windows.
+
+--embeddings checks that the draft decode does not change embeddings: every
+face found at full resolution is matched (by box overlap) to the faces found
+on the draft decode, with and without the full-resolution re-crop of small
+faces (INSIGHTFACE_RECROP_MIN_FACE), and the cosine similarity of their
+embeddings is reported by face size. Requires the InsightFace model and
+--image files with faces.
+
+Usage:
+    python scripts/benchmark_decode.py
+    python scripts/benchmark_decode.py --image IMG_0001.jpg --image IMG_0002.jpg --max-side 1280
+    python scripts/benchmark_decode.py --embeddings --image group.jpg --max-side 1280
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from io import BytesIO
+from PIL import Image
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def legacy_decode(image_bytes):
+    """The decode generate_face_embedding used before draft mode."""
+    import cv2
+    image = Image.open(BytesIO(image_bytes))
+    image_np = np.array(image)
+    if len(image_np.shape) == 3 and image_np.shape[2] == 3:
+        image_np = cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR)
+    return image_np
+
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS counter to the current RSS (Linux only)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_variant(variant, path, max_side, repeat, results):
+    from shared_python.insightface_utils import decode_image
+
+    with open(path, 'rb') as f:
+        image_bytes = f.read()
+    reset_peak_rss()
+    baseline = peak_rss_mb()
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        if variant == 'legacy':
+            pixels = legacy_decode(image_bytes)
+        else:
+            pixels = decode_image(image_bytes, max_side=max_side).pixels
+        timings.append(time.perf_counter() - started)
+        shape = pixels.shape
+        del pixels
+
+    results.put((shape, min(timings) * 1000, peak_rss_mb() - baseline))
+
+
+def _iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _unit(embedding):
+    embedding = np.asarray(embedding, dtype=np.float32)
+    return embedding / np.linalg.norm(embedding)
+
+
+def compare_embeddings(path, max_side):
+    """Print per-face cosine similarity of draft-decode embeddings to full-resolution ones."""
+    from shared_python import insightface_utils
+
+    with open(path, 'rb') as f:
+        image_bytes = f.read()
+
+    full = insightface_utils._detect_faces(insightface_utils.decode_image(image_bytes, max_side=0))
+    recrop_min_face = insightface_utils.RECROP_MIN_FACE
+    variants = {}
+    for name, min_face in (('draft', 0), ('re-crop', recrop_min_face or 112)):
+        insightface_utils.RECROP_MIN_FACE = min_face
+        try:
+            variants[name] = insightface_utils._detect_faces(
+                insightface_utils.decode_image(image_bytes, max_side=max_side)
+            )
+        finally:
+            insightface_utils.RECROP_MIN_FACE = recrop_min_face
+
+    print(f"  {len(full)} faces at full resolution (cosine to full-resolution embedding)")
+    for face in sorted(full, key=lambda f: f.bbox[2] - f.bbox[0]):
+        size = min(face.bbox[2] - face.bbox[0], face.bbox[3] - face.bbox[1])
+        columns = []
+        for name, faces in variants.items():
+            match = max(faces, key=lambda f: _iou(face.bbox, f.bbox), default=None)
+            if match is None or _iou(face.bbox, match.bbox) < 0.5:
+                columns.append(f"{name} not detected")
+            else:
+                columns.append(f"{name} {float(_unit(face.embedding) @ _unit(match.embedding)):.4f}")
+        print(f"    face {size:6.0f} px: " + "  ".join(columns))
+
+
+def synthetic_jpeg(width, height):
+    """Smooth gradients plus noise, so the JPEG is about camera-sized."""
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=2)
+    pixels = np.clip(base + rng.normal(scale=20, size=base.shape), 0, 255).astype(np.uint8)
+
+    handle, path = tempfile.mkstemp(suffix='.jpg')
+    os.close(handle)
+    Image.fromarray(pixels).save(path, quality=90)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', action='append', help='JPEG/PNG file to decode (repeatable)')
+    parser.add_argument('--max-side', type=int, default=1280, help='decode_image target longer side')
+    parser.add_argument('--repeat', type=int, default=3, help='Decodes per variant (best time reported)')
+    parser.add_argument('--width', type=int, default=6000, help='Synthetic image width')
+    parser.add_argument('--height', type=int, default=4000, help='Synthetic image height')
+    parser.add_argument('--embeddings', action='store_true',
+                        help='Compare draft and full-resolution face embeddings instead (needs --image)')
+    args = parser.parse_args()
+
+    if args.embeddings:
+        if not args.image:
+            parser.error('--embeddings needs --image files with faces')
+        for path in args.image:
+            print(os.path.basename(path))
+            compare_embeddings(path, args.max_side)
+        return
+
+    paths = args.image
+    generated = None
+    if not paths:
+        generated = synthetic_jpeg(args.width, args.height)
+        paths = [generated]
+
+    context = multiprocessing.get_context('spawn')
+    try:
+        for path in paths:
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+            print(f"{os.path.basename(path)} ({size_mb:.1f} MB)")
+            for variant in ('legacy', 'draft'):
+                results = context.Queue()
+                process = context.Process(
+                    target=run_variant, args=(variant, path, args.max_side, args.repeat, results)
+                )
+                process.start()
+                shape, decode_ms, rss_mb = results.get()
+                process.join()
+                print(
+                    f"  {variant:7s} {shape[1]:5d}x{shape[0]:<5d} "
+                    f"decode {decode_ms:8.1f} ms  peak RSS +{rss_mb:7.1f} MB"
+                )
+    finally:
+        if generated:
+            os.remove(generated)
+
+
+if __name__ == '__main__':
+    main()
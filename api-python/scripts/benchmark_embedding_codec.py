@@ -0,0 +1,61 @@
+"""
+Benchmark: JSON vs binary embedding storage for a full gallery load.
+
+Reports bytes per row as sent over the wire (NVARCHAR is UTF-16) and the
+time to decode every row into a gallery matrix.
+
+Usage:
+    python scripts/benchmark_embedding_codec.py --rows 50000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_python.embedding_codec import decode_embedding, encode_embedding
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--dimensions', type=int, default=512)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(args.rows, args.dimensions)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    # Match what JSON.stringify / json.dumps store today
+    stored = {
+        'json': [json.dumps(v.tolist()) for v in vectors],
+        'float32': [encode_embedding(v, 'float32') for v in vectors],
+        'float16': [encode_embedding(v, 'float16') for v in vectors],
+    }
+
+    print(f"{args.rows} rows x {args.dimensions} dims")
+    baseline = None
+    for name, values in stored.items():
+        wire_bytes = sum(len(v) * 2 if isinstance(v, str) else len(v) for v in values)
+
+        started = time.perf_counter()
+        matrix = np.vstack([decode_embedding(v, args.dimensions) for v in values])
+        decode_s = time.perf_counter() - started
+
+        max_error = float(np.abs(matrix - vectors).max())
+        if baseline is None:
+            baseline = (wire_bytes, decode_s)
+        print(
+            f"{name:8s} {wire_bytes / args.rows:8.0f} bytes/row "
+            f"({baseline[0] / wire_bytes:5.1f}x smaller)  "
+            f"decode {decode_s * 1000:8.1f} ms ({baseline[1] / decode_s:5.1f}x faster)  "
+            f"max error {max_error:.1e}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark: batched FaceEmbeddings upserts vs one INSERT and commit per row.
+
+Writes --rows synthetic 512-dim embeddings for existing (picture, person)
+pairs under a throwaway ModelVersion with FaceEmbeddingWriter, writes them
+again (every row is now an update), then times --row-by-row rows the old
+way. All benchmark rows are deleted at the end.
+
+Requires AZURE_SQL_CONNECTIONSTRING, database/add-embedding-binary-column.sql
+and database/add-face-embeddings-unique-key.sql.
+
+Usage:
+    python scripts/benchmark_embedding_writer.py --rows 100000 --batch-size 1000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_python.utils import get_db_connection
+from shared_python.embedding_codec import encode_embedding
+from shared_python.embedding_writer import FaceEmbeddingWriter
+
+MODEL_VERSION = 'benchmark-embedding-writer'
+
+# Distinct (picture, person) pairs to satisfy both foreign keys
+SELECT_PAIRS = """
+    SELECT TOP (?) p.PFileName, ne.ID
+    FROM (SELECT TOP (?) PFileName FROM dbo.Pictures ORDER BY PFileName) p
+    CROSS JOIN (SELECT TOP (?) ID FROM dbo.NameEvent WHERE neType = 'N' ORDER BY ID) ne
+"""
+
+INSERT_ROW = """
+    INSERT INTO dbo.FaceEmbeddings
+        (PersonID, PhotoFileName, Embedding, EmbeddingBinary, ModelVersion, EmbeddingDimensions)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+DELETE_BENCHMARK_ROWS = "DELETE FROM dbo.FaceEmbeddings WHERE ModelVersion = ?"
+
+
+def write_batched(conn, pairs, embeddings, batch_size):
+    writer = FaceEmbeddingWriter(conn, MODEL_VERSION, batch_size=batch_size, flush_seconds=0)
+    started = time.perf_counter()
+    for (filename, person_id), embedding in zip(pairs, embeddings):
+        writer.add(person_id, filename, embedding)
+    writer.flush()
+    return time.perf_counter() - started, writer.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--row-by-row', type=int, default=500, help='Rows timed with one INSERT + commit each')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        persons = cursor.execute("SELECT COUNT(*) FROM dbo.NameEvent WHERE neType = 'N'").fetchone()[0]
+        photos = -(-args.rows // max(persons, 1))
+        pairs = [(row[0], row[1]) for row in cursor.execute(SELECT_PAIRS, args.rows, photos, persons).fetchall()]
+        print(f"{len(pairs)} (picture, person) pairs")
+
+        rng = np.random.default_rng(args.seed)
+        embeddings = rng.normal(size=(len(pairs), 512)).astype(np.float32)
+
+        seconds, stats = write_batched(conn, pairs, embeddings, args.batch_size)
+        print(f"Batched insert: {len(pairs)} rows in {seconds:.1f}s ({len(pairs) / seconds:.0f} rows/sec, "
+              f"{stats['rowsInserted']} inserted)")
+
+        seconds, stats = write_batched(conn, pairs, embeddings, args.batch_size)
+        print(f"Batched rerun:  {len(pairs)} rows in {seconds:.1f}s ({len(pairs) / seconds:.0f} rows/sec, "
+              f"{stats['rowsUpdated']} updated, {stats['rowsInserted']} inserted)")
+
+        cursor.execute(DELETE_BENCHMARK_ROWS, MODEL_VERSION)
+        conn.commit()
+
+        sample = pairs[:args.row_by_row]
+        started = time.perf_counter()
+        for (filename, person_id), embedding in zip(sample, embeddings):
+            cursor.execute(INSERT_ROW, person_id, filename, json.dumps([round(float(v), 6) for v in embedding]),
+                           encode_embedding(embedding), MODEL_VERSION, len(embedding))
+            conn.commit()
+        seconds = time.perf_counter() - started
+        if sample:
+            rate = len(sample) / seconds
+            print(f"Row by row:     {len(sample)} rows in {seconds:.1f}s ({rate:.0f} rows/sec; "
+                  f"{len(pairs) / rate / 60:.1f} min for {len(pairs)} rows)")
+    finally:
+        cursor.execute(DELETE_BENCHMARK_ROWS, MODEL_VERSION)
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: per-row Python matching loop vs vectorized match_face_against_matrix.
+
+Builds a synthetic gallery, checks both paths return the same matches and
+reports the speedup.
+
+Usage:
+    python scripts/benchmark_match.py --embeddings 50000 --persons 2000
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_python.insightface_utils import (
+    cosine_similarity,
+    group_by_person,
+    match_face_against_matrix,
+    normalize_embeddings,
+    TOP_N_AVERAGE
+)
+
+
+def legacy_match(query_embedding, stored_embeddings, threshold):
+    """The original per-row implementation, kept here as the reference."""
+    scores_by_person = {}
+    for stored in stored_embeddings:
+        stored_embedding = np.array(stored['Embedding'], dtype=np.float32)
+        similarity = cosine_similarity(query_embedding, stored_embedding)
+        entry = scores_by_person.setdefault(stored['PersonID'], {
+            'personId': stored['PersonID'],
+            'personName': stored['PersonName'],
+            'scores': []
+        })
+        entry['scores'].append(similarity)
+
+    person_matches = []
+    for data in scores_by_person.values():
+        scores = sorted(data['scores'], reverse=True)
+        top_scores = scores[:TOP_N_AVERAGE]
+        person_matches.append({
+            'personId': data['personId'],
+            'personName': data['personName'],
+            'similarity': sum(top_scores) / len(top_scores),
+            'maxSimilarity': scores[0],
+            'embeddingCount': len(scores)
+        })
+
+    person_matches.sort(key=lambda x: x['similarity'], reverse=True)
+    return [m for m in person_matches if m['similarity'] >= threshold]
+
+
+def build_gallery(num_embeddings, num_persons, dimensions, seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_persons, dimensions)).astype(np.float32)
+    person_ids = rng.integers(1, num_persons + 1, size=num_embeddings)
+    noise = rng.normal(scale=1.2, size=(num_embeddings, dimensions)).astype(np.float32)
+    embeddings = normalize_embeddings(centers[person_ids - 1] + noise)
+    names = np.array([f'Person {p}' for p in person_ids], dtype=object)
+    return embeddings, person_ids, names, centers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--embeddings', type=int, default=50000)
+    parser.add_argument('--persons', type=int, default=2000)
+    parser.add_argument('--dimensions', type=int, default=512)
+    parser.add_argument('--queries', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    embeddings, person_ids, names, centers = build_gallery(
+        args.embeddings, args.persons, args.dimensions, args.seed
+    )
+    records = [
+        {'PersonID': int(p), 'PersonName': n, 'Embedding': e.tolist()}
+        for p, n, e in zip(person_ids, names, embeddings)
+    ]
+    groups = group_by_person(person_ids)
+
+    rng = np.random.default_rng(args.seed + 1)
+    legacy_total = 0.0
+    vector_total = 0.0
+
+    for _ in range(args.queries):
+        target = rng.integers(0, args.persons)
+        query = normalize_embeddings(centers[target] + rng.normal(scale=1.2, size=args.dimensions))
+
+        started = time.perf_counter()
+        expected = legacy_match(query, records, args.threshold)
+        legacy_total += time.perf_counter() - started
+
+        started = time.perf_counter()
+        actual = match_face_against_matrix(
+            query, embeddings, person_ids, names,
+            threshold=args.threshold, groups=groups, normalized=True
+        )
+        vector_total += time.perf_counter() - started
+
+        assert len(expected) == len(actual), 'match counts differ'
+        for e, a in zip(expected, actual):
+            # Persons with tied scores may come back in a different order
+            assert e['personId'] == a['personId'] or abs(e['similarity'] - a['similarity']) < 1e-6
+            assert abs(e['similarity'] - a['similarity']) < 1e-5
+            assert abs(e['maxSimilarity'] - a['maxSimilarity']) < 1e-5
+            assert e['embeddingCount'] == a['embeddingCount']
+
+    legacy_ms = legacy_total / args.queries * 1000
+    vector_ms = vector_total / args.queries * 1000
+    print(f"Gallery: {args.embeddings} embeddings, {args.persons} persons, {args.dimensions} dims")
+    print(f"Legacy loop:  {legacy_ms:9.2f} ms/query")
+    print(f"Vectorized:   {vector_ms:9.2f} ms/query")
+    print(f"Speedup:      {legacy_ms / vector_ms:9.1f}x (results identical)")
+
+
+if __name__ == '__main__':
+    main()
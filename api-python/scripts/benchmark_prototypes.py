@@ -0,0 +1,136 @@
+"""
+Benchmark: prototype-shortlist identify vs exact matching on a synthetic gallery.
+
+For several shortlist sizes, reports mean latency per query and recall of
+the exact top-N persons. Similarities of every returned person are checked
+against the exact result (exact rescoring means they must agree). Also
+checks that incrementally updated prototypes equal a full rebuild.
+
+Usage:
+    python scripts/benchmark_prototypes.py --embeddings 200000 --persons 5000 --shortlist 10 25 50 100
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_python.insightface_utils import (
+    group_by_person,
+    match_faces_against_matrix,
+    normalize_embeddings
+)
+from shared_python.person_prototypes import PersonPrototypes, match_faces_prototypes
+from benchmark_match import build_gallery
+
+
+def check_incremental(embeddings, person_ids, exemplars, seed):
+    """Drop some rows, move some to other persons, then compare with_changes to build."""
+    rng = np.random.default_rng(seed + 2)
+    before = PersonPrototypes.build(embeddings, person_ids, group_by_person(person_ids), exemplars)
+
+    keep = rng.random(len(person_ids)) > 0.01
+    moved = person_ids.copy()
+    relabel = rng.choice(len(person_ids), size=len(person_ids) // 100, replace=False)
+    moved[relabel] = rng.integers(1, person_ids.max() + 2, size=len(relabel))
+    changed_ids = np.concatenate([person_ids[~keep], person_ids[relabel], moved[relabel]])
+
+    after_embeddings, after_ids = embeddings[keep], moved[keep]
+    after_groups = group_by_person(after_ids)
+
+    started = time.perf_counter()
+    updated = before.with_changes(after_embeddings, after_ids, after_groups, changed_ids)
+    update_ms = (time.perf_counter() - started) * 1000
+
+    rebuilt = PersonPrototypes.build(after_embeddings, after_ids, after_groups, exemplars)
+    assert np.array_equal(updated.person_ids, rebuilt.person_ids)
+    assert np.allclose(updated.centroids, rebuilt.centroids, atol=1e-5)
+    assert np.allclose(updated.exemplars, rebuilt.exemplars, atol=1e-5)
+    print(
+        f"Incremental update of {len(np.unique(changed_ids))} persons: {update_ms:.0f}ms "
+        f"(matches full rebuild)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--embeddings', type=int, default=200000)
+    parser.add_argument('--persons', type=int, default=5000)
+    parser.add_argument('--dimensions', type=int, default=512)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--top-n', type=int, default=5)
+    parser.add_argument('--threshold', type=float, default=0.3)
+    parser.add_argument('--exemplars', type=int, default=3)
+    parser.add_argument('--shortlist', type=int, nargs='+', default=[10, 25, 50, 100])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    embeddings, person_ids, names, centers = build_gallery(
+        args.embeddings, args.persons, args.dimensions, args.seed
+    )
+    groups = group_by_person(person_ids)
+
+    started = time.perf_counter()
+    prototypes = PersonPrototypes.build(embeddings, person_ids, groups, exemplars=args.exemplars)
+    print(
+        f"Built prototypes: {len(prototypes)} persons x (1 + {args.exemplars}) vectors "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+    rng = np.random.default_rng(args.seed + 1)
+    targets = rng.integers(0, args.persons, size=args.queries)
+    queries = normalize_embeddings(
+        centers[targets] + rng.normal(scale=1.2, size=(args.queries, args.dimensions))
+    )
+    thresholds = [args.threshold] * args.queries
+    top_ks = [args.top_n] * args.queries
+
+    started = time.perf_counter()
+    exact = [
+        match_faces_against_matrix(
+            queries[i:i + 1], embeddings, person_ids, names,
+            args.threshold, args.top_n, groups, normalized=True
+        )[0]
+        for i in range(args.queries)
+    ]
+    exact_ms = (time.perf_counter() - started) / args.queries * 1000
+    print(f"Exact:          {exact_ms:8.2f} ms/query")
+
+    for shortlist in args.shortlist:
+        started = time.perf_counter()
+        approx = [
+            match_faces_prototypes(
+                queries[i:i + 1], embeddings, person_ids, names, groups, prototypes,
+                thresholds[i:i + 1], top_ks[i:i + 1], shortlist=shortlist
+            )[0]
+            for i in range(args.queries)
+        ]
+        proto_ms = (time.perf_counter() - started) / args.queries * 1000
+
+        found = 0
+        expected = 0
+        top1 = 0
+        for exact_matches, approx_matches in zip(exact, approx):
+            exact_scores = {m['personId']: m['similarity'] for m in exact_matches}
+            expected += len(exact_scores)
+            found += sum(1 for m in approx_matches if m['personId'] in exact_scores)
+            if not exact_matches or (approx_matches and approx_matches[0]['personId'] == exact_matches[0]['personId']):
+                top1 += 1
+            for m in approx_matches:
+                if m['personId'] in exact_scores:
+                    assert abs(exact_scores[m['personId']] - m['similarity']) < 1e-5
+
+        recall = found / expected if expected else 1.0
+        print(
+            f"shortlist={shortlist:<5d} {proto_ms:8.2f} ms/query  recall@{args.top_n} {recall:.3f}  "
+            f"top-1 agreement {top1 / args.queries:.3f}"
+        )
+
+    check_incremental(embeddings, person_ids, args.exemplars, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: identify latency on a memory-mapped gallery snapshot vs in-heap arrays.
+
+Builds a synthetic gallery, publishes it with gallery_snapshot.write_snapshot,
+maps it back and checks both paths return the same matches. Timings are
+taken after one warm-up query, i.e. with the snapshot in the page cache, as
+it is for every worker after the first on a host.
+
+Usage:
+    python scripts/benchmark_snapshot.py --embeddings 50000 --persons 2000
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_python.gallery_snapshot import load_snapshot, write_snapshot
+from shared_python.insightface_utils import group_by_person, match_faces_against_matrix, normalize_embeddings
+from benchmark_match import build_gallery
+
+
+def time_queries(queries, embeddings, person_ids, names, threshold, repeat):
+    groups = group_by_person(person_ids)
+    match = lambda: match_faces_against_matrix(
+        queries, embeddings, person_ids, names,
+        thresholds=[threshold] * len(queries), top_ks=[5] * len(queries),
+        groups=groups, normalized=True
+    )
+    results = match()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        match()
+        timings.append(time.perf_counter() - started)
+    return results, np.array(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--embeddings', type=int, default=50000)
+    parser.add_argument('--persons', type=int, default=2000)
+    parser.add_argument('--dimensions', type=int, default=512)
+    parser.add_argument('--queries', type=int, default=5, help='Faces per identify call')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--threshold', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    embeddings, person_ids, names, centers = build_gallery(
+        args.embeddings, args.persons, args.dimensions, args.seed
+    )
+    ids = np.arange(1, len(person_ids) + 1, dtype=np.int64)
+    person_ids = person_ids.astype(np.int64)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = normalize_embeddings(
+        centers[rng.integers(0, args.persons, size=args.queries)]
+        + rng.normal(scale=1.2, size=(args.queries, args.dimensions)).astype(np.float32)
+    )
+
+    root = tempfile.mkdtemp(prefix='gallery-snapshot-')
+    try:
+        started = time.perf_counter()
+        write_snapshot(root, ids, person_ids, names, embeddings, 'benchmark', max_id=int(ids[-1]))
+        write_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        snapshot = load_snapshot(root)
+        map_ms = (time.perf_counter() - started) * 1000
+
+        heap_results, heap_ms = time_queries(queries, embeddings, person_ids, names, args.threshold, args.repeat)
+        mmap_results, mmap_ms = time_queries(
+            queries, snapshot['embeddings'], snapshot['person_ids'], snapshot['person_names'],
+            args.threshold, args.repeat
+        )
+
+        same = [
+            [(m['personId'], round(m['similarity'], 6)) for m in matches] for matches in heap_results
+        ] == [
+            [(m['personId'], round(m['similarity'], 6)) for m in matches] for matches in mmap_results
+        ]
+
+        print(f"Gallery: {args.embeddings} x {args.dimensions} ({embeddings.nbytes / 2**20:.1f} MB), "
+              f"{args.queries} faces per call")
+        print(f"Snapshot write {write_ms:.0f} ms, map {map_ms:.1f} ms")
+        print(f"  heap  p50 {np.percentile(heap_ms, 50):7.2f} ms  p95 {np.percentile(heap_ms, 95):7.2f} ms")
+        print(f"  mmap  p50 {np.percentile(mmap_ms, 50):7.2f} ms  p95 {np.percentile(mmap_ms, 95):7.2f} ms")
+        print(f"Same matches: {same}")
+        del snapshot
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
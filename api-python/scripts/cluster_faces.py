@@ -0,0 +1,202 @@
+"""
+Cluster unlabeled faces (dbo.FaceEncodings with PersonID IS NULL) by identity.
+
+Loads the encodings, links each face to those of its --neighbors nearest
+faces with cosine similarity >= --threshold (computed blockwise, see
+shared_python/face_clustering.py), and writes the connected groups of at
+least --min-size faces to FaceEncodings.ClusterID in one transaction.
+faces-review then lists the clusters (GET ?view=clusters) and confirms a
+whole cluster as one person (action confirmCluster).
+
+Every run replaces the previous clustering of unlabeled faces. Cluster IDs
+continue above the highest ID ever used, so a review confirm carrying an
+ID from an earlier run matches no faces.
+
+Encodings of another length than the most common one (e.g. legacy 128-dim
+dlib rows next to 512-dim InsightFace rows) are skipped.
+
+Requires AZURE_SQL_CONNECTIONSTRING and database/add-face-cluster-id.sql.
+
+Usage:
+    python scripts/cluster_faces.py
+    python scripts/cluster_faces.py --threshold 0.55 --neighbors 15 --dry-run
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_python.utils import get_db_connection
+from shared_python.face_clustering import (
+    DEFAULT_BLOCK_SIZE,
+    DEFAULT_NEIGHBORS,
+    DEFAULT_THRESHOLD,
+    cluster_embeddings,
+    decode_face_encoding
+)
+
+SELECT_UNLABELED = """
+    SELECT FaceID, Encoding
+    FROM dbo.FaceEncodings
+    WHERE PersonID IS NULL
+    ORDER BY FaceID
+"""
+
+# Serializes concurrent runs and reserves the new ID range
+NEXT_CLUSTER_ID = "SELECT ISNULL(MAX(ClusterID), 0) + 1 FROM dbo.FaceEncodings WITH (UPDLOCK, HOLDLOCK)"
+
+CLEAR_CLUSTERS = """
+    UPDATE dbo.FaceEncodings SET ClusterID = NULL
+    WHERE PersonID IS NULL AND ClusterID IS NOT NULL
+"""
+
+CREATE_STAGING = "CREATE TABLE #FaceClusters (FaceID INT PRIMARY KEY, ClusterID INT NOT NULL)"
+
+INSERT_STAGING = "INSERT INTO #FaceClusters (FaceID, ClusterID) VALUES (?, ?)"
+
+# PersonID IS NULL again: faces labeled while the job ran keep their label and get no cluster
+APPLY_STAGING = """
+    UPDATE f SET f.ClusterID = c.ClusterID
+    FROM dbo.FaceEncodings f
+    INNER JOIN #FaceClusters c ON c.FaceID = f.FaceID
+    WHERE f.PersonID IS NULL
+"""
+
+
+def load_encodings(conn, limit=None, batch_size=5000):
+    """FaceIDs and encoding matrix of unlabeled faces (majority dimension only)."""
+    cursor = conn.cursor()
+    cursor.execute(SELECT_UNLABELED)
+    face_ids, vectors = [], []
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for face_id, encoding in rows:
+            try:
+                vectors.append(decode_face_encoding(encoding))
+                face_ids.append(face_id)
+            except ValueError as e:
+                logging.warning(f"Skipping face {face_id}: {e}")
+        if limit is not None and len(face_ids) >= limit:
+            break
+    cursor.close()
+
+    face_ids, vectors = face_ids[:limit], vectors[:limit]
+    if not vectors:
+        return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+
+    dimensions, _ = Counter(len(v) for v in vectors).most_common(1)[0]
+    keep = [i for i, v in enumerate(vectors) if len(v) == dimensions]
+    if len(keep) < len(vectors):
+        print(f"Skipping {len(vectors) - len(keep)} encodings that are not {dimensions}-dim")
+    return (
+        np.array([face_ids[i] for i in keep], dtype=np.int64),
+        np.vstack([vectors[i] for i in keep]).astype(np.float32)
+    )
+
+
+def write_clusters(conn, face_ids, labels):
+    """Replace the ClusterIDs of unlabeled faces; returns the first ID of this run."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(NEXT_CLUSTER_ID)
+        first_id = cursor.fetchone()[0]
+        cursor.execute(CLEAR_CLUSTERS)
+
+        clustered = labels >= 0
+        rows = [
+            (int(face_id), int(first_id + label))
+            for face_id, label in zip(face_ids[clustered], labels[clustered])
+        ]
+        cursor.execute(CREATE_STAGING)
+        if rows:
+            cursor.fast_executemany = True
+            cursor.executemany(INSERT_STAGING, rows)
+        cursor.execute(APPLY_STAGING)
+        cursor.execute("DROP TABLE #FaceClusters")
+        conn.commit()
+        return first_id
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'Minimum cosine similarity to link two faces (default {DEFAULT_THRESHOLD})')
+    parser.add_argument('--neighbors', type=int, default=DEFAULT_NEIGHBORS,
+                        help=f'Nearest faces considered per face (default {DEFAULT_NEIGHBORS})')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE,
+                        help=f'Faces per similarity block; memory ~ block-size^2 * 4 bytes (default {DEFAULT_BLOCK_SIZE})')
+    parser.add_argument('--min-size', type=int, default=2, help='Smallest cluster written (default 2)')
+    parser.add_argument('--limit', type=int, default=None, help='Only cluster the first N unlabeled faces')
+    parser.add_argument('--report-seconds', type=float, default=10, help='Seconds between progress lines')
+    parser.add_argument('--dry-run', action='store_true', help='Cluster and report without writing')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    conn = get_db_connection()
+    try:
+        started = time.perf_counter()
+        face_ids, embeddings = load_encodings(conn, args.limit)
+        load_seconds = time.perf_counter() - started
+        print(f"Loaded {len(face_ids)} unlabeled faces in {load_seconds:.1f}s")
+        if len(face_ids) < 2:
+            return
+
+        cluster_started = time.perf_counter()
+        last_report = [cluster_started]
+
+        def progress(done, total):
+            now = time.perf_counter()
+            if done == total or now - last_report[0] >= args.report_seconds:
+                last_report[0] = now
+                elapsed = now - cluster_started
+                eta = elapsed / done * (total - done)
+                print(f"  similarity blocks {done}/{total} ({done / total:.0%}) | "
+                      f"{elapsed:.0f}s elapsed, ETA {eta:.0f}s")
+
+        labels = cluster_embeddings(
+            embeddings,
+            threshold=args.threshold,
+            k=args.neighbors,
+            block_size=args.block_size,
+            min_size=args.min_size,
+            progress=progress
+        )
+        cluster_seconds = time.perf_counter() - cluster_started
+
+        sizes = np.bincount(labels[labels >= 0]) if (labels >= 0).any() else np.empty(0, dtype=np.int64)
+        print(
+            f"{len(sizes)} clusters covering {int(sizes.sum())}/{len(labels)} faces "
+            f"(largest {int(sizes.max()) if len(sizes) else 0}, median {int(np.median(sizes)) if len(sizes) else 0}) "
+            f"in {cluster_seconds:.1f}s"
+        )
+
+        if args.dry_run:
+            print("Dry run: nothing written")
+            return
+
+        write_started = time.perf_counter()
+        first_id = write_clusters(conn, face_ids, labels)
+        print(
+            f"Wrote ClusterIDs {first_id}-{first_id + max(len(sizes) - 1, 0)} in "
+            f"{time.perf_counter() - write_started:.1f}s (total {time.perf_counter() - started:.1f}s)"
+        )
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
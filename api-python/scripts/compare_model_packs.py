@@ -0,0 +1,160 @@
+"""
+Compare InsightFace model packs and module subsets on a local labeled sample.
+
+The sample is a directory with one sub-directory per person:
+
+    sample/
+      alice/ img1.jpg img2.jpg ...
+      bob/   img1.jpg ...
+
+For every configuration the script reports model load time, per-image
+inference latency (app.get only; decoding is shared), images without a
+detected face and, using the largest face per image:
+
+- rank-1: leave-one-out nearest-neighbour identification accuracy
+- verification accuracy at the best threshold over all image pairs
+- TAR @ FAR=1%: genuine pairs accepted at the threshold that admits 1% of impostors
+
+Module subsets only change latency; accuracy columns are the same for a pack.
+
+Usage:
+    python scripts/compare_model_packs.py --sample ./sample
+    python scripts/compare_model_packs.py --sample ./sample --packs buffalo_l buffalo_s --modules detection,recognition all
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_python.insightface_utils import ALL_MODULES, decode_image, get_model_version, load_insightface_model
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def load_sample(root):
+    """Return [(label, path)] for every image under root/<label>/."""
+    items = []
+    for label in sorted(os.listdir(root)):
+        folder = os.path.join(root, label)
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                items.append((label, os.path.join(folder, name)))
+    return items
+
+
+def embed_sample(app, images):
+    """Largest-face embedding per image (None if no face) and app.get latencies."""
+    embeddings = []
+    latencies = []
+    for pixels in images:
+        started = time.perf_counter()
+        faces = app.get(pixels)
+        latencies.append(time.perf_counter() - started)
+
+        faces = [f for f in faces if getattr(f, 'embedding', None) is not None]
+        if not faces:
+            embeddings.append(None)
+            continue
+        largest = max(faces, key=lambda f: (f.bbox[2] - f.bbox[0]) * (f.bbox[3] - f.bbox[1]))
+        embeddings.append(largest.normed_embedding)
+    return embeddings, np.array(latencies)
+
+
+def accuracy_metrics(labels, embeddings):
+    """rank-1, best-threshold verification accuracy and TAR@FAR=1% over images with a face."""
+    keep = [i for i, e in enumerate(embeddings) if e is not None]
+    if len(keep) < 2:
+        return None
+
+    matrix = np.vstack([embeddings[i] for i in keep]).astype(np.float32)
+    names = np.array([labels[i] for i in keep])
+    similarity = matrix @ matrix.T
+
+    # rank-1 over images whose person has at least one other image
+    np.fill_diagonal(similarity, -np.inf)
+    nearest = np.argmax(similarity, axis=1)
+    has_pair = np.array([np.sum(names == n) > 1 for n in names])
+    rank1 = float(np.mean(names[nearest][has_pair] == names[has_pair])) if has_pair.any() else float('nan')
+
+    upper = np.triu_indices(len(names), k=1)
+    scores = similarity[upper]
+    genuine = (names[:, None] == names[None, :])[upper]
+    if not genuine.any() or genuine.all():
+        return rank1, float('nan'), float('nan'), float('nan')
+
+    # Best threshold: scan the sorted scores once
+    order = np.argsort(-scores)
+    sorted_genuine = genuine[order]
+    accepted_genuine = np.cumsum(sorted_genuine)
+    accepted_impostor = np.cumsum(~sorted_genuine)
+    correct = accepted_genuine + (np.sum(~genuine) - accepted_impostor)
+    best = int(np.argmax(correct))
+    best_accuracy = float(correct[best] / len(scores))
+    best_threshold = float(scores[order][best])
+
+    impostor_scores = np.sort(scores[~genuine])
+    far_threshold = impostor_scores[int(np.ceil(0.99 * len(impostor_scores))) - 1]
+    tar = float(np.mean(scores[genuine] > far_threshold))
+
+    return rank1, best_accuracy, best_threshold, tar
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sample', required=True, help='Directory with one sub-directory of images per person')
+    parser.add_argument('--packs', nargs='+', default=['buffalo_l', 'buffalo_s'])
+    parser.add_argument('--modules', nargs='+', default=['detection,recognition', 'all'],
+                        help="Module subsets to time, comma-separated or 'all'")
+    parser.add_argument('--max-side', type=int, default=None, help='decode_image max side (default: configured)')
+    args = parser.parse_args()
+
+    items = load_sample(args.sample)
+    if not items:
+        print(f"No images found under {args.sample}")
+        return
+    labels = [label for label, _ in items]
+    print(f"{len(items)} images of {len(set(labels))} people")
+
+    images = []
+    for _, path in items:
+        with open(path, 'rb') as f:
+            images.append(decode_image(f.read(), max_side=args.max_side).pixels)
+
+    print('')
+    print(f"{'pack':12s} {'modules':24s} {'load s':>7s} {'p50 ms':>7s} {'p95 ms':>7s} "
+          f"{'noface':>6s} {'rank-1':>7s} {'verif':>6s} {'thresh':>6s} {'TAR@1%':>7s}  ModelVersion")
+
+    for pack in args.packs:
+        for modules_arg in args.modules:
+            modules = ALL_MODULES if modules_arg == 'all' else [m.strip() for m in modules_arg.split(',')]
+
+            started = time.perf_counter()
+            try:
+                app = load_insightface_model(pack, allowed_modules=modules)
+            except RuntimeError as e:
+                print(f"{pack:12s} {modules_arg:24s} failed to load: {e}")
+                continue
+            load_s = time.perf_counter() - started
+
+            # Warm-up so the first image does not carry session initialisation
+            app.get(images[0])
+            embeddings, latencies = embed_sample(app, images)
+            metrics = accuracy_metrics(labels, embeddings)
+            rank1, verification, threshold, tar = metrics or (float('nan'),) * 4
+
+            print(
+                f"{pack:12s} {modules_arg:24s} {load_s:7.1f} "
+                f"{np.percentile(latencies, 50) * 1000:7.1f} {np.percentile(latencies, 95) * 1000:7.1f} "
+                f"{sum(e is None for e in embeddings):6d} {rank1:7.3f} {verification:6.3f} "
+                f"{threshold:6.3f} {tar:7.3f}  {get_model_version(pack)}"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Compute perceptual hashes of pictures and mark near-duplicate copies.
+
+1. Every image in dbo.Pictures (PType 1) without a dbo.PictureHashes row is
+   downloaded with download_blob on a thread pool and hashed (dHash and
+   pHash, see shared_python/phash.py); rows are committed per batch, so an
+   interrupted run simply continues with the photos still missing.
+2. All hashes are then loaded into a multi-index hash table in upload order
+   (PDateEntered, PFileName) and every picture within --radius bits of an
+   earlier one (pHash, confirmed on dHash) gets DuplicateOf set to that
+   original. Only changed DuplicateOf values are written.
+
+Requires AZURE_SQL_CONNECTIONSTRING, AzureWebJobsStorage and
+database/add-picture-hashes.sql. BLOB_CONTAINER_NAME selects the container
+(default family-album-media).
+
+Usage:
+    python scripts/compute_picture_hashes.py
+    python scripts/compute_picture_hashes.py --workers 16 --radius 8
+    python scripts/compute_picture_hashes.py --skip-hashing --radius 4
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_python.utils import download_blob, get_db_connection
+from shared_python.phash import (
+    DEFAULT_RADIUS,
+    compute_hashes,
+    find_duplicates,
+    from_signed64,
+    to_signed64
+)
+
+SELECT_UNHASHED = """
+    SELECT p.PFileName
+    FROM dbo.Pictures p
+    LEFT JOIN dbo.PictureHashes h ON h.PFileName = p.PFileName
+    WHERE p.PType = 1 AND h.PFileName IS NULL
+    ORDER BY p.PFileName
+"""
+
+INSERT_HASH = "INSERT INTO dbo.PictureHashes (PFileName, DHash, PHash) VALUES (?, ?, ?)"
+
+SELECT_HASHES = """
+    SELECT h.PFileName, h.DHash, h.PHash, h.DuplicateOf
+    FROM dbo.PictureHashes h
+    INNER JOIN dbo.Pictures p ON p.PFileName = h.PFileName
+    ORDER BY p.PDateEntered, h.PFileName
+"""
+
+UPDATE_DUPLICATE = "UPDATE dbo.PictureHashes SET DuplicateOf = ? WHERE PFileName = ?"
+
+
+def _hash_photo(container, filename):
+    """(filename, dHash, pHash) or (filename, None, error)."""
+    try:
+        dhash, phash = compute_hashes(download_blob(container, filename))
+        return filename, dhash, phash
+    except Exception as e:
+        return filename, None, str(e)
+
+
+def hash_missing(conn, container, workers, batch_size, limit=None):
+    """Hash pictures without a PictureHashes row; returns (hashed, failed)."""
+    cursor = conn.cursor()
+    filenames = [row.PFileName for row in cursor.execute(SELECT_UNHASHED).fetchall()][:limit]
+    print(f"{len(filenames)} pictures to hash with {workers} workers")
+
+    hashed = failed = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(filenames), batch_size):
+            rows = []
+            for filename, dhash, result in executor.map(
+                lambda name: _hash_photo(container, name), filenames[start:start + batch_size]
+            ):
+                if dhash is None:
+                    failed += 1
+                    logging.warning(f"{filename}: {result}")
+                else:
+                    rows.append((filename, to_signed64(dhash), to_signed64(result)))
+            if rows:
+                cursor.executemany(INSERT_HASH, rows)
+                conn.commit()
+            hashed += len(rows)
+
+            elapsed = time.perf_counter() - started
+            done = hashed + failed
+            print(f"  {done}/{len(filenames)} pictures ({failed} failed) | {done / elapsed:.1f} pictures/sec")
+
+    cursor.close()
+    return hashed, failed
+
+
+def mark_duplicates(conn, radius, dhash_radius):
+    """Recompute DuplicateOf for all hashed pictures; returns (duplicates, changed)."""
+    cursor = conn.cursor()
+    rows = cursor.execute(SELECT_HASHES).fetchall()
+
+    started = time.perf_counter()
+    duplicates = find_duplicates(
+        [(row.PFileName, from_signed64(row.DHash), from_signed64(row.PHash)) for row in rows],
+        radius=radius,
+        dhash_radius=dhash_radius
+    )
+    print(f"Indexed {len(rows)} hashes: {len(duplicates)} near-duplicates of "
+          f"{len(set(duplicates.values()))} originals in {time.perf_counter() - started:.1f}s")
+
+    changes = [
+        (duplicates.get(row.PFileName), row.PFileName)
+        for row in rows
+        if duplicates.get(row.PFileName) != row.DuplicateOf
+    ]
+    if changes:
+        cursor.executemany(UPDATE_DUPLICATE, changes)
+        conn.commit()
+    cursor.close()
+    return len(duplicates), len(changes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent downloads (default 8)')
+    parser.add_argument('--batch-size', type=int, default=200, help='Hash rows per transaction (default 200)')
+    parser.add_argument('--limit', type=int, default=None, help='Hash at most this many pictures')
+    parser.add_argument('--radius', type=int, default=DEFAULT_RADIUS,
+                        help=f'pHash bits that may differ between copies (default {DEFAULT_RADIUS})')
+    parser.add_argument('--dhash-radius', type=int, default=None,
+                        help='dHash bits that may differ between copies (default 2 x radius)')
+    parser.add_argument('--skip-hashing', action='store_true', help='Only recompute DuplicateOf')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    container = os.environ.get('BLOB_CONTAINER_NAME', 'family-album-media')
+
+    conn = get_db_connection()
+    try:
+        if not args.skip_hashing:
+            hashed, failed = hash_missing(conn, container, args.workers, args.batch_size, args.limit)
+            print(f"Hashed {hashed} pictures ({failed} failed; re-run to retry)")
+        duplicates, changed = mark_duplicates(conn, args.radius, args.dhash_radius)
+        print(f"{duplicates} pictures marked as duplicates ({changed} changed)")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
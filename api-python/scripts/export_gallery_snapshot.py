@@ -0,0 +1,77 @@
+"""
+Export the embedding gallery to a memory-mapped snapshot directory.
+
+Loads the FaceEmbeddings rows of the configured model pack (as the
+faces-identify-v2 index does) and publishes them as a new snapshot version
+under --dir (see shared_python/gallery_snapshot.py). Workers with
+GALLERY_SNAPSHOT_DIR pointing at the same directory map the new version on
+their next refresh. Workers also publish snapshots themselves when theirs is
+stale, so this is only needed to pre-warm a host, e.g. after a re-embed.
+
+Requires AZURE_SQL_CONNECTIONSTRING.
+
+Usage:
+    python scripts/export_gallery_snapshot.py --dir /home/site/gallery-snapshot
+    python scripts/export_gallery_snapshot.py --show
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_python.utils import get_db_connection
+from shared_python.embedding_index import EmbeddingIndex
+from shared_python.gallery_snapshot import read_manifest, write_snapshot
+from shared_python.insightface_utils import get_model_version
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dir', default=os.environ.get('GALLERY_SNAPSHOT_DIR'),
+                        help='Snapshot directory (default: GALLERY_SNAPSHOT_DIR)')
+    parser.add_argument('--model-version', default=None,
+                        help='FaceEmbeddings.ModelVersion to export (default: configured model pack)')
+    parser.add_argument('--show', action='store_true', help='Print the live manifest and exit')
+    args = parser.parse_args()
+
+    if not args.dir:
+        parser.error('--dir or GALLERY_SNAPSHOT_DIR is required')
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.show:
+        manifest = read_manifest(args.dir)
+        if manifest is None:
+            print(f"No snapshot in {args.dir}")
+        else:
+            for key, value in manifest.items():
+                print(f"{key:12s} {value}")
+        return
+
+    started = time.perf_counter()
+    index = EmbeddingIndex(get_db_connection, model_version=args.model_version or get_model_version())
+    gallery = index.refresh(full=True)
+    manifest = write_snapshot(
+        args.dir,
+        gallery.ids,
+        gallery.person_ids,
+        gallery.person_names,
+        gallery.embeddings,
+        index.model_version,
+        max_id=gallery.max_id,
+        max_updated=gallery.max_updated,
+        skipped_ids=gallery.skipped_ids
+    )
+    size_mb = gallery.embeddings.nbytes / (1024 * 1024)
+    print(
+        f"Published {manifest['version']}: {manifest['rows']} rows ({size_mb:.1f} MB matrix) "
+        f"in {time.perf_counter() - started:.1f}s -> {manifest['path']}"
+    )
+
+
+if __name__ == '__main__':
+    main()
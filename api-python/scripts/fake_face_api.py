@@ -0,0 +1,199 @@
+"""
+Local stand-in for the Azure Face API PersonGroup endpoints.
+
+Implements just what shared_python/face_seeding.py calls, in memory:
+
+    GET/PUT  /face/v1.0/persongroups/{group}
+    POST     /face/v1.0/persongroups/{group}/persons
+    POST     /face/v1.0/persongroups/{group}/persons/{person}/persistedFaces
+    POST     /face/v1.0/persongroups/{group}/train
+    GET      /face/v1.0/persongroups/{group}/training
+    GET      /_stats                     request, throttle and face counts
+
+Like the real service it enforces a transactions-per-second quota (requests
+over it get 429 with a Retry-After header), checks the
+Ocp-Apim-Subscription-Key header, and adds a little latency. Image URLs are
+not fetched. --error-rate injects random 500s to exercise retries and
+per-item failure reporting (failed adds are left for the next run).
+
+Usage:
+    python scripts/fake_face_api.py --port 5055 --tps 10
+    FACE_API_ENDPOINT=http://localhost:5055 FACE_API_KEY=local python scripts/seed_face_api.py
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_GROUP = re.compile(r'^/face/v1\.0/persongroups/([^/]+)(/.*)?$')
+
+
+class FakeFaceApi:
+    def __init__(self, tps, key, latency_ms, error_rate, retry_after, train_seconds=5):
+        self.tps = tps
+        self.key = key
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.train_seconds = train_seconds
+        self.lock = threading.Lock()
+        self.window = (0, 0)  # (second, requests in it)
+        self.groups = {}
+        self.stats = {'requests': 0, 'throttled': 0, 'errors': 0, 'persons': 0, 'faces': 0, 'duplicateFaces': 0,
+                      'trainingPolls': 0}
+
+    def admit(self):
+        """Count a request against the per-second quota; False when over it."""
+        with self.lock:
+            self.stats['requests'] += 1
+            second = int(time.monotonic())
+            start, count = self.window
+            count = count + 1 if start == second else 1
+            self.window = (second, count)
+            if count > self.tps:
+                self.stats['throttled'] += 1
+                return False
+            return True
+
+    def handle(self, method, path, body):
+        """Returns (status, payload)."""
+        if path == '/_stats':
+            with self.lock:
+                return 200, dict(self.stats)
+
+        match = _GROUP.match(path)
+        if not match:
+            return 404, _error('NotFound', 'Resource not found.')
+        group_id, rest = match.group(1), match.group(2) or ''
+
+        with self.lock:
+            group = self.groups.get(group_id)
+            if rest == '' and method == 'PUT':
+                self.groups[group_id] = {'name': body.get('name'), 'persons': {}, 'training': None}
+                return 200, None
+            if group is None:
+                return 404, _error('PersonGroupNotFound', f"Person group '{group_id}' is not found.")
+            if rest == '' and method == 'GET':
+                return 200, {'personGroupId': group_id, 'name': group['name']}
+
+            if rest == '/persons' and method == 'POST':
+                person_id = str(uuid.uuid4())
+                group['persons'][person_id] = {'name': body.get('name'), 'userData': body.get('userData'), 'faces': {}}
+                self.stats['persons'] += 1
+                return 200, {'personId': person_id}
+
+            face_match = re.match(r'^/persons/([^/]+)/persistedFaces$', rest)
+            if face_match and method == 'POST':
+                person = group['persons'].get(face_match.group(1))
+                if person is None:
+                    return 404, _error('PersonNotFound', 'Person is not found.')
+                url = body.get('url', '')
+                if url.split('?')[0] in person['faces'].values():
+                    self.stats['duplicateFaces'] += 1
+                face_id = str(uuid.uuid4())
+                person['faces'][face_id] = url.split('?')[0]
+                self.stats['faces'] += 1
+                return 200, {'persistedFaceId': face_id}
+
+            if rest == '/train' and method == 'POST':
+                group['training'] = time.time()
+                return 202, None
+            if rest == '/training' and method == 'GET':
+                if group['training'] is None:
+                    return 404, _error('PersonGroupNotTrained', 'Person group not trained.')
+                running = time.time() - group['training'] < self.train_seconds
+                self.stats['trainingPolls'] += 1
+                return 200, {'status': 'running' if running else 'succeeded'}
+
+        return 404, _error('NotFound', 'Resource not found.')
+
+
+def _error(code, message):
+    return {'error': {'code': code, 'message': message}}
+
+
+def make_handler(api):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _dispatch(self, method):
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+            path = self.path.split('?')[0]
+
+            if path != '/_stats':
+                if self.headers.get('Ocp-Apim-Subscription-Key') != api.key:
+                    return self._send(401, _error('401', 'Access denied due to invalid subscription key.'))
+                if not api.admit():
+                    return self._send(
+                        429,
+                        _error('429', f'Rate limit is exceeded. Try again in {api.retry_after} seconds.'),
+                        {'Retry-After': str(api.retry_after)}
+                    )
+                time.sleep(api.latency * random.uniform(0.5, 1.5))
+                if random.random() < api.error_rate:
+                    with api.lock:
+                        api.stats['errors'] += 1
+                    return self._send(500, _error('InternalServerError', 'Injected failure.'))
+
+            try:
+                body = json.loads(raw) if raw else {}
+            except ValueError:
+                return self._send(400, _error('BadArgument', 'Invalid request body.'))
+            status, payload = api.handle(method, path, body)
+            self._send(status, payload)
+
+        def _send(self, status, payload, headers=None):
+            data = json.dumps(payload).encode('utf-8') if payload is not None else b''
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._dispatch('GET')
+
+        def do_PUT(self):
+            self._dispatch('PUT')
+
+        def do_POST(self):
+            self._dispatch('POST')
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--key', default='local', help='Expected Ocp-Apim-Subscription-Key (default local)')
+    parser.add_argument('--tps', type=int, default=10, help='Requests per second before 429 (default 10)')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds on 429 (default 1)')
+    parser.add_argument('--latency-ms', type=float, default=50, help='Mean added latency (default 50)')
+    parser.add_argument('--train-seconds', type=float, default=5, help='Time training stays running (default 5)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests failing with 500')
+    args = parser.parse_args()
+
+    api = FakeFaceApi(args.tps, args.key, args.latency_ms, args.error_rate, args.retry_after, args.train_seconds)
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(api))
+    print(f"Fake Face API on http://127.0.0.1:{args.port} ({args.tps} TPS, key '{args.key}')")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(api.stats, indent=2), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,398 @@
+"""
+Rebuild the InsightFace gallery (dbo.FaceEmbeddings) from tagged photos.
+
+Reads photos tagged with people (dbo.NamePhoto -> dbo.NameEvent, neType 'N')
+in PFileName order with keyset pagination, embeds the largest face of each
+photo on a process pool, and writes FaceEmbeddings rows for every tagged
+person in batches, one transaction per batch. Rows are upserted on photo,
+person and ModelVersion with FaceEmbeddingWriter (shared_python/embedding_writer.py),
+so existing rows are updated in place.
+
+Progress is checkpointed in dbo.FaceTrainingProgress (TrainingType 'ReEmbed'):
+LastProcessedPhoto is only advanced past photos whose rows are committed, so
+after a crash the next run resumes from the checkpoint (use --restart to
+start over). Progress lines report photos/sec, faces/sec and ETA.
+
+By default only photos tagged with a single person are used: with several
+tagged people the largest face cannot be attributed to one of them
+(--max-people 3 matches the admin UI training, which assigns it to each).
+
+--skip-duplicates leaves out near-duplicate copies (PictureHashes.DuplicateOf,
+see scripts/compute_picture_hashes.py) whose tagged people are all tagged on
+the original too, so each picture is embedded once.
+
+Each worker process loads its own model with --threads-per-worker ONNX
+Runtime threads; --cpu-budget caps the total cores used.
+
+Requires AZURE_SQL_CONNECTIONSTRING, AZURE_STORAGE_CONNECTION_STRING,
+database/widen-training-progress-last-photo.sql and
+database/add-face-embeddings-unique-key.sql.
+
+Usage:
+    python scripts/reembed_gallery.py
+    python scripts/reembed_gallery.py --cpu-budget 6 --threads-per-worker 2 --batch-size 200
+    python scripts/reembed_gallery.py --restart --limit 500 --dry-run
+    python scripts/reembed_gallery.py --skip-duplicates
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_python.utils import get_db_connection
+from shared_python.embedding_writer import FaceEmbeddingWriter
+
+TRAINING_TYPE = 'ReEmbed'
+
+TAGGED_FILTER = """
+    INNER JOIN dbo.NameEvent ne ON np.npID = ne.ID
+    INNER JOIN dbo.Pictures p ON np.npFileName = p.PFileName
+    WHERE ne.neType = 'N' AND np.npID != 1 AND p.PType = 1
+    {skip_duplicates}
+"""
+
+# Copies that add no tagged person over their original (database/add-picture-hashes.sql)
+SKIP_DUPLICATES = """
+    AND NOT EXISTS (
+        SELECT 1 FROM dbo.PictureHashes ph
+        WHERE ph.PFileName = np.npFileName
+        AND ph.DuplicateOf IS NOT NULL
+        AND NOT EXISTS (
+            SELECT 1 FROM dbo.NamePhoto copy_np
+            WHERE copy_np.npFileName = ph.PFileName
+            AND copy_np.npID != 1
+            AND copy_np.npID NOT IN (
+                SELECT original_np.npID FROM dbo.NamePhoto original_np
+                WHERE original_np.npFileName = ph.DuplicateOf
+            )
+        )
+    )
+"""
+
+COUNT_PHOTOS = f"""
+    SELECT COUNT(*) FROM (
+        SELECT np.npFileName
+        FROM dbo.NamePhoto np
+        {TAGGED_FILTER}
+        AND np.npFileName > ?
+        GROUP BY np.npFileName
+        HAVING COUNT(DISTINCT np.npID) <= ?
+    ) eligible
+"""
+
+# One page of photos after the keyset position, with every tagged person
+SELECT_PAGE = f"""
+    WITH Page AS (
+        SELECT TOP (?) np.npFileName AS PFileName
+        FROM dbo.NamePhoto np
+        {TAGGED_FILTER}
+        AND np.npFileName > ?
+        GROUP BY np.npFileName
+        HAVING COUNT(DISTINCT np.npID) <= ?
+        ORDER BY np.npFileName
+    )
+    SELECT DISTINCT pg.PFileName, np.npID AS PersonID
+    FROM Page pg
+    INNER JOIN dbo.NamePhoto np ON np.npFileName = pg.PFileName
+    INNER JOIN dbo.NameEvent ne ON np.npID = ne.ID
+    WHERE ne.neType = 'N' AND np.npID != 1
+    ORDER BY pg.PFileName
+"""
+
+SELECT_SESSION = """
+    SELECT TOP 1 SessionID, TotalPhotos, ProcessedPhotos, SuccessfulFaces, FailedFaces, LastProcessedPhoto
+    FROM dbo.FaceTrainingProgress
+    WHERE Status = 'InProgress' AND TrainingType = ?
+    ORDER BY StartedAt DESC
+"""
+
+CANCEL_SESSIONS = """
+    UPDATE dbo.FaceTrainingProgress
+    SET Status = 'Cancelled', UpdatedAt = GETDATE()
+    WHERE Status = 'InProgress' AND TrainingType = ?
+"""
+
+INSERT_SESSION = """
+    INSERT INTO dbo.FaceTrainingProgress (TrainingType, TotalPhotos)
+    OUTPUT INSERTED.SessionID
+    VALUES (?, ?)
+"""
+
+UPDATE_CHECKPOINT = """
+    UPDATE dbo.FaceTrainingProgress
+    SET ProcessedPhotos = ?, SuccessfulFaces = ?, FailedFaces = ?,
+        LastProcessedPhoto = ?, UpdatedAt = GETDATE()
+    WHERE SessionID = ?
+"""
+
+COMPLETE_SESSION = """
+    UPDATE dbo.FaceTrainingProgress
+    SET Status = ?, CompletedAt = GETDATE(), ErrorMessage = ?, UpdatedAt = GETDATE()
+    WHERE SessionID = ?
+"""
+
+# Per-process state of pool workers (set by _init_worker)
+_fetch = None
+_max_faces = 3
+
+
+def _init_worker(threads, max_faces):
+    """Pool initializer: ONNX Runtime threads, blob fetcher and model, once per process."""
+    global _fetch, _max_faces
+
+    os.environ['ORT_INTRA_OP_THREADS'] = str(threads)
+    os.environ['ORT_INTER_OP_THREADS'] = '1'
+    logging.basicConfig(level=logging.WARNING)
+
+    from shared_python.embedding_pipeline import make_blob_fetcher
+    from shared_python.insightface_utils import load_insightface_model
+
+    _fetch = make_blob_fetcher(
+        os.environ['AZURE_STORAGE_CONNECTION_STRING'],
+        os.environ.get('BLOB_CONTAINER_NAME', 'family-album-media')
+    )
+    _max_faces = max_faces
+    load_insightface_model()
+
+
+def _embed_photo(filename):
+    """Worker: (embedding float32 array or None, error or None) for one photo."""
+    from shared_python.insightface_utils import generate_face_embedding
+
+    try:
+        result = generate_face_embedding(_fetch(filename), max_faces=_max_faces)
+    except Exception as e:
+        return None, str(e)
+    if result is None:
+        return None, 'No suitable face found'
+    return result['embedding'], None
+
+
+class ReembedJob:
+    """Keyset reader, checkpointed batch writer and progress reporting for one run."""
+
+    def __init__(self, conn, model_version, max_people, batch_size, dry_run=False, skip_duplicates=False):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.model_version = model_version
+        self.max_people = max_people
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        duplicates_filter = SKIP_DUPLICATES if skip_duplicates else ''
+        self.count_sql = COUNT_PHOTOS.format(skip_duplicates=duplicates_filter)
+        self.page_sql = SELECT_PAGE.format(skip_duplicates=duplicates_filter)
+
+        self.session_id = None
+        self.checkpoint = ''
+        self.watermark = None
+        self.unflushed_photos = 0
+        self.total = 0
+        self.processed = 0
+        self.faces = 0
+        self.failed = 0
+        # Committed together with the checkpoint in flush(); never flushes on its own
+        self.writer = FaceEmbeddingWriter(
+            conn, model_version, batch_size=None, flush_seconds=0, commit=False
+        )
+        self.started = time.perf_counter()
+        self.processed_at_start = 0
+        self.faces_at_start = 0
+
+    def open_session(self, restart):
+        """Resume the latest in-progress ReEmbed session, or start one."""
+        if restart and not self.dry_run:
+            self.cursor.execute(CANCEL_SESSIONS, TRAINING_TYPE)
+
+        row = None if restart else self.cursor.execute(SELECT_SESSION, TRAINING_TYPE).fetchone()
+        if row is not None:
+            self.session_id = row.SessionID
+            self.checkpoint = row.LastProcessedPhoto or ''
+            self.processed = row.ProcessedPhotos
+            self.faces = row.SuccessfulFaces
+            self.failed = row.FailedFaces
+            remaining = self.cursor.execute(self.count_sql, self.checkpoint, self.max_people).fetchone()[0]
+            self.total = self.processed + remaining
+            print(f"Resuming session {self.session_id} after '{self.checkpoint}' "
+                  f"({self.processed}/{self.total} photos done)")
+        else:
+            self.total = self.cursor.execute(self.count_sql, '', self.max_people).fetchone()[0]
+            if not self.dry_run:
+                self.session_id = self.cursor.execute(INSERT_SESSION, TRAINING_TYPE, self.total).fetchone()[0]
+            print(f"Started session {self.session_id}: {self.total} photos")
+
+        self.conn.commit()
+        self.processed_at_start = self.processed
+        self.faces_at_start = self.faces
+
+    def iter_photos(self, page_size, limit=None):
+        """Yield (PFileName, [PersonID]) after the checkpoint, in PFileName order."""
+        position = self.checkpoint
+        yielded = 0
+        while limit is None or yielded < limit:
+            rows = self.cursor.execute(self.page_sql, page_size, position, self.max_people).fetchall()
+            if not rows:
+                return
+
+            persons = {}
+            for row in rows:
+                persons.setdefault(row.PFileName, []).append(row.PersonID)
+            for filename, person_ids in persons.items():
+                yield filename, person_ids
+                yielded += 1
+                if limit is not None and yielded >= limit:
+                    return
+            position = rows[-1].PFileName
+
+    def add_result(self, filename, person_ids, embedding, error):
+        """Record a finished photo; call in PFileName order so the watermark is a safe checkpoint."""
+        self.processed += 1
+        self.unflushed_photos += 1
+        self.watermark = filename
+        if embedding is None:
+            self.failed += 1
+            logging.info(f"{filename}: {error}")
+            return
+
+        if not self.dry_run:
+            for person_id in person_ids:
+                self.writer.add(person_id, filename, embedding)
+        self.faces += len(person_ids)
+
+    def should_flush(self):
+        return len(self.writer) >= self.batch_size or self.unflushed_photos >= self.batch_size
+
+    def flush(self):
+        """Write pending rows and advance the checkpoint to the watermark in one transaction."""
+        if self.watermark is None or self.watermark == self.checkpoint:
+            return
+        if not self.dry_run:
+            self.writer.flush()
+            self.cursor.execute(
+                UPDATE_CHECKPOINT,
+                self.processed, self.faces, self.failed, self.watermark, self.session_id
+            )
+            self.conn.commit()
+        self.unflushed_photos = 0
+        self.checkpoint = self.watermark
+
+    def report(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-6)
+        photo_rate = (self.processed - self.processed_at_start) / elapsed
+        face_rate = (self.faces - self.faces_at_start) / elapsed
+        remaining = max(self.total - self.processed, 0)
+        eta = f"{remaining / photo_rate / 60:.1f} min" if photo_rate > 0 else '?'
+        write_rate = self.writer.stats()['rowsPerSecond']
+        print(
+            f"{self.processed}/{self.total} photos ({self.failed} without face), {self.faces} faces | "
+            f"{photo_rate:.1f} photos/sec, {face_rate:.1f} faces/sec | "
+            f"writes {write_rate or 0:.0f} rows/sec | ETA {eta}"
+        )
+
+    def complete(self, status, error=None):
+        if self.session_id is not None and not self.dry_run:
+            self.cursor.execute(COMPLETE_SESSION, status, error, self.session_id)
+            self.conn.commit()
+
+
+def run(args):
+    from shared_python.insightface_utils import get_model_version
+
+    cpu_budget = args.cpu_budget or os.cpu_count() or 1
+    workers = max(1, int(cpu_budget // args.threads_per_worker))
+    in_flight_limit = workers * 4
+
+    conn = get_db_connection()
+    job = ReembedJob(
+        conn, get_model_version(), args.max_people, args.batch_size, args.dry_run, args.skip_duplicates
+    )
+    try:
+        job.open_session(args.restart)
+        print(f"{workers} workers x {args.threads_per_worker} threads (CPU budget {cpu_budget}), "
+              f"ModelVersion {job.model_version}{' (dry run)' if args.dry_run else ''}")
+
+        # Futures in PFileName order; results are consumed in that order so the
+        # checkpoint never moves past a photo whose rows are not committed
+        in_flight = deque()
+        last_report = time.perf_counter()
+
+        def drain(block):
+            nonlocal last_report
+            if block:
+                wait([future for _, _, future in in_flight], return_when=FIRST_COMPLETED)
+            while in_flight and in_flight[0][2].done():
+                filename, person_ids, future = in_flight.popleft()
+                job.add_result(filename, person_ids, *future.result())
+                if job.should_flush():
+                    job.flush()
+            if time.perf_counter() - last_report >= args.report_seconds:
+                job.report()
+                last_report = time.perf_counter()
+
+        submitted = 0
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(args.threads_per_worker, args.max_faces)
+        ) as executor:
+            for filename, person_ids in job.iter_photos(args.page_size, args.limit):
+                in_flight.append((filename, person_ids, executor.submit(_embed_photo, filename)))
+                submitted += 1
+                while len(in_flight) >= in_flight_limit:
+                    drain(block=True)
+                drain(block=False)
+
+            while in_flight:
+                drain(block=True)
+
+        job.flush()
+        job.report()
+        if args.limit is None or submitted < args.limit:
+            job.complete('Completed')
+            print('Done')
+        else:
+            print(f"Stopped after --limit {args.limit} photos; re-run to continue")
+    except KeyboardInterrupt:
+        print('Interrupted; re-run to resume from the last checkpoint')
+        raise
+    except Exception as e:
+        logging.error(f"Re-embedding failed: {e}")
+        raise
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cpu-budget', type=float, default=None,
+                        help='Cores to use in total (default: all cores)')
+    parser.add_argument('--threads-per-worker', type=int, default=1,
+                        help='ONNX Runtime threads per worker process (default 1)')
+    parser.add_argument('--batch-size', type=int, default=100, help='FaceEmbeddings rows per transaction (default 100)')
+    parser.add_argument('--page-size', type=int, default=500, help='Photos read per keyset page (default 500)')
+    parser.add_argument('--max-people', type=int, default=1,
+                        help='Skip photos tagged with more people than this (default 1)')
+    parser.add_argument('--max-faces', type=int, default=3,
+                        help='Skip photos with more detected faces than this (default 3)')
+    parser.add_argument('--limit', type=int, default=None,
+                        help='Stop after this many photos; the session stays resumable')
+    parser.add_argument('--skip-duplicates', action='store_true',
+                        help='Skip near-duplicate copies whose people are tagged on the original (PictureHashes)')
+    parser.add_argument('--restart', action='store_true', help='Cancel the in-progress session and start over')
+    parser.add_argument('--report-seconds', type=float, default=10, help='Seconds between progress lines')
+    parser.add_argument('--dry-run', action='store_true', help='Embed but do not write rows or checkpoints')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Seed an Azure Face API PersonGroup from manually tagged photos.
+
+Runs the shared_python/face_seeding.py pipeline: (photo, person) pairs that
+are not yet in dbo.FaceSeedLedger are added concurrently under the
+FACE_API_TPS rate limit, so running it again only sends what is missing.
+Point FACE_API_ENDPOINT at scripts/fake_face_api.py to try it locally.
+
+Requires AZURE_SQL_CONNECTIONSTRING, AZURE_STORAGE_CONNECTION_STRING,
+FACE_API_ENDPOINT, FACE_API_KEY, database/add-azure-face-persons.sql and
+database/add-face-seed-ledger.sql.
+
+Usage:
+    python scripts/seed_face_api.py --limit 500
+    python scripts/seed_face_api.py --max-per-person 5 --concurrency 16 --tps 10 --train
+    python scripts/seed_face_api.py --dry-run
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared_python.face_seeding import (
+    PERSON_GROUP_ID,
+    get_face_api_client,
+    pending_photos,
+    seed_faces,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--group', default=PERSON_GROUP_ID, help=f'PersonGroup ID (default {PERSON_GROUP_ID})')
+    parser.add_argument('--limit', type=int, default=None, help='Seed at most this many faces')
+    parser.add_argument('--max-per-person', type=int, default=None,
+                        help='Baseline seeding: newest N photos per person')
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help='Requests in flight (default FACE_SEED_CONCURRENCY or 8)')
+    parser.add_argument('--tps', type=float, default=None,
+                        help='Transactions per second (default FACE_API_TPS or 10)')
+    parser.add_argument('--train', action='store_true', help='Start PersonGroup training afterwards')
+    parser.add_argument('--dry-run', action='store_true', help='Only count pending faces')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.tps:
+        os.environ['FACE_API_TPS'] = str(args.tps)
+
+    photos = pending_photos(args.group, limit=args.limit, max_per_person=args.max_per_person)
+    print(f"{len(photos)} faces pending for PersonGroup '{args.group}'")
+    if args.dry_run or not photos:
+        return
+
+    client = get_face_api_client()
+    client.ensure_person_group(args.group)
+    summary = seed_faces(client, photos, args.group, concurrency=args.concurrency)
+    print(json.dumps(summary, indent=2))
+
+    if args.train and summary['facesAdded']:
+        client.train(args.group)
+        print(f"Training started for '{args.group}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+"""
+Approximate nearest-neighbor search for the InsightFace gallery.
+
+IVF-flat in pure NumPy: embeddings are partitioned by spherical k-means into
+nlist cells; a query only scans the nprobe cells whose centroids are closest.
+nprobe is the recall/latency knob (nprobe == nlist is an exact scan).
+
+The probe only produces candidates. The best-scoring candidate persons are
+then rescored exactly over all of their stored embeddings, so the per-person
+top-3 average reported for a match is identical to the brute-force result;
+approximation can only cause a person to be missed, never mis-scored.
+
+A saved index records the ModelVersion and gallery size its centroids were
+trained for; load() ignores it for another model, and when the gallery has
+grown or shrunk so much that default_nlist() is more than NLIST_DRIFT times
+off, so the caller retrains instead of scanning ever larger cells.
+"""
+
+import os
+import logging
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from shared_python.insightface_utils import (
+    match_faces_against_matrix,
+    normalize_embeddings,
+    subset_person_rows
+)
+
+# Rows scored per matrix product when assigning embeddings to cells
+_ASSIGN_CHUNK = 8192
+
+# Saved centroids are retrained once default_nlist() differs from nlist by more than this factor
+NLIST_DRIFT = 2.0
+
+
+def default_nlist(num_rows: int) -> int:
+    """Rule of thumb: about 2 * sqrt(N) cells, at least 1."""
+    return max(1, int(2 * np.sqrt(num_rows)))
+
+
+def _assign(embeddings: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Return the nearest centroid (max cosine) for each row, in bounded-memory chunks."""
+    labels = np.empty(len(embeddings), dtype=np.int32)
+    for start in range(0, len(embeddings), _ASSIGN_CHUNK):
+        chunk = embeddings[start:start + _ASSIGN_CHUNK]
+        labels[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return labels
+
+
+def train_centroids(
+    embeddings: np.ndarray,
+    nlist: int,
+    iterations: int = 10,
+    sample_size: Optional[int] = None,
+    seed: int = 0
+) -> np.ndarray:
+    """
+    Spherical k-means over (a sample of) normalized embeddings.
+
+    Args:
+        embeddings: (N, D) L2-normalized matrix
+        nlist: Number of cells
+        iterations: Lloyd iterations
+        sample_size: Rows used for training (default min(N, 32 * nlist))
+        seed: RNG seed for sampling and initialization
+
+    Returns:
+        (nlist, D) float32 matrix of unit-length centroids
+    """
+    rng = np.random.default_rng(seed)
+    nlist = min(nlist, len(embeddings))
+
+    sample_size = min(len(embeddings), sample_size or 32 * nlist)
+    sample = embeddings[rng.choice(len(embeddings), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = _assign(sample, centroids)
+
+        order = np.argsort(labels, kind='stable')
+        used, starts = np.unique(labels[order], return_index=True)
+        sums = np.add.reduceat(sample[order], starts, axis=0)
+        centroids[used] = normalize_embeddings(sums)
+
+        # Re-seed empty cells from random sample rows
+        empty = np.setdiff1d(np.arange(nlist), used)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+
+    return np.ascontiguousarray(centroids, dtype=np.float32)
+
+
+class IVFFlatIndex:
+    """
+    Inverted-file index over gallery row positions.
+
+    Instances are immutable: with_changes() returns a new index, so each
+    gallery snapshot can carry its own index without locking.
+
+    Args:
+        centroids: (nlist, D) unit-length cell centroids
+        assignments: Cell of every gallery row, aligned with the gallery matrix
+        trained_rows: Gallery rows when the centroids were trained (None if unknown)
+    """
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray, trained_rows: Optional[int] = None):
+        self.centroids = centroids
+        self.assignments = assignments
+        self.trained_rows = trained_rows
+
+        # CSR layout of the inverted lists
+        self._list_rows = np.argsort(assignments, kind='stable')
+        self._list_starts = np.searchsorted(
+            assignments[self._list_rows], np.arange(len(centroids) + 1)
+        )
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, nlist: Optional[int] = None, **train_kwargs) -> 'IVFFlatIndex':
+        """Train centroids on the gallery and assign every row."""
+        centroids = train_centroids(embeddings, nlist or default_nlist(len(embeddings)), **train_kwargs)
+        return cls(centroids, _assign(embeddings, centroids), trained_rows=len(embeddings))
+
+    def with_changes(
+        self,
+        replaced_positions: np.ndarray,
+        replaced_embeddings: np.ndarray,
+        appended_embeddings: np.ndarray
+    ) -> 'IVFFlatIndex':
+        """Return an index that reflects updated and newly appended gallery rows."""
+        assignments = self.assignments.copy()
+        if len(replaced_positions):
+            assignments[replaced_positions] = _assign(replaced_embeddings, self.centroids)
+        if len(appended_embeddings):
+            assignments = np.concatenate([assignments, _assign(appended_embeddings, self.centroids)])
+        return IVFFlatIndex(self.centroids, assignments, trained_rows=self.trained_rows)
+
+    def probe(self, query_embeddings: np.ndarray, nprobe: int) -> List[np.ndarray]:
+        """
+        Return candidate gallery rows for each query.
+
+        Args:
+            query_embeddings: (Q, D) normalized queries
+            nprobe: Number of closest cells scanned per query
+
+        Returns:
+            One array of gallery row positions per query
+        """
+        nprobe = max(1, min(nprobe, self.nlist))
+        centroid_scores = query_embeddings @ self.centroids.T
+        if nprobe < self.nlist:
+            cells = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            cells = np.broadcast_to(np.arange(self.nlist), centroid_scores.shape)
+
+        return [
+            np.concatenate([
+                self._list_rows[self._list_starts[c]:self._list_starts[c + 1]] for c in query_cells
+            ])
+            for query_cells in cells
+        ]
+
+    def save(self, path: str, row_ids: np.ndarray, model_version: str = ''):
+        """
+        Persist the index next to the gallery row IDs and ModelVersion it was built for.
+
+        Written to a per-process temporary file and renamed, so readers never
+        see a partial file and workers saving at once do not interleave.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            assignments=self.assignments,
+            row_ids=row_ids,
+            model_version=np.array(model_version),
+            trained_rows=np.array(self.trained_rows if self.trained_rows is not None else -1)
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        embeddings: np.ndarray,
+        row_ids: np.ndarray,
+        model_version: str = ''
+    ) -> Optional['IVFFlatIndex']:
+        """
+        Load a saved index for the given gallery.
+
+        Saved assignments are reused when the row IDs match exactly; otherwise
+        the saved centroids are kept and rows are re-assigned, which is far
+        cheaper than retraining. Returns None if nothing usable is on disk:
+        no file, another ModelVersion (or a file saved without one), another
+        dimension, or an nlist more than NLIST_DRIFT times off default_nlist()
+        for the current gallery size.
+        """
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with np.load(path) as data:
+                centroids = data['centroids']
+                saved_ids = data['row_ids']
+                assignments = data['assignments']
+                saved_version = str(data['model_version']) if 'model_version' in data else None
+                trained_rows = int(data['trained_rows']) if 'trained_rows' in data else -1
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable IVF index at {path}: {e}")
+            return None
+
+        if saved_version != model_version:
+            logging.info(f"Ignoring IVF index at {path}: built for model {saved_version!r}, not {model_version!r}")
+            return None
+        if centroids.shape[1] != embeddings.shape[1]:
+            return None
+
+        expected = default_nlist(len(embeddings))
+        if not expected / NLIST_DRIFT <= len(centroids) <= expected * NLIST_DRIFT:
+            logging.info(
+                f"Ignoring IVF index at {path}: {len(centroids)} cells trained on {trained_rows} rows, "
+                f"{len(embeddings)} rows now want about {expected}"
+            )
+            return None
+
+        trained_rows = trained_rows if trained_rows >= 0 else None
+        if np.array_equal(saved_ids, row_ids):
+            return cls(centroids, assignments, trained_rows=trained_rows)
+        return cls(centroids, _assign(embeddings, centroids), trained_rows=trained_rows)
+
+
+def match_faces_ivf(
+    query_embeddings: np.ndarray,
+    embeddings: np.ndarray,
+    person_ids: np.ndarray,
+    person_names: np.ndarray,
+    groups: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    segments: np.ndarray,
+    index: IVFFlatIndex,
+    thresholds: Sequence[float],
+    top_ks: Sequence[Optional[int]],
+    nprobe: int,
+    shortlist: int
+) -> List[List[Dict]]:
+    """
+    Match queries using the IVF index as a candidate generator.
+
+    For each query: scan the nprobe closest cells, keep the `shortlist`
+    persons with the highest candidate score, then rescore every stored
+    embedding of those persons exactly.
+
+    Args:
+        query_embeddings: (Q, D) query embeddings
+        embeddings: (N, D) normalized gallery matrix
+        person_ids, person_names: Per-row person data
+        groups: group_by_person(person_ids)
+        segments: row_segments(groups)
+        index: IVF index aligned with the gallery rows
+        thresholds, top_ks: Per-query threshold and result limit
+        nprobe: Cells scanned per query
+        shortlist: Persons rescored exactly per query
+
+    Returns:
+        One list of matches per query, same format as match_faces_against_matrix
+    """
+    queries = normalize_embeddings(np.atleast_2d(query_embeddings))
+    results = []
+
+    for q, candidate_rows in enumerate(index.probe(queries, nprobe)):
+        if len(candidate_rows) == 0:
+            results.append([])
+            continue
+
+        # Best candidate score per person decides the shortlist
+        scores = embeddings[candidate_rows] @ queries[q]
+        candidate_segments = segments[candidate_rows]
+        best = np.full(len(groups[1]), -np.inf, dtype=np.float32)
+        np.maximum.at(best, candidate_segments, scores)
+
+        touched = np.unique(candidate_segments)
+        if len(touched) > shortlist:
+            touched = touched[np.argpartition(-best[touched], shortlist - 1)[:shortlist]]
+
+        rows, sub_groups = subset_person_rows(groups, touched)
+        results.append(match_faces_against_matrix(
+            queries[q:q + 1],
+            embeddings[rows],
+            person_ids[rows],
+            person_names[rows],
+            thresholds=thresholds[q],
+            top_ks=top_ks[q],
+            groups=sub_groups,
+            normalized=True
+        )[0])
+
+    return results
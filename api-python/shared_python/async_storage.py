@@ -0,0 +1,344 @@
+"""
+Asynchronous blob storage access (azure.storage.blob.aio).
+
+For async Functions handlers and scripts: transfers are awaited instead of
+holding a worker thread, so one slow blob only delays the coroutine waiting
+for it.
+
+- One aiohttp ClientSession per event loop is shared by every aio
+  BlobServiceClient and by fetch_url_async, so connections are kept alive
+  across calls (aiohttp sessions cannot be used from another loop).
+- download_many / upload_many run up to `concurrency` transfers at once,
+  bounded by a semaphore; results come back in input order with failures
+  in place, so one bad blob never fails the batch.
+- Downloads stream in STORAGE_CHUNK_MB chunks and stop with
+  BlobTooLargeError as soon as a blob is known to exceed max_bytes, without
+  buffering the rest.
+- Transient failures (connection errors, timeouts, 408/429/5xx) are
+  retried with full-jitter exponential backoff, honouring Retry-After. The
+  SDK's own retry policy is turned off so the two do not multiply.
+
+Works against the Azurite emulator with `UseDevelopmentStorage=true` or a
+connection string whose BlobEndpoint is http://127.0.0.1:10000/devstoreaccount1.
+
+Configuration (environment variables):
+- AZURE_STORAGE_CONNECTION_STRING / BLOB_CONTAINER_NAME: Defaults for every call (container default family-album-media)
+- STORAGE_ASYNC_CONCURRENCY: Transfers in flight per download_many/upload_many call (default 16)
+- STORAGE_MAX_BLOB_MB: Default download size cap (default 50; 0 = no cap)
+- STORAGE_CHUNK_MB: Download chunk size (default 4)
+- STORAGE_MAX_RETRIES: Retries per transfer (default 4)
+- STORAGE_RETRY_BASE_SECONDS: Backoff base; attempt n waits up to base * 2^n (default 0.5)
+- STORAGE_RETRY_MAX_SECONDS: Longest backoff (default 10)
+"""
+
+import os
+import random
+import asyncio
+import logging
+import weakref
+from urllib.parse import urlsplit
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar, Union
+
+import aiohttp
+from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.storage.blob import ContentSettings
+from azure.storage.blob.aio import BlobServiceClient, ContainerClient
+
+DEFAULT_CONCURRENCY = int(os.environ.get('STORAGE_ASYNC_CONCURRENCY', '16'))
+DEFAULT_MAX_BYTES = int(float(os.environ.get('STORAGE_MAX_BLOB_MB', '50')) * 1024 * 1024)
+CHUNK_SIZE = int(float(os.environ.get('STORAGE_CHUNK_MB', '4')) * 1024 * 1024)
+MAX_RETRIES = int(os.environ.get('STORAGE_MAX_RETRIES', '4'))
+RETRY_BASE_SECONDS = float(os.environ.get('STORAGE_RETRY_BASE_SECONDS', '0.5'))
+RETRY_MAX_SECONDS = float(os.environ.get('STORAGE_RETRY_MAX_SECONDS', '10'))
+
+RETRY_STATUSES = (408, 429, 500, 502, 503, 504)
+
+T = TypeVar('T')
+
+
+class BlobTooLargeError(Exception):
+    """Raised when a download exceeds its max_bytes cap."""
+
+    def __init__(self, name: str, size: int, max_bytes: int):
+        super().__init__(f"{name} is {size} bytes, over the {max_bytes} byte limit")
+        self.size = size
+        self.max_bytes = max_bytes
+
+
+class _LoopState:
+    """Session and clients owned by one event loop."""
+
+    def __init__(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
+        )
+        self.clients: Dict[str, BlobServiceClient] = {}
+
+
+_states: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]' = weakref.WeakKeyDictionary()
+
+
+def _state() -> _LoopState:
+    # Only touched from the running loop's thread, so no lock is needed
+    loop = asyncio.get_running_loop()
+    state = _states.get(loop)
+    if state is None or state.session.closed:
+        state = _LoopState()
+        _states[loop] = state
+    return state
+
+
+def _defaults(container_name: Optional[str], connection_string: Optional[str]) -> Tuple[str, str]:
+    connection_string = connection_string or os.environ.get('AZURE_STORAGE_CONNECTION_STRING')
+    if not connection_string:
+        raise Exception('AZURE_STORAGE_CONNECTION_STRING environment variable not set')
+    return container_name or os.environ.get('BLOB_CONTAINER_NAME', 'family-album-media'), connection_string
+
+
+def get_async_service_client(connection_string: Optional[str] = None) -> BlobServiceClient:
+    """Return the aio BlobServiceClient for a connection string on the running event loop."""
+    _, connection_string = _defaults(None, connection_string)
+    state = _state()
+    client = state.clients.get(connection_string)
+    if client is None:
+        client = BlobServiceClient.from_connection_string(
+            connection_string,
+            transport=AioHttpTransport(session=state.session, session_owner=False),
+            retry_total=0,
+            max_single_get_size=CHUNK_SIZE,
+            max_chunk_get_size=CHUNK_SIZE
+        )
+        state.clients[connection_string] = client
+    return client
+
+
+def get_async_container_client(
+    container_name: Optional[str] = None,
+    connection_string: Optional[str] = None
+) -> ContainerClient:
+    container_name, connection_string = _defaults(container_name, connection_string)
+    return get_async_service_client(connection_string).get_container_client(container_name)
+
+
+def _is_transient(error: Exception) -> bool:
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status in RETRY_STATUSES
+    if isinstance(error, (asyncio.TimeoutError, aiohttp.ClientError, ServiceRequestError, ServiceResponseError)):
+        return True
+    if isinstance(error, HttpResponseError):
+        return error.status_code in RETRY_STATUSES
+    return False
+
+
+def _retry_after(error: Exception) -> float:
+    # aiohttp errors carry the response headers themselves; SDK errors carry the response
+    if isinstance(error, aiohttp.ClientResponseError):
+        headers = error.headers
+    else:
+        headers = getattr(getattr(error, 'response', None), 'headers', None)
+    try:
+        return float(headers.get('Retry-After', 0)) if headers is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+async def with_retries(operation: Callable[[], Awaitable[T]], description: str, max_retries: int = MAX_RETRIES) -> T:
+    """
+    Await operation(), retrying transient failures with full-jitter exponential backoff.
+
+    Args:
+        operation: Zero-argument coroutine function; called again for every attempt
+        description: What is being done, for log messages
+        max_retries: Retries after the first attempt
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return await operation()
+        except Exception as e:
+            if attempt >= max_retries or not _is_transient(e):
+                raise
+            delay = max(random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt)), _retry_after(e))
+            logging.warning(f"{description} failed ({e.__class__.__name__}: {e}); retry {attempt + 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+async def _open_download(container: ContainerClient, blob_name: str, max_bytes: Optional[int]):
+    """Start a download (fetches the first chunk); rejects blobs over max_bytes up front."""
+    downloader = await container.download_blob(blob_name, max_concurrency=1)
+    if max_bytes and downloader.size > max_bytes:
+        raise BlobTooLargeError(blob_name, downloader.size, max_bytes)
+    return downloader
+
+
+async def _read_chunks(downloader, blob_name: str, max_bytes: Optional[int]) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in downloader.chunks():
+        received += len(chunk)
+        # The blob may have grown since its size was read
+        if max_bytes and received > max_bytes:
+            raise BlobTooLargeError(blob_name, received, max_bytes)
+        yield chunk
+
+
+async def iter_blob_chunks(
+    blob_name: str,
+    container_name: Optional[str] = None,
+    connection_string: Optional[str] = None,
+    max_bytes: Optional[int] = DEFAULT_MAX_BYTES
+) -> AsyncIterator[bytes]:
+    """
+    Stream a blob in chunks of at most STORAGE_CHUNK_MB.
+
+    Opening the download is retried; a failure after chunks were yielded is
+    raised to the caller, who decides whether to start over.
+
+    Raises:
+        BlobTooLargeError: The blob is larger than max_bytes (0/None = no cap)
+    """
+    container = get_async_container_client(container_name, connection_string)
+    downloader = await with_retries(
+        lambda: _open_download(container, blob_name, max_bytes),
+        f"Download of {blob_name}"
+    )
+    async for chunk in _read_chunks(downloader, blob_name, max_bytes):
+        yield chunk
+
+
+async def download_blob_async(
+    blob_name: str,
+    container_name: Optional[str] = None,
+    connection_string: Optional[str] = None,
+    max_bytes: Optional[int] = DEFAULT_MAX_BYTES
+) -> bytes:
+    """Download a whole blob (chunked, size-capped); transient failures restart the download."""
+    container = get_async_container_client(container_name, connection_string)
+
+    async def download():
+        downloader = await _open_download(container, blob_name, max_bytes)
+        data = bytearray()
+        async for chunk in _read_chunks(downloader, blob_name, max_bytes):
+            data += chunk
+        return bytes(data)
+
+    return await with_retries(download, f"Download of {blob_name}")
+
+
+async def upload_blob_async(
+    blob_name: str,
+    data: bytes,
+    content_type: Optional[str] = None,
+    container_name: Optional[str] = None,
+    connection_string: Optional[str] = None,
+    overwrite: bool = True
+):
+    """Upload bytes to a blob; retried as a whole, so data must be bytes, not a stream."""
+    container = get_async_container_client(container_name, connection_string)
+    content_settings = ContentSettings(content_type=content_type) if content_type else None
+    await with_retries(
+        lambda: container.upload_blob(blob_name, data, overwrite=overwrite, content_settings=content_settings),
+        f"Upload of {blob_name}"
+    )
+
+
+async def _bounded(semaphore: asyncio.Semaphore, operation: Callable[[], Awaitable[T]]) -> Union[T, Exception]:
+    async with semaphore:
+        try:
+            return await operation()
+        except Exception as e:
+            return e
+
+
+async def download_many(
+    blob_names: Sequence[str],
+    container_name: Optional[str] = None,
+    connection_string: Optional[str] = None,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    max_bytes: Optional[int] = DEFAULT_MAX_BYTES
+) -> List[Union[bytes, Exception]]:
+    """
+    Download many blobs with at most `concurrency` in flight.
+
+    Returns:
+        One entry per name in input order: the blob bytes, or the exception
+        that download raised after its retries
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    return await asyncio.gather(*(
+        _bounded(semaphore, lambda name=name: download_blob_async(name, container_name, connection_string, max_bytes))
+        for name in blob_names
+    ))
+
+
+async def upload_many(
+    items: Iterable[Tuple],
+    container_name: Optional[str] = None,
+    connection_string: Optional[str] = None,
+    concurrency: int = DEFAULT_CONCURRENCY
+) -> List[Optional[Exception]]:
+    """
+    Upload many blobs with at most `concurrency` in flight.
+
+    Args:
+        items: (blob_name, data) or (blob_name, data, content_type) tuples
+
+    Returns:
+        One entry per item in input order: None on success, else the exception
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def upload(item):
+        name, data, content_type = (tuple(item) + (None,))[:3]
+        await upload_blob_async(name, data, content_type, container_name, connection_string)
+
+    return await asyncio.gather(*(_bounded(semaphore, lambda item=item: upload(item)) for item in items))
+
+
+def _is_account_url(url: str, connection_string: Optional[str]) -> bool:
+    """True if url points into the blob endpoint of the configured account (Azurite included)."""
+    endpoint = urlsplit(get_async_service_client(connection_string).url)
+    target = urlsplit(url)
+    return (
+        (target.scheme, target.netloc.lower()) == (endpoint.scheme, endpoint.netloc.lower())
+        and target.path.startswith(endpoint.path.rstrip('/') + '/')
+    )
+
+
+async def fetch_url_async(
+    url: str,
+    max_bytes: Optional[int] = DEFAULT_MAX_BYTES,
+    connection_string: Optional[str] = None
+) -> bytes:
+    """
+    Download a blob URL (e.g. with SAS token) on the shared session, size-capped and retried.
+
+    Only URLs under the configured account's blob endpoint are fetched.
+    """
+    if not _is_account_url(url, connection_string):
+        raise ValueError('Only blob URLs of the configured storage account are supported')
+
+    async def fetch():
+        async with _state().session.get(url) as response:
+            response.raise_for_status()
+            if max_bytes and (response.content_length or 0) > max_bytes:
+                raise BlobTooLargeError(url.split('?')[0], response.content_length, max_bytes)
+            data = bytearray()
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                data += chunk
+                if max_bytes and len(data) > max_bytes:
+                    raise BlobTooLargeError(url.split('?')[0], len(data), max_bytes)
+            return bytes(data)
+
+    return await with_retries(fetch, f"Download of {url.split('?')[0]}")
+
+
+async def close_async_storage():
+    """Close the running loop's clients and session (scripts call this before the loop ends)."""
+    loop = asyncio.get_running_loop()
+    state = _states.pop(loop, None)
+    if state is None:
+        return
+    for client in state.clients.values():
+        await client.close()
+    await state.session.close()
@@ -0,0 +1,99 @@
+"""
+Small in-process TTL + LRU cache.
+
+Used for lookups that are read on every request but change rarely (e.g. the
+dbo.Users row behind check_authorization). Each worker process has its own
+copy, so the TTL bounds how long a change made elsewhere goes unseen.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe mapping with per-entry expiry and a least-recently-used cap.
+
+    Negative results (loader returned None) can be cached with their own,
+    usually shorter, TTL so repeated lookups of unknown keys stay cheap too.
+
+    Args:
+        max_entries: Entries kept before the least recently used is evicted
+        ttl: Seconds a found value stays valid
+        negative_ttl: Seconds a None result stays valid (0 disables negative caching)
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 60.0, negative_ttl: float = 15.0):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value, or default if absent or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value; None is stored with the negative TTL (or not at all)."""
+        ttl = self.negative_ttl if value is None else self.ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Return the cached value, calling loader() on a miss and caching its result.
+
+        Exceptions from loader are not cached.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = loader()
+        self.set(key, value)
+        return value
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Drop one key, or everything when key is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict:
+        """Size, hit/miss counts and hit rate. Every hit is a load that was skipped."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'evictions': self._evictions,
+            }
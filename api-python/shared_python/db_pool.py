@@ -0,0 +1,356 @@
+"""
+Connection pool for Azure SQL (pyodbc).
+
+Opening a connection to Azure SQL costs a TCP + TLS handshake and a login,
+often more than the query itself. The pool keeps a bounded set of open
+connections shared by query_db/execute_db, check_authorization and the
+faces-identify-v2 embedding index.
+
+- Bounded: at most max_size connections; callers wait up to `timeout`
+  seconds for one to be released, then PoolExhaustedError is raised.
+- Liveness: a connection idle longer than ping_interval is checked with
+  SELECT 1 on checkout and replaced if it is dead.
+- Recycling: connections older than max_age are closed instead of reused.
+- Thread affinity: a thread gets back the connection it last released when
+  that one is idle, so Functions worker threads keep their own warm connection.
+- Transactions: connection() is a context manager. Nested use on the same
+  thread reuses the outer connection and only the outermost block commits,
+  so several statements can share one connection and transaction.
+"""
+
+import os
+import time
+import logging
+import threading
+import pyodbc
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no connection became available within the pool timeout."""
+
+
+class _Entry:
+    """An open connection plus the bookkeeping the pool needs."""
+
+    __slots__ = ('raw', 'created', 'last_used', 'owner')
+
+    def __init__(self, raw):
+        now = time.monotonic()
+        self.raw = raw
+        self.created = now
+        self.last_used = now
+        self.owner = None
+
+
+class PooledConnection:
+    """
+    DB-API connection checked out from a ConnectionPool.
+
+    Behaves like the underlying pyodbc connection, except that close()
+    rolls back uncommitted work and returns it to the pool. Inside
+    ConnectionPool.connection() close() is a no-op; the block owns it.
+    """
+
+    def __init__(self, pool: 'ConnectionPool', entry: _Entry, managed: bool = False):
+        self._pool = pool
+        self._entry = entry
+        self._managed = managed
+
+    def __getattr__(self, name):
+        entry = self.__dict__.get('_entry')
+        if entry is None:
+            raise Exception('Connection has already been returned to the pool')
+        return getattr(entry.raw, name)
+
+    def close(self):
+        if self._managed or self._entry is None:
+            return
+        entry, self._entry = self._entry, None
+        self._pool.release(entry)
+
+
+class ConnectionPool:
+    """
+    Thread-safe bounded pool of DB-API connections.
+
+    Args:
+        connect: Callable returning a new DB-API connection
+        max_size: Maximum open connections (idle + in use)
+        timeout: Default seconds to wait for a free connection
+        max_age: Seconds after which a connection is closed instead of reused
+        ping_interval: Idle seconds after which a connection is pinged on checkout
+    """
+
+    def __init__(
+        self,
+        connect: Callable,
+        max_size: int = 5,
+        timeout: float = 10.0,
+        max_age: float = 1800.0,
+        ping_interval: float = 30.0
+    ):
+        self._connect = connect
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self.max_age = max_age
+        self.ping_interval = ping_interval
+
+        self._cond = threading.Condition()
+        self._idle = []    # most recently released last
+        self._size = 0     # open connections, including slots being connected
+        self._local = threading.local()
+
+        self._counters = {
+            'checkouts': 0,
+            'created': 0,
+            'affinity_hits': 0,
+            'waits': 0,
+            'exhausted': 0,
+            'recycled': 0,
+            'ping_failures': 0,
+            'discarded': 0,
+        }
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        """
+        Check out a connection; call close() on it to return it.
+
+        Args:
+            timeout: Seconds to wait for a free connection (default: pool timeout)
+
+        Returns:
+            PooledConnection
+        """
+        return PooledConnection(self, self._checkout(timeout))
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """
+        Use one connection and transaction for the duration of a with-block.
+
+        Commits when the outermost block exits normally and rolls back if it
+        raises. Nested blocks on the same thread get the same connection.
+        """
+        current = getattr(self._local, 'current', None)
+        if current is not None:
+            yield current
+            return
+
+        entry = self._checkout(timeout)
+        conn = PooledConnection(self, entry, managed=True)
+        self._local.current = conn
+        committed = False
+        try:
+            yield conn
+            entry.raw.commit()
+            committed = True
+        finally:
+            self._local.current = None
+            conn._entry = None
+            self.release(entry, reset=not committed)
+
+    def release(self, entry: _Entry, reset: bool = True):
+        """
+        Return a connection to the pool.
+
+        Args:
+            entry: Entry from _checkout
+            reset: Roll back uncommitted work first; connections that fail
+                the rollback are assumed broken and closed
+        """
+        if reset:
+            try:
+                entry.raw.rollback()
+            except Exception as e:
+                logging.warning(f"Discarding pooled connection after failed rollback: {e}")
+                self._discard(entry)
+                return
+
+        now = time.monotonic()
+        if now - entry.created > self.max_age:
+            self._counters['recycled'] += 1
+            self._discard(entry)
+            return
+
+        entry.last_used = now
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    def close_all(self):
+        """Close every idle connection (connections in use close on release)."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            self._close_quietly(entry)
+
+    def stats(self) -> Dict:
+        """Pool size, usage counters and checkout wait times."""
+        with self._cond:
+            checkouts = self._counters['checkouts']
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'max_size': self.max_size,
+                **self._counters,
+                'avg_wait_ms': round(self._wait_total / checkouts * 1000, 2) if checkouts else 0.0,
+                'max_wait_ms': round(self._wait_max * 1000, 2),
+            }
+
+    def _checkout(self, timeout: Optional[float]) -> _Entry:
+        timeout = self.timeout if timeout is None else timeout
+        ident = threading.get_ident()
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            entry = None
+            with self._cond:
+                waited = False
+                while True:
+                    entry = self._take_idle(ident)
+                    if entry is not None:
+                        break
+                    if self._size < self.max_size:
+                        # Reserve the slot; the connection is opened outside the lock
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['exhausted'] += 1
+                        logging.warning(
+                            f"Connection pool exhausted after {timeout:.1f}s "
+                            f"({self.max_size} connections in use)"
+                        )
+                        raise PoolExhaustedError(
+                            f'No database connection available within {timeout:.1f}s '
+                            f'(pool size {self.max_size})'
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+
+                wait = time.monotonic() - started
+                self._counters['checkouts'] += 1
+                self._counters['waits'] += int(waited)
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+
+            if entry is None:
+                try:
+                    entry = _Entry(self._connect())
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                self._counters['created'] += 1
+                break
+
+            if self._is_usable(entry):
+                break
+            self._discard(entry)
+
+        entry.owner = ident
+        return entry
+
+    def _take_idle(self, ident: int) -> Optional[_Entry]:
+        """Pop this thread's previous connection if idle, else the most recently used one."""
+        if not self._idle:
+            return None
+        for i in range(len(self._idle) - 1, -1, -1):
+            if self._idle[i].owner == ident:
+                self._counters['affinity_hits'] += 1
+                return self._idle.pop(i)
+        return self._idle.pop()
+
+    def _is_usable(self, entry: _Entry) -> bool:
+        now = time.monotonic()
+        if now - entry.created > self.max_age:
+            self._counters['recycled'] += 1
+            return False
+        if now - entry.last_used <= self.ping_interval:
+            return True
+
+        try:
+            cursor = entry.raw.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception as e:
+            self._counters['ping_failures'] += 1
+            logging.warning(f"Pooled connection failed liveness check, replacing it: {e}")
+            return False
+
+    def _discard(self, entry: _Entry):
+        self._close_quietly(entry)
+        with self._cond:
+            self._counters['discarded'] += 1
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_quietly(entry: _Entry):
+        try:
+            entry.raw.close()
+        except Exception:
+            pass
+
+
+def get_connection_string() -> str:
+    """
+    Connection string for the FamilyAlbum database.
+
+    AZURE_SQL_CONNECTIONSTRING when set; otherwise one assembled from
+    DB_SERVER, DB_DATABASE, DB_USER and DB_PASSWORD (local.settings.json).
+    """
+    connection_string = os.environ.get('AZURE_SQL_CONNECTIONSTRING')
+    if connection_string:
+        return connection_string
+
+    if os.environ.get('DB_SERVER'):
+        driver = os.environ.get('DB_DRIVER', 'ODBC Driver 17 for SQL Server')
+        return (
+            f"DRIVER={{{driver}}};"
+            f"SERVER={os.environ['DB_SERVER']};"
+            f"DATABASE={os.environ['DB_DATABASE']};"
+            f"UID={os.environ['DB_USER']};"
+            f"PWD={os.environ['DB_PASSWORD']}"
+        )
+
+    raise Exception('AZURE_SQL_CONNECTIONSTRING environment variable not set')
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Process-wide connection pool, configured from environment variables.
+
+    DB_POOL_SIZE, DB_POOL_TIMEOUT_SECONDS, DB_POOL_MAX_AGE_SECONDS and
+    DB_POOL_PING_SECONDS override the defaults.
+    """
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                connection_string = get_connection_string()
+                _pool = ConnectionPool(
+                    lambda: pyodbc.connect(connection_string),
+                    max_size=int(os.environ.get('DB_POOL_SIZE', '5')),
+                    timeout=float(os.environ.get('DB_POOL_TIMEOUT_SECONDS', '10')),
+                    max_age=float(os.environ.get('DB_POOL_MAX_AGE_SECONDS', '1800')),
+                    ping_interval=float(os.environ.get('DB_POOL_PING_SECONDS', '30'))
+                )
+                logging.info(f"Created database connection pool (max {_pool.max_size} connections)")
+
+    return _pool
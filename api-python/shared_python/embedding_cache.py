@@ -0,0 +1,277 @@
+"""
+Content-addressed cache of face detection results.
+
+The same photo goes through generate-embeddings many times (retraining,
+re-seeding, UI retries). Results are keyed by the SHA-256 of the image bytes
+plus a namespace describing everything else that changes the model output
+(model pack, modules, decode size), so a hit skips decoding and inference
+entirely.
+
+An entry is the full list of detected faces (bbox, landmarks, detection
+score, embedding). Per-request selection such as max_faces or minimum face
+size is applied after the lookup, so one entry serves every parameter
+combination.
+
+Two tiers:
+    memory: per-process LRU (cache.TTLCache without expiry)
+    disk:   SQLite file shared by the worker processes on the machine,
+            trimmed least-recently-used first when it exceeds its size cap
+
+Configuration (environment variables):
+    EMBEDDING_CACHE_ENABLED: Cache detection results (default true)
+    EMBEDDING_CACHE_MEMORY_ENTRIES: Images kept in memory per process (default 512)
+    EMBEDDING_CACHE_PATH: SQLite file (default <tmp>/embedding-cache.sqlite3; empty = memory only)
+    EMBEDDING_CACHE_MAX_MB: Disk tier size cap in MB (default 256; 0 = memory only)
+"""
+
+import os
+import json
+import time
+import base64
+import hashlib
+import logging
+import sqlite3
+import tempfile
+import threading
+import numpy as np
+from typing import Dict, List, Optional
+
+from shared_python.cache import TTLCache
+from shared_python.embedding_codec import decode_embedding, encode_embedding
+
+# Fraction of the cap the disk tier is trimmed down to, so eviction does not run on every write
+_EVICT_TO = 0.9
+# Writes between size checks of the disk tier
+_EVICT_CHECK_EVERY = 32
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def make_key(image_bytes: bytes, namespace: str) -> str:
+    """Cache key for image bytes under a model/parameter namespace."""
+    return f"{hashlib.sha256(image_bytes).hexdigest()}:{namespace}"
+
+
+def _encode_faces(faces: List[Dict]) -> bytes:
+    """Serialize face records (numpy bbox/kps/embedding) to JSON bytes."""
+    return json.dumps([
+        {
+            'bbox': np.asarray(face['bbox']).tolist(),
+            'kps': np.asarray(face['kps']).tolist() if face.get('kps') is not None else None,
+            'det_score': float(face['det_score']),
+            'embedding': base64.b64encode(encode_embedding(face['embedding'])).decode('ascii')
+            if face.get('embedding') is not None else None,
+        }
+        for face in faces
+    ], separators=(',', ':')).encode('utf-8')
+
+
+def _decode_faces(data: bytes) -> List[Dict]:
+    return [
+        {
+            'bbox': np.array(face['bbox'], dtype=np.float32),
+            'kps': np.array(face['kps'], dtype=np.float32) if face['kps'] is not None else None,
+            'det_score': face['det_score'],
+            'embedding': decode_embedding(base64.b64decode(face['embedding']))
+            if face['embedding'] is not None else None,
+        }
+        for face in json.loads(data)
+    ]
+
+
+class _DiskTier:
+    """SQLite key/value store with a size cap, evicted by last use."""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._writes = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' key TEXT PRIMARY KEY, value BLOB NOT NULL,'
+            ' size INTEGER NOT NULL, last_used REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS ix_entries_last_used ON entries (last_used)')
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute('UPDATE entries SET last_used = ? WHERE key = ?', (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, value: bytes):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO entries (key, value, size, last_used) VALUES (?, ?, ?, ?)',
+                (key, value, len(value), time.time())
+            )
+            self._writes += 1
+            if self._writes % _EVICT_CHECK_EVERY == 1:
+                self._evict()
+
+    def _evict(self):
+        """Delete least recently used entries until the total is under the cap (lock held)."""
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        excess = total - int(self.max_bytes * _EVICT_TO)
+        victims = []
+        for key, size in self._conn.execute('SELECT key, size FROM entries ORDER BY last_used'):
+            victims.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+
+        self._conn.executemany('DELETE FROM entries WHERE key = ?', victims)
+        self._evictions += len(victims)
+        logging.info(f"Embedding cache: evicted {len(victims)} entries from {self.path}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries'
+            ).fetchone()
+        return {
+            'path': self.path,
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'evictions': self._evictions,
+        }
+
+
+class EmbeddingCache:
+    """
+    Two-tier (memory LRU, then SQLite) cache of face lists by content key.
+
+    Disk errors are logged and counted but never raised: the cache only ever
+    saves work.
+
+    Args:
+        memory_entries: Face lists kept in memory before the least recently used is evicted
+        path: SQLite file for the disk tier (None = memory only)
+        max_bytes: Disk tier size cap
+    """
+
+    def __init__(self, memory_entries: int = 512, path: Optional[str] = None, max_bytes: int = 256 * 1024 * 1024):
+        self._memory = TTLCache(max_entries=memory_entries, ttl=float('inf'), negative_ttl=0)
+        self._disk = None
+        if path and max_bytes > 0:
+            try:
+                self._disk = _DiskTier(path, max_bytes)
+            except (OSError, sqlite3.Error) as e:
+                logging.warning(f"Embedding cache: disk tier disabled ({path}): {e}")
+
+        self._lock = threading.Lock()
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._errors = 0
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """Face records for key, or None on a miss."""
+        faces = self._memory.get(key)
+        if faces is not None:
+            self._count('_memory_hits')
+            return faces
+
+        if self._disk is not None:
+            try:
+                data = self._disk.get(key)
+                if data is not None:
+                    faces = _decode_faces(data)
+                    self._memory.set(key, faces)
+                    self._count('_disk_hits')
+                    return faces
+            except (sqlite3.Error, ValueError, KeyError) as e:
+                self._count('_errors')
+                logging.warning(f"Embedding cache: disk read failed: {e}")
+
+        self._count('_misses')
+        return None
+
+    def put(self, key: str, faces: List[Dict]):
+        """Store face records (dicts with bbox, kps, det_score, embedding) under key."""
+        self._memory.set(key, faces)
+        self._count('_writes')
+
+        if self._disk is not None:
+            try:
+                self._disk.put(key, _encode_faces(faces))
+            except (sqlite3.Error, ValueError) as e:
+                self._count('_errors')
+                logging.warning(f"Embedding cache: disk write failed: {e}")
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self) -> Dict:
+        """Hit/miss counts per tier. Every hit is a decode and inference that was skipped."""
+        with self._lock:
+            hits = self._memory_hits + self._disk_hits
+            lookups = hits + self._misses
+            stats = {
+                'hits': hits,
+                'memory_hits': self._memory_hits,
+                'disk_hits': self._disk_hits,
+                'misses': self._misses,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+                'writes': self._writes,
+                'errors': self._errors,
+            }
+
+        memory = self._memory.stats()
+        stats['memory'] = {
+            'size': memory['size'],
+            'max_entries': memory['max_entries'],
+            'evictions': memory['evictions'],
+        }
+        if self._disk is not None:
+            try:
+                stats['disk'] = self._disk.stats()
+            except sqlite3.Error as e:
+                stats['disk'] = {'path': self._disk.path, 'error': str(e)}
+        return stats
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Process-wide cache configured from the environment, or None when disabled."""
+    global _cache
+
+    if os.environ.get('EMBEDDING_CACHE_ENABLED', 'true').lower() not in ('1', 'true', 'yes'):
+        return None
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(
+                    memory_entries=int(os.environ.get('EMBEDDING_CACHE_MEMORY_ENTRIES', '512')),
+                    path=os.environ.get(
+                        'EMBEDDING_CACHE_PATH',
+                        os.path.join(tempfile.gettempdir(), 'embedding-cache.sqlite3')
+                    ),
+                    max_bytes=int(float(os.environ.get('EMBEDDING_CACHE_MAX_MB', '256')) * 1024 * 1024)
+                )
+    return _cache
+
+
+def get_embedding_cache_stats() -> Dict:
+    """Stats of the process-wide cache ({'enabled': False} when disabled)."""
+    cache = get_embedding_cache()
+    if cache is None:
+        return {'enabled': False}
+    return {'enabled': True, **cache.stats()}
@@ -0,0 +1,110 @@
+"""
+Binary storage format for face embeddings.
+
+FaceEmbeddings.Embedding historically holds a JSON array (NVARCHAR), which
+costs ~10 KB per 512-dim row on the wire plus a json.loads per read. The
+EmbeddingBinary column (VARBINARY) holds the same vector as:
+
+    8-byte header: magic 'FE', format version, dtype code, dimensions (uint16), reserved
+    payload:       raw little-endian float32 (or float16) values
+
+The 8-byte header keeps the payload 4-byte aligned, so float32 payloads are
+decoded with np.frombuffer as a zero-copy view over the row bytes.
+"""
+
+import json
+import struct
+import numpy as np
+from typing import Optional
+
+MAGIC = b'FE'
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('<2sBBHH')
+
+_DTYPES = {
+    1: np.dtype('<f4'),
+    2: np.dtype('<f2'),
+}
+_DTYPE_CODES = {dtype: code for code, dtype in _DTYPES.items()}
+
+
+def encode_embedding(embedding, dtype: str = 'float32') -> bytes:
+    """
+    Encode an embedding in the binary storage format.
+
+    Args:
+        embedding: 1-D array-like of floats
+        dtype: 'float32' (lossless) or 'float16' (half the size, ~1e-3 relative error)
+
+    Returns:
+        bytes: Header followed by little-endian values
+    """
+    storage_dtype = np.dtype(dtype).newbyteorder('<')
+    if storage_dtype not in _DTYPE_CODES:
+        raise ValueError(f'Unsupported embedding storage dtype: {dtype}')
+
+    values = np.asarray(embedding, dtype=storage_dtype)
+    if values.ndim != 1:
+        raise ValueError(f'Expected a 1-D embedding, got shape {values.shape}')
+
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, _DTYPE_CODES[storage_dtype], len(values), 0)
+    return header + values.tobytes()
+
+
+def is_binary_embedding(value) -> bool:
+    """Check whether a stored value uses the binary format."""
+    return isinstance(value, (bytes, bytearray, memoryview)) and bytes(value[:2]) == MAGIC
+
+
+def decode_embedding(value, dimensions: Optional[int] = None) -> np.ndarray:
+    """
+    Decode a stored embedding from either storage format.
+
+    Binary float32 values come back as a read-only view over the input
+    buffer (no copy); float16 values are widened to float32. JSON strings
+    and plain sequences are parsed as before.
+
+    Args:
+        value: bytes (binary format), str (JSON array) or array-like
+        dimensions: Expected length, validated if given
+
+    Returns:
+        1-D float32 numpy array
+
+    Raises:
+        ValueError: If the value is malformed or has the wrong length
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        if len(value) < _HEADER.size:
+            raise ValueError('Embedding buffer shorter than header')
+
+        magic, version, dtype_code, length, _ = _HEADER.unpack_from(value)
+        if magic != MAGIC:
+            raise ValueError('Embedding buffer has unknown magic bytes')
+        if version != FORMAT_VERSION:
+            raise ValueError(f'Unsupported embedding format version {version}')
+        if dtype_code not in _DTYPES:
+            raise ValueError(f'Unsupported embedding dtype code {dtype_code}')
+
+        dtype = _DTYPES[dtype_code]
+        if len(value) != _HEADER.size + length * dtype.itemsize:
+            raise ValueError('Embedding buffer length does not match header')
+
+        embedding = np.frombuffer(value, dtype=dtype, count=length, offset=_HEADER.size)
+        if dtype != np.float32:
+            embedding = embedding.astype(np.float32)
+    elif isinstance(value, str):
+        try:
+            embedding = np.asarray(json.loads(value), dtype=np.float32)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f'Invalid JSON embedding: {e}')
+    else:
+        embedding = np.asarray(value, dtype=np.float32)
+
+    if embedding.ndim != 1:
+        raise ValueError(f'Expected a 1-D embedding, got shape {embedding.shape}')
+    if dimensions is not None and len(embedding) != dimensions:
+        raise ValueError(f'Expected {dimensions}-dim embedding, got {len(embedding)}')
+
+    return embedding
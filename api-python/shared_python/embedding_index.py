@@ -0,0 +1,664 @@
+"""
+In-process InsightFace embedding index.
+
+Keeps the 512-dim gallery resident in the worker as a contiguous float32
+matrix with parallel ID / PersonID / PersonName arrays, so identify requests
+no longer re-query and re-parse every FaceEmbeddings row.
+
+Refresh strategy:
+- First use does a full load (ordered by ID).
+- Afterwards a cheap probe (COUNT / MAX(ID) / MAX(UpdatedDate)) decides whether
+  anything changed; if so only rows above the ID / UpdatedDate high-water mark
+  are fetched and merged.
+- Deletes are detected when the merged row count disagrees with the probe
+  count, which triggers a full reload. Rows that fail to decode are left out
+  of the matrix but still counted (and kept in the high-water marks), so
+  they do not look like a change on every probe. A full reload also runs after
+  max_age seconds to pick up person renames.
+- With stale-while-revalidate enabled, requests keep using the current
+  gallery while a background thread refreshes it.
+
+With a snapshot directory configured (see gallery_snapshot), the gallery is
+memory-mapped from the host's live snapshot so worker processes share one
+copy. A worker that finds the snapshot missing, out of date with the probe
+or older than max_age loads from the database and publishes a new one;
+changes are then picked up by re-mapping rather than merging in-heap.
+
+Rows are read from the binary EmbeddingBinary column when present, falling
+back to the JSON Embedding column for rows not yet converted.
+"""
+
+import os
+import time
+import logging
+import threading
+import datetime
+import numpy as np
+from typing import Callable, Dict, List, Optional, Sequence
+
+from shared_python.embedding_codec import decode_embedding
+from shared_python.gallery_snapshot import load_snapshot, read_manifest, write_snapshot
+from shared_python.insightface_utils import (
+    group_by_person,
+    match_faces_against_matrix,
+    get_model_version,
+    normalize_embeddings,
+    row_segments
+)
+from shared_python.ann_index import IVFFlatIndex, match_faces_ivf
+from shared_python.person_prototypes import PersonPrototypes, match_faces_prototypes
+
+INSIGHTFACE_MODEL_VERSION = 'insightface-arcface'
+EMBEDDING_DIMENSIONS = 512
+
+# Binary rows skip the JSON column entirely; only unconverted rows send JSON
+_GALLERY_SELECT = """
+    SELECT
+        fe.ID,
+        fe.PersonID,
+        ne.neName as PersonName,
+        fe.EmbeddingBinary,
+        CASE WHEN fe.EmbeddingBinary IS NULL THEN fe.Embedding END as Embedding,
+        fe.UpdatedDate
+    FROM FaceEmbeddings fe
+    JOIN NameEvent ne ON fe.PersonID = ne.ID
+    WHERE fe.ModelVersion = ?
+    AND fe.EmbeddingDimensions = ?
+"""
+
+# Used until database/add-embedding-binary-column.sql has been applied
+_GALLERY_SELECT_JSON_ONLY = """
+    SELECT
+        fe.ID,
+        fe.PersonID,
+        ne.neName as PersonName,
+        NULL as EmbeddingBinary,
+        fe.Embedding,
+        fe.UpdatedDate
+    FROM FaceEmbeddings fe
+    JOIN NameEvent ne ON fe.PersonID = ne.ID
+    WHERE fe.ModelVersion = ?
+    AND fe.EmbeddingDimensions = ?
+"""
+
+_BINARY_COLUMN_PROBE = "SELECT COL_LENGTH('dbo.FaceEmbeddings', 'EmbeddingBinary')"
+
+_GALLERY_PROBE = """
+    SELECT COUNT(*), MAX(ID), MAX(UpdatedDate)
+    FROM FaceEmbeddings
+    WHERE ModelVersion = ?
+    AND EmbeddingDimensions = ?
+"""
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes')
+
+
+class Gallery:
+    """
+    Immutable snapshot of the embedding gallery.
+
+    Embeddings are stored L2-normalized. Readers hold a reference to one
+    snapshot for the whole request; refreshes build a new snapshot and swap
+    it in, so no locking is needed on the read path.
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        person_ids: np.ndarray,
+        person_names: np.ndarray,
+        embeddings: np.ndarray,
+        max_id: Optional[int] = None,
+        max_updated=None,
+        ann: Optional[IVFFlatIndex] = None,
+        snapshot_version: Optional[str] = None,
+        prototypes: Optional[PersonPrototypes] = None,
+        skipped_ids: frozenset = frozenset()
+    ):
+        self.ids = ids
+        self.person_ids = person_ids
+        self.person_names = person_names
+        self.embeddings = embeddings
+        self.max_id = max_id
+        self.max_updated = max_updated
+        self.ann = ann
+        self.snapshot_version = snapshot_version
+        self.prototypes = prototypes
+        self.skipped_ids = skipped_ids
+        self._groups = None
+        self._segments = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def stored_rows(self) -> int:
+        """Stored rows this snapshot reflects, including rows that failed to decode."""
+        return len(self.ids) + len(self.skipped_ids)
+
+    @property
+    def groups(self):
+        """Person-sorted segment layout for vectorized matching (computed once per snapshot)."""
+        if self._groups is None:
+            self._groups = group_by_person(self.person_ids)
+        return self._groups
+
+    @property
+    def segments(self):
+        """Person segment index of every row (computed once per snapshot)."""
+        if self._segments is None:
+            self._segments = row_segments(self.groups)
+        return self._segments
+
+
+def _rows_to_arrays(rows, dimensions: int):
+    """
+    Convert DB rows to parallel arrays, skipping rows that fail to decode.
+
+    Returns ids, person_ids, names, the normalized matrix, the UpdatedDate of
+    every row (skipped ones included) and the IDs of the skipped rows.
+    """
+    ids, person_ids, names, vectors, updated, skipped = [], [], [], [], [], []
+    for row in rows:
+        updated.append(row.UpdatedDate)
+        stored = row.EmbeddingBinary if row.EmbeddingBinary is not None else row.Embedding
+        try:
+            embedding = decode_embedding(stored, dimensions)
+        except ValueError:
+            logging.error(f"Failed to parse embedding for ID {row.ID}")
+            skipped.append(row.ID)
+            continue
+        ids.append(row.ID)
+        person_ids.append(row.PersonID)
+        names.append(row.PersonName)
+        vectors.append(embedding)
+
+    matrix = np.vstack(vectors) if vectors else np.empty((0, dimensions), dtype=np.float32)
+    return (
+        np.asarray(ids, dtype=np.int64),
+        np.asarray(person_ids, dtype=np.int64),
+        np.asarray(names, dtype=object),
+        normalize_embeddings(matrix),
+        updated,
+        skipped
+    )
+
+
+class EmbeddingIndex:
+    """
+    Process-resident gallery of stored face embeddings with incremental refresh.
+
+    Args:
+        connect: Callable returning a DB-API connection; it is closed after each load,
+            so a pool's acquire() can be passed
+        model_version: FaceEmbeddings.ModelVersion to load
+        dimensions: Expected embedding size
+        refresh_interval: Seconds between change probes
+        max_age: Seconds after which a full reload is forced
+        stale_while_revalidate: Serve the current gallery while refreshing in the background
+        search: 'exact' (brute force), 'ivf' (approximate candidates + exact rescoring) or
+            'prototypes' (person shortlist from centroids/exemplars + exact rescoring)
+        ivf_min_rows: Galleries smaller than this are always searched exactly
+        ivf_nprobe: IVF cells scanned per query (recall/latency knob)
+        ivf_shortlist: Persons rescored exactly per query in IVF mode
+        ivf_path: Optional .npz path where the IVF index is persisted
+        prototype_shortlist: Persons rescored exactly per query in prototypes mode
+        prototype_exemplars: Exemplar embeddings kept per person in prototypes mode
+        snapshot_dir: Optional gallery snapshot directory shared by the host's workers
+    """
+
+    def __init__(
+        self,
+        connect: Callable,
+        model_version: str = INSIGHTFACE_MODEL_VERSION,
+        dimensions: int = EMBEDDING_DIMENSIONS,
+        refresh_interval: float = 30.0,
+        max_age: float = 3600.0,
+        stale_while_revalidate: bool = True,
+        search: str = 'exact',
+        ivf_min_rows: int = 20000,
+        ivf_nprobe: int = 16,
+        ivf_shortlist: int = 50,
+        ivf_path: Optional[str] = None,
+        prototype_shortlist: int = 50,
+        prototype_exemplars: int = 3,
+        snapshot_dir: Optional[str] = None
+    ):
+        self._connect = connect
+        self.model_version = model_version
+        self.dimensions = dimensions
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.stale_while_revalidate = stale_while_revalidate
+        self.search = search
+        self.ivf_min_rows = ivf_min_rows
+        self.ivf_nprobe = ivf_nprobe
+        self.ivf_shortlist = ivf_shortlist
+        self.ivf_path = ivf_path
+        self.prototype_shortlist = prototype_shortlist
+        self.prototype_exemplars = prototype_exemplars
+        self.snapshot_dir = snapshot_dir
+
+        self._gallery: Optional[Gallery] = None
+        self._gallery_select: Optional[str] = None
+        self._last_checked = 0.0
+        self._last_full_load = 0.0
+        self._refresh_lock = threading.Lock()
+        self._background_refresh: Optional[threading.Thread] = None
+
+    def get_gallery(self) -> Gallery:
+        """Return the current gallery, loading or refreshing it as needed."""
+        if self._gallery is None:
+            self.refresh()
+            return self._gallery
+
+        if time.monotonic() - self._last_checked >= self.refresh_interval:
+            if self.stale_while_revalidate:
+                self._start_background_refresh()
+            else:
+                self.refresh()
+
+        return self._gallery
+
+    def match_faces(
+        self,
+        gallery: Gallery,
+        query_embeddings: np.ndarray,
+        thresholds: Sequence[float],
+        top_ks: Sequence[Optional[int]],
+        nprobe: Optional[int] = None,
+        shortlist: Optional[int] = None
+    ) -> List[List[Dict]]:
+        """
+        Match query embeddings against a gallery snapshot with the configured search.
+
+        Args:
+            gallery: Snapshot from get_gallery()
+            query_embeddings: (Q, D) query embeddings
+            thresholds: Minimum similarity per query
+            top_ks: Max persons per query (None = all)
+            nprobe: Per-call override of the IVF nprobe
+            shortlist: Per-call override of the prototype shortlist size
+
+        The IVF and prototype shortlists are raised to the largest top_k so no
+        query is cut short; with top_k None a query returns at most the
+        shortlist's persons.
+
+        Returns:
+            One list of matches per query (see match_faces_against_matrix)
+        """
+        largest_top_k = max((k for k in top_ks if k), default=0)
+
+        if gallery.prototypes is not None:
+            return match_faces_prototypes(
+                query_embeddings,
+                gallery.embeddings,
+                gallery.person_ids,
+                gallery.person_names,
+                gallery.groups,
+                gallery.prototypes,
+                thresholds,
+                top_ks,
+                shortlist=max(shortlist or self.prototype_shortlist, largest_top_k)
+            )
+
+        if gallery.ann is not None:
+            return match_faces_ivf(
+                query_embeddings,
+                gallery.embeddings,
+                gallery.person_ids,
+                gallery.person_names,
+                gallery.groups,
+                gallery.segments,
+                gallery.ann,
+                thresholds,
+                top_ks,
+                nprobe=nprobe or self.ivf_nprobe,
+                shortlist=max(self.ivf_shortlist, largest_top_k)
+            )
+
+        return match_faces_against_matrix(
+            query_embeddings,
+            gallery.embeddings,
+            gallery.person_ids,
+            gallery.person_names,
+            thresholds=thresholds,
+            top_ks=top_ks,
+            groups=gallery.groups,
+            normalized=True
+        )
+
+    def refresh(self, full: bool = False) -> Gallery:
+        """Synchronously bring the gallery up to date with the database."""
+        with self._refresh_lock:
+            # Another thread may have refreshed while we waited for the lock
+            if (
+                not full
+                and self._gallery is not None
+                and time.monotonic() - self._last_checked < self.refresh_interval
+            ):
+                return self._gallery
+
+            expired = time.monotonic() - self._last_full_load >= self.max_age
+            if full or self._gallery is None or expired:
+                self._full_load()
+            else:
+                self._incremental_load()
+
+            self._last_checked = time.monotonic()
+            return self._gallery
+
+    def _start_background_refresh(self):
+        thread = self._background_refresh
+        if thread is not None and thread.is_alive():
+            return
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.error(f"Background embedding index refresh failed: {e}")
+
+        self._background_refresh = threading.Thread(
+            target=run, name='embedding-index-refresh', daemon=True
+        )
+        self._background_refresh.start()
+
+    def _full_load(self):
+        if self.snapshot_dir and self._load_snapshot():
+            return
+
+        started = time.perf_counter()
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(_BINARY_COLUMN_PROBE)
+            has_binary_column = cursor.fetchone()[0] is not None
+            self._gallery_select = _GALLERY_SELECT if has_binary_column else _GALLERY_SELECT_JSON_ONLY
+
+            cursor.execute(
+                self._gallery_select + " ORDER BY fe.ID",
+                (self.model_version, self.dimensions)
+            )
+            rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+
+        ids, person_ids, names, matrix, updated, skipped = _rows_to_arrays(rows, self.dimensions)
+        # High-water marks over every stored row, as the change probe sees them
+        max_id = int(rows[-1].ID) if rows else None
+        max_updated = max(updated) if updated else None
+        skipped_ids = frozenset(int(i) for i in skipped)
+        self._last_full_load = time.monotonic()
+        logging.info(
+            f"Embedding index loaded {len(ids)} embeddings in "
+            f"{(time.perf_counter() - started) * 1000:.0f}ms"
+        )
+
+        if self.snapshot_dir:
+            try:
+                write_snapshot(
+                    self.snapshot_dir, ids, person_ids, names, matrix, self.model_version,
+                    max_id=max_id, max_updated=max_updated, skipped_ids=skipped_ids
+                )
+                # Serve from the shared mapping so this process drops its private copy
+                if self._load_snapshot(probe=(len(rows), max_id, max_updated)):
+                    return
+            except OSError as e:
+                logging.warning(f"Could not write gallery snapshot to {self.snapshot_dir}: {e}")
+
+        self._gallery = self._build_prototypes(Gallery(
+            ids, person_ids, names, matrix,
+            max_id=max_id,
+            max_updated=max_updated,
+            ann=self._load_ann(ids, matrix),
+            skipped_ids=skipped_ids
+        ))
+
+    def _probe(self):
+        """(count, max_id, max_updated) of the stored gallery rows."""
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(_GALLERY_PROBE, (self.model_version, self.dimensions))
+            probe = tuple(cursor.fetchone())
+            cursor.close()
+        finally:
+            conn.close()
+        return probe
+
+    def _load_snapshot(self, probe=None) -> bool:
+        """Map the live snapshot if it matches the stored rows and is younger than max_age."""
+        manifest = read_manifest(self.snapshot_dir)
+        if manifest is None or manifest['modelVersion'] != self.model_version:
+            return False
+
+        created = datetime.datetime.fromisoformat(manifest['createdAt'].rstrip('Z'))
+        if (datetime.datetime.utcnow() - created).total_seconds() >= self.max_age:
+            return False
+
+        # Stored rows include those that failed to decode and are not in the files
+        skipped_ids = frozenset(manifest.get('skippedIds', []))
+        count, max_id, max_updated = probe or self._probe()
+        expected = (count, max_id, max_updated.isoformat() if max_updated is not None else None)
+        if (manifest['rows'] + len(skipped_ids), manifest['maxId'], manifest['maxUpdated']) != expected:
+            return False
+
+        snapshot = load_snapshot(self.snapshot_dir, self.model_version)
+        if snapshot is None or snapshot['version'] != manifest['version']:
+            return False
+
+        ids = snapshot['ids']
+        embeddings = snapshot['embeddings']
+        self._gallery = self._build_prototypes(Gallery(
+            ids, snapshot['person_ids'], snapshot['person_names'], embeddings,
+            max_id=snapshot['maxId'],
+            max_updated=snapshot['maxUpdated'],
+            ann=self._load_ann(ids, embeddings),
+            snapshot_version=snapshot['version'],
+            skipped_ids=skipped_ids
+        ))
+        self._last_full_load = time.monotonic()
+        return True
+
+    def _incremental_load(self):
+        gallery = self._gallery
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(_GALLERY_PROBE, (self.model_version, self.dimensions))
+            count, max_id, max_updated = cursor.fetchone()
+
+            if (
+                count == gallery.stored_rows
+                and max_id == gallery.max_id
+                and max_updated == gallery.max_updated
+            ):
+                cursor.close()
+                return
+
+            if self.snapshot_dir:
+                # Merging would copy the mapped matrix into this process; re-map instead
+                rows = None
+            elif gallery.max_id is None:
+                rows = []
+            else:
+                cursor.execute(
+                    self._gallery_select + " AND (fe.ID > ? OR fe.UpdatedDate > ?) ORDER BY fe.ID",
+                    (self.model_version, self.dimensions, gallery.max_id, gallery.max_updated)
+                )
+                rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+
+        if rows is None:
+            # Another worker may already have published a matching snapshot
+            self._full_load()
+            return
+
+        merged = self._merge(gallery, rows)
+
+        if merged.stored_rows != count:
+            # Rows were deleted (or the gallery was empty); IDs no longer line up
+            logging.info(
+                f"Embedding index count mismatch ({merged.stored_rows} local vs {count} stored), reloading"
+            )
+            self._full_load()
+            return
+
+        self._gallery = merged
+        logging.info(f"Embedding index merged {len(rows)} changed rows ({count} total)")
+
+    def _merge(self, gallery: Gallery, rows) -> Gallery:
+        """Apply changed rows: replace known IDs in place, append new IDs."""
+        if not rows:
+            return gallery
+
+        ids, person_ids, names, matrix, updated, skipped = _rows_to_arrays(rows, self.dimensions)
+        new_ids = gallery.ids.copy()
+        new_person_ids = gallery.person_ids.copy()
+        new_names = gallery.person_names.copy()
+        new_matrix = gallery.embeddings.copy()
+
+        # IDs are kept sorted ascending, so positions are a binary search away
+        positions = np.zeros(len(ids), dtype=np.int64)
+        known = np.zeros(len(ids), dtype=bool)
+        if len(new_ids):
+            positions = np.minimum(np.searchsorted(new_ids, ids), len(new_ids) - 1)
+            known = new_ids[positions] == ids
+
+        # Persons whose rows change (a replaced row may also move to another person)
+        changed_person_ids = np.concatenate([new_person_ids[positions[known]], person_ids])
+
+        new_person_ids[positions[known]] = person_ids[known]
+        new_names[positions[known]] = names[known]
+        new_matrix[positions[known]] = matrix[known]
+
+        appended = ~known
+        new_ids = np.concatenate([new_ids, ids[appended]])
+        new_person_ids = np.concatenate([new_person_ids, person_ids[appended]])
+        new_names = np.concatenate([new_names, names[appended]])
+        new_matrix = np.ascontiguousarray(np.vstack([new_matrix, matrix[appended]]))
+
+        # A known row that now fails to decode keeps its previous embedding;
+        # an undecodable new row is only counted. Rows that decode again are
+        # no longer skipped
+        skipped = np.asarray(skipped, dtype=np.int64)
+        skipped_ids = (gallery.skipped_ids - set(ids.tolist())) | set(
+            skipped[~np.isin(skipped, gallery.ids)].tolist()
+        )
+
+        max_id = max(int(row.ID) for row in rows)
+        if gallery.max_id is not None:
+            max_id = max(max_id, gallery.max_id)
+        max_updated = gallery.max_updated
+        if updated:
+            max_updated = max(updated) if max_updated is None else max(max_updated, max(updated))
+
+        if gallery.ann is not None:
+            ann = gallery.ann.with_changes(positions[known], matrix[known], matrix[appended])
+        else:
+            ann = self._load_ann(new_ids, new_matrix)
+
+        merged = Gallery(
+            new_ids, new_person_ids, new_names, new_matrix,
+            max_id=max_id,
+            max_updated=max_updated,
+            ann=ann,
+            skipped_ids=frozenset(skipped_ids)
+        )
+        if gallery.prototypes is None:
+            return self._build_prototypes(merged)
+
+        merged.prototypes = gallery.prototypes.with_changes(
+            merged.embeddings, merged.person_ids, merged.groups, changed_person_ids
+        )
+        return merged
+
+    def _build_prototypes(self, gallery: Gallery) -> Gallery:
+        """Attach freshly computed person prototypes to a gallery if prototype search is enabled."""
+        if self.search != 'prototypes':
+            return gallery
+
+        started = time.perf_counter()
+        gallery.prototypes = PersonPrototypes.build(
+            gallery.embeddings, gallery.person_ids, gallery.groups, exemplars=self.prototype_exemplars
+        )
+        logging.info(
+            f"Person prototypes ready: {len(gallery.prototypes)} persons over {len(gallery)} embeddings in "
+            f"{(time.perf_counter() - started) * 1000:.0f}ms"
+        )
+        return gallery
+
+    def _load_ann(self, ids: np.ndarray, matrix: np.ndarray) -> Optional[IVFFlatIndex]:
+        """Load or build the IVF index for a fully loaded gallery, if IVF search is enabled."""
+        if self.search != 'ivf' or len(ids) < self.ivf_min_rows:
+            return None
+
+        started = time.perf_counter()
+        ann = IVFFlatIndex.load(self.ivf_path, matrix, ids, self.model_version) if self.ivf_path else None
+        if ann is None:
+            ann = IVFFlatIndex.build(matrix)
+        if self.ivf_path:
+            try:
+                ann.save(self.ivf_path, ids, self.model_version)
+            except OSError as e:
+                logging.warning(f"Could not persist IVF index to {self.ivf_path}: {e}")
+
+        logging.info(
+            f"IVF index ready: {ann.nlist} cells over {len(ids)} embeddings in "
+            f"{(time.perf_counter() - started) * 1000:.0f}ms"
+        )
+        return ann
+
+
+_index: Optional[EmbeddingIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_embedding_index(connect: Callable) -> EmbeddingIndex:
+    """
+    Get the per-worker embedding index, creating it on first use.
+
+    Loads embeddings of the configured INSIGHTFACE_MODEL_PACK. Configured
+    through environment variables:
+        EMBEDDING_INDEX_REFRESH_SECONDS: Seconds between change probes (default 30)
+        EMBEDDING_INDEX_MAX_AGE_SECONDS: Seconds before a forced full reload (default 3600)
+        EMBEDDING_INDEX_STALE_WHILE_REVALIDATE: Refresh in the background (default true)
+        IDENTIFY_SEARCH: 'exact' (default), 'ivf' or 'prototypes'
+        IVF_MIN_ROWS: Smallest gallery that uses IVF search (default 20000)
+        IVF_NPROBE: IVF cells scanned per query (default 16)
+        IVF_SHORTLIST: Persons rescored exactly per query (default 50)
+        IVF_INDEX_PATH: Where to persist the IVF index (optional)
+        PROTOTYPE_SHORTLIST: Persons rescored exactly per query in prototypes mode (default 50)
+        PROTOTYPE_EXEMPLARS: Exemplars per person in prototypes mode (default 3)
+        GALLERY_SNAPSHOT_DIR: Host-local directory for memory-mapped gallery snapshots (optional)
+    """
+    global _index
+
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = EmbeddingIndex(
+                    connect,
+                    model_version=get_model_version(),
+                    refresh_interval=float(os.environ.get('EMBEDDING_INDEX_REFRESH_SECONDS', '30')),
+                    max_age=float(os.environ.get('EMBEDDING_INDEX_MAX_AGE_SECONDS', '3600')),
+                    stale_while_revalidate=_env_bool('EMBEDDING_INDEX_STALE_WHILE_REVALIDATE', True),
+                    search=os.environ.get('IDENTIFY_SEARCH', 'exact').lower(),
+                    ivf_min_rows=int(os.environ.get('IVF_MIN_ROWS', '20000')),
+                    ivf_nprobe=int(os.environ.get('IVF_NPROBE', '16')),
+                    ivf_shortlist=int(os.environ.get('IVF_SHORTLIST', '50')),
+                    ivf_path=os.environ.get('IVF_INDEX_PATH') or None,
+                    prototype_shortlist=int(os.environ.get('PROTOTYPE_SHORTLIST', '50')),
+                    prototype_exemplars=int(os.environ.get('PROTOTYPE_EXEMPLARS', '3')),
+                    snapshot_dir=os.environ.get('GALLERY_SNAPSHOT_DIR') or None
+                )
+    return _index
@@ -0,0 +1,139 @@
+"""
+Pipelined fetch -> decode -> inference for batches of images.
+
+A bounded thread pool downloads and decodes images concurrently (network
+I/O, Pillow and OpenCV all release the GIL). Decoded images go through a
+bounded queue to a single consumer that owns the InsightFace model, so
+downloads, decoding and inference overlap while memory stays bounded by
+queue_size + workers decoded images.
+
+Results are yielded in completion order, one dict per input, and a failure
+on one image never stops the batch.
+"""
+
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Sequence
+
+import requests
+
+from shared_python.storage import get_service_client
+
+# Seconds a worker waits on a full queue before re-checking for cancellation
+_PUT_POLL_SECONDS = 0.5
+
+_sessions = threading.local()
+
+
+def iter_pipeline(
+    sources: Sequence[Any],
+    fetch: Callable[[Any], bytes],
+    decode: Callable[[bytes], Any],
+    infer: Callable[[Any], Dict],
+    workers: int = 8,
+    queue_size: int = 8
+) -> Iterator[Dict]:
+    """
+    Run fetch and decode on a thread pool and infer on the calling thread.
+
+    Args:
+        sources: Items to process (blob names, URLs, ...)
+        fetch: source -> bytes (runs on worker threads)
+        decode: bytes -> image (runs on worker threads)
+        infer: image -> result dict (runs on the calling thread only)
+        workers: Concurrent fetch/decode threads
+        queue_size: Decoded images waiting for inference before workers block
+
+    Yields:
+        {'index', 'source', 'result', 'timings'} on success or
+        {'index', 'source', 'error', 'timings'} on failure, in completion order
+    """
+    if not sources:
+        return
+
+    ready = queue.Queue(maxsize=max(1, queue_size))
+    cancelled = threading.Event()
+
+    def load(index, source):
+        timings = {}
+        try:
+            started = time.perf_counter()
+            data = fetch(source)
+            timings['fetchMs'] = round((time.perf_counter() - started) * 1000, 1)
+
+            started = time.perf_counter()
+            image = decode(data)
+            timings['decodeMs'] = round((time.perf_counter() - started) * 1000, 1)
+            item = (index, source, image, None, timings)
+        except Exception as e:
+            item = (index, source, None, str(e), timings)
+
+        # Block while the consumer is behind, but give up if it went away
+        while not cancelled.is_set():
+            try:
+                ready.put(item, timeout=_PUT_POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='embedding-fetch')
+    try:
+        for index, source in enumerate(sources):
+            executor.submit(load, index, source)
+
+        for _ in range(len(sources)):
+            index, source, image, error, timings = ready.get()
+
+            if error is None:
+                try:
+                    started = time.perf_counter()
+                    result = infer(image)
+                    timings['inferMs'] = round((time.perf_counter() - started) * 1000, 1)
+                except Exception as e:
+                    error = str(e)
+                del image
+
+            if error is None:
+                yield {'index': index, 'source': source, 'result': result, 'timings': timings}
+            else:
+                logging.warning(f"Batch item {index} ({source}) failed: {error}")
+                yield {'index': index, 'source': source, 'error': error, 'timings': timings}
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _session() -> requests.Session:
+    """One HTTP session per worker thread, so connections are kept alive per host."""
+    session = getattr(_sessions, 'session', None)
+    if session is None:
+        session = requests.Session()
+        _sessions.session = session
+    return session
+
+
+def fetch_url(url: str, timeout: float = 30) -> bytes:
+    """Download an image over HTTPS (Azure blob URLs only, like the single-image path)."""
+    if 'blob.core.windows.net' not in url:
+        raise ValueError('Only Azure blob URLs are supported')
+    response = _session().get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.content
+
+
+def make_blob_fetcher(connection_string: str, container_name: str) -> Callable[[str], bytes]:
+    """
+    Return fetch(source) that accepts blob names in container_name or blob URLs.
+
+    Blob names are read with the shared BlobServiceClient for connection_string.
+    """
+    def fetch(source: str) -> bytes:
+        if source.startswith('http://') or source.startswith('https://'):
+            return fetch_url(source)
+        container = get_service_client(connection_string).get_container_client(container_name)
+        return container.download_blob(source).readall()
+
+    return fetch
@@ -0,0 +1,217 @@
+"""
+Batched, idempotent writer for dbo.FaceEmbeddings.
+
+Rows are buffered in memory and flushed in batches: each flush sends the
+batch to a #temp table with one fast_executemany round trip and MERGEs it
+into FaceEmbeddings on (PhotoFileName, PersonID, ModelVersion), so existing
+rows are updated in place and a rerun writes no duplicates. A row added
+twice before a flush is sent once (the last one wins).
+
+The writer either owns nothing and takes a pooled connection per flush
+(committed per flush, or by the enclosing db_transaction), or writes on a
+caller's connection, e.g. an unpooled script connection, committing per
+flush unless commit=False leaves that to the caller.
+
+Requires database/add-embedding-binary-column.sql and
+database/add-face-embeddings-unique-key.sql.
+
+Configuration (environment variables):
+- EMBEDDING_WRITER_BATCH_SIZE: Rows per flush (default 1000)
+- EMBEDDING_WRITER_FLUSH_SECONDS: Flush when the oldest buffered row is older than this (default 5; 0 = size only)
+"""
+
+import os
+import json
+import time
+import logging
+import pyodbc
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+from shared_python.db_pool import get_pool
+from shared_python.embedding_codec import encode_embedding
+
+DEFAULT_BATCH_SIZE = int(os.environ.get('EMBEDDING_WRITER_BATCH_SIZE', '1000'))
+DEFAULT_FLUSH_SECONDS = float(os.environ.get('EMBEDDING_WRITER_FLUSH_SECONDS', '5'))
+
+_CREATE_STAGING = """
+    IF OBJECT_ID('tempdb..#FaceEmbeddingRows') IS NOT NULL DROP TABLE #FaceEmbeddingRows;
+    CREATE TABLE #FaceEmbeddingRows (
+        PersonID INT NOT NULL,
+        PhotoFileName NVARCHAR(500) NOT NULL,
+        ModelVersion VARCHAR(50) NOT NULL,
+        Embedding NVARCHAR(MAX) NOT NULL,
+        EmbeddingBinary VARBINARY(MAX) NOT NULL,
+        EmbeddingDimensions INT NOT NULL
+    );
+"""
+
+_INSERT_STAGING = """
+    INSERT INTO #FaceEmbeddingRows
+        (PersonID, PhotoFileName, ModelVersion, Embedding, EmbeddingBinary, EmbeddingDimensions)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+# HOLDLOCK: concurrent writers of the same key serialize instead of both inserting.
+# OUTPUT goes INTO a table variable: FaceEmbeddings has an UPDATE trigger, and
+# a plain OUTPUT clause is not allowed on tables with triggers. NOCOUNT is
+# restored because it outlives the batch on (pooled) connections
+_MERGE = """
+    SET NOCOUNT ON;
+    DECLARE @merged TABLE (action NVARCHAR(10));
+    MERGE dbo.FaceEmbeddings WITH (HOLDLOCK) AS t
+    USING #FaceEmbeddingRows AS s
+    ON t.PhotoFileName = s.PhotoFileName
+        AND t.PersonID = s.PersonID
+        AND t.ModelVersion = s.ModelVersion
+    WHEN MATCHED THEN UPDATE SET
+        Embedding = s.Embedding,
+        EmbeddingBinary = s.EmbeddingBinary,
+        EmbeddingDimensions = s.EmbeddingDimensions,
+        UpdatedDate = GETDATE()
+    WHEN NOT MATCHED THEN
+        INSERT (PersonID, PhotoFileName, Embedding, EmbeddingBinary, ModelVersion, EmbeddingDimensions)
+        VALUES (s.PersonID, s.PhotoFileName, s.Embedding, s.EmbeddingBinary, s.ModelVersion, s.EmbeddingDimensions)
+    OUTPUT $action INTO @merged;
+    SELECT action, COUNT(*) FROM @merged GROUP BY action;
+    SET NOCOUNT OFF;
+"""
+
+Key = Tuple[str, int, str]
+
+
+class FaceEmbeddingWriter:
+    """
+    Buffer FaceEmbeddings rows and upsert them in batches.
+
+        with FaceEmbeddingWriter(model_version=get_model_version()) as writer:
+            for filename, person_id, embedding in results:
+                writer.add(person_id, filename, embedding)
+        print(writer.stats())
+
+    Args:
+        conn: Connection to write on; None takes a pooled connection per flush
+        model_version: ModelVersion for rows added without one
+        batch_size: Buffered rows that trigger a flush (None = only explicit flush())
+        flush_seconds: Age of the oldest buffered row that triggers a flush on add (0 = never)
+        commit: Commit conn after each flush (ignored for pooled connections)
+    """
+
+    def __init__(
+        self,
+        conn=None,
+        model_version: Optional[str] = None,
+        batch_size: Optional[int] = DEFAULT_BATCH_SIZE,
+        flush_seconds: float = DEFAULT_FLUSH_SECONDS,
+        commit: bool = True
+    ):
+        self.conn = conn
+        self.model_version = model_version
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.commit = commit
+
+        self._rows: Dict[Key, tuple] = {}
+        self._oldest = None
+        self.rows_written = 0
+        self.rows_inserted = 0
+        self.rows_updated = 0
+        self.batches = 0
+        self.write_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __enter__(self) -> 'FaceEmbeddingWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Buffered rows of a failed block are dropped rather than half-written
+        if exc_type is None:
+            self.flush()
+        else:
+            self._rows.clear()
+
+    def add(self, person_id: int, photo_filename: str, embedding, model_version: Optional[str] = None):
+        """Buffer one row (embedding as float array); flushes when the batch is full or old enough."""
+        model_version = model_version or self.model_version
+        if not model_version:
+            raise ValueError('model_version is required')
+
+        values = np.asarray(embedding, dtype=np.float32).ravel()
+        self._rows[(photo_filename, int(person_id), model_version)] = (
+            int(person_id),
+            photo_filename,
+            model_version,
+            json.dumps(np.round(values.astype(np.float64), 6).tolist()),
+            encode_embedding(values),
+            len(values)
+        )
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+
+        if (self.batch_size and len(self._rows) >= self.batch_size) or (
+            self.flush_seconds and time.monotonic() - self._oldest >= self.flush_seconds
+        ):
+            self.flush()
+
+    def flush(self) -> int:
+        """Upsert the buffered rows; returns how many were written."""
+        if not self._rows:
+            return 0
+
+        rows = list(self._rows.values())
+        started = time.perf_counter()
+        if self.conn is not None:
+            counts = self._write(self.conn, rows)
+            if self.commit:
+                self.conn.commit()
+        else:
+            with get_pool().connection() as conn:
+                counts = self._write(conn, rows)
+        elapsed = time.perf_counter() - started
+
+        self._rows.clear()
+        self._oldest = None
+        self.rows_written += len(rows)
+        self.rows_inserted += counts.get('INSERT', 0)
+        self.rows_updated += counts.get('UPDATE', 0)
+        self.batches += 1
+        self.write_seconds += elapsed
+        logging.debug(f"Flushed {len(rows)} face embeddings in {elapsed * 1000:.0f}ms")
+        return len(rows)
+
+    @staticmethod
+    def _write(conn, rows) -> Dict[str, int]:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(_CREATE_STAGING)
+            cursor.fast_executemany = True
+            # Explicit sizes from this batch: pyodbc would otherwise size the
+            # parameter buffers from the first row and re-bind on longer ones
+            cursor.setinputsizes([
+                (pyodbc.SQL_INTEGER, 0, 0),
+                (pyodbc.SQL_WVARCHAR, 500, 0),
+                (pyodbc.SQL_VARCHAR, 50, 0),
+                (pyodbc.SQL_WVARCHAR, max(len(r[3]) for r in rows), 0),
+                (pyodbc.SQL_VARBINARY, max(len(r[4]) for r in rows), 0),
+                (pyodbc.SQL_INTEGER, 0, 0)
+            ])
+            cursor.executemany(_INSERT_STAGING, rows)
+            counts = {action: count for action, count in cursor.execute(_MERGE).fetchall()}
+            cursor.execute("DROP TABLE #FaceEmbeddingRows")
+            return counts
+        finally:
+            cursor.close()
+
+    def stats(self) -> Dict:
+        """Rows written so far and write throughput (time spent in flushes)."""
+        return {
+            'rowsWritten': self.rows_written,
+            'rowsInserted': self.rows_inserted,
+            'rowsUpdated': self.rows_updated,
+            'batches': self.batches,
+            'buffered': len(self._rows),
+            'writeSeconds': round(self.write_seconds, 2),
+            'rowsPerSecond': round(self.rows_written / self.write_seconds, 1) if self.write_seconds else None
+        }
@@ -0,0 +1,182 @@
+"""
+Blockwise clustering of face embeddings by identity.
+
+Builds a k-nearest-neighbor graph over L2-normalized embeddings, keeps the
+edges whose cosine similarity reaches a cutoff, and returns its connected
+components as clusters. Restricting each face to its k best neighbors keeps
+one blurry face from chaining two people together the way plain
+single-linkage over every pair above the cutoff would.
+
+Similarities are computed block by block (block_size x block_size matrix
+products over the upper triangle, each block feeding the neighbor lists of
+both its row and column faces), so memory stays at O(N * k + block_size^2)
+and the N x N matrix is never materialized. 100k 512-dim faces take a few
+minutes on one machine, dominated by the matrix products.
+"""
+
+import time
+import logging
+import numpy as np
+from typing import Callable, Optional, Tuple
+
+from shared_python.embedding_codec import decode_embedding, is_binary_embedding
+from shared_python.insightface_utils import normalize_embeddings
+
+DEFAULT_THRESHOLD = 0.5
+DEFAULT_NEIGHBORS = 10
+DEFAULT_BLOCK_SIZE = 4096
+
+# Legacy FaceEncodings rows hold raw dlib encodings: 128 float64 values
+_LEGACY_DLIB_BYTES = 128 * 8
+
+
+def decode_face_encoding(value) -> np.ndarray:
+    """Decode a FaceEncodings.Encoding value (binary embedding format or raw float array)."""
+    if is_binary_embedding(value):
+        return decode_embedding(value)
+    if len(value) == _LEGACY_DLIB_BYTES:
+        return np.frombuffer(value, dtype='<f8').astype(np.float32)
+    return np.frombuffer(value, dtype='<f4')
+
+
+def _merge_neighbors(
+    best_sims: np.ndarray,
+    best_idx: np.ndarray,
+    rows: slice,
+    sims: np.ndarray,
+    offset: int,
+    k: int
+):
+    """Merge a block of candidate similarities into the running top-k of the given rows."""
+    candidates = sims.shape[1]
+    if candidates > k:
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+    else:
+        top = np.broadcast_to(np.arange(candidates), sims.shape)
+        top_sims = sims
+
+    merged_sims = np.concatenate([best_sims[rows], top_sims], axis=1)
+    merged_idx = np.concatenate([best_idx[rows], top + offset], axis=1)
+    keep = np.argpartition(-merged_sims, k - 1, axis=1)[:, :k]
+    best_sims[rows] = np.take_along_axis(merged_sims, keep, axis=1)
+    best_idx[rows] = np.take_along_axis(merged_idx, keep, axis=1)
+
+
+def nearest_neighbors(
+    embeddings: np.ndarray,
+    k: int = DEFAULT_NEIGHBORS,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k neighbors (excluding self) of every row by cosine similarity, blockwise.
+
+    Args:
+        embeddings: (N, D) L2-normalized float32 matrix
+        k: Neighbors kept per row
+        block_size: Rows per block; peak extra memory is about block_size^2 * 4 bytes
+        progress: Called with (blocks done, total blocks) after each block
+
+    Returns:
+        (sims, idx): (N, k) similarities and row indices; -inf / -1 where a
+        row has fewer than k other rows
+    """
+    n = len(embeddings)
+    k = max(1, min(k, n - 1)) if n > 1 else 1
+    best_sims = np.full((n, k), -np.inf, dtype=np.float32)
+    best_idx = np.full((n, k), -1, dtype=np.int64)
+
+    starts = list(range(0, n, block_size))
+    total = len(starts) * (len(starts) + 1) // 2
+    done = 0
+
+    for bi, i in enumerate(starts):
+        rows_i = slice(i, min(i + block_size, n))
+        block_i = embeddings[rows_i]
+        for j in starts[bi:]:
+            rows_j = slice(j, min(j + block_size, n))
+            sims = block_i @ embeddings[rows_j].T
+            if i == j:
+                np.fill_diagonal(sims, -np.inf)
+            _merge_neighbors(best_sims, best_idx, rows_i, sims, j, k)
+            if i != j:
+                _merge_neighbors(best_sims, best_idx, rows_j, sims.T, i, k)
+            done += 1
+            if progress is not None:
+                progress(done, total)
+
+    return best_sims, best_idx
+
+
+def connected_components(n: int, sources: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """
+    Component label (smallest member index) of every node, by min-label propagation
+    with pointer jumping over the edge arrays.
+    """
+    labels = np.arange(n, dtype=np.int64)
+    while True:
+        previous = labels.copy()
+        low = np.minimum(labels[sources], labels[targets])
+        np.minimum.at(labels, sources, low)
+        np.minimum.at(labels, targets, low)
+        # Pointer jumping: follow labels to their own labels until stable
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def cluster_embeddings(
+    embeddings: np.ndarray,
+    threshold: float = DEFAULT_THRESHOLD,
+    k: int = DEFAULT_NEIGHBORS,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    min_size: int = 2,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> np.ndarray:
+    """
+    Group embeddings by identity.
+
+    Args:
+        embeddings: (N, D) embeddings (normalized here)
+        threshold: Minimum cosine similarity for two faces to be linked
+        k: Neighbors considered per face
+        block_size: Rows per similarity block
+        min_size: Smaller components are left unclustered
+        progress: Called with (blocks done, total blocks)
+
+    Returns:
+        (N,) cluster index per row, numbered from 0 by descending cluster
+        size; -1 for faces not in a cluster
+    """
+    n = len(embeddings)
+    if n < 2:
+        return np.full(n, -1, dtype=np.int64)
+
+    matrix = normalize_embeddings(embeddings)
+    started = time.perf_counter()
+    sims, idx = nearest_neighbors(matrix, k, block_size, progress)
+    knn_seconds = time.perf_counter() - started
+
+    linked = sims >= threshold
+    sources = np.repeat(np.arange(n), linked.sum(axis=1))
+    targets = idx[linked]
+    roots = connected_components(n, sources, targets)
+
+    components, inverse, sizes = np.unique(roots, return_inverse=True, return_counts=True)
+    ranked = np.argsort(-sizes, kind='stable')
+    cluster_of_component = np.full(len(components), -1, dtype=np.int64)
+    big = ranked[sizes[ranked] >= min_size]
+    cluster_of_component[big] = np.arange(len(big))
+
+    labels = cluster_of_component[inverse]
+    logging.info(
+        f"Clustered {n} faces into {len(big)} clusters "
+        f"({int((labels >= 0).sum())} clustered, {len(sources)} edges >= {threshold}) "
+        f"in {time.perf_counter() - started:.1f}s (neighbors {knn_seconds:.1f}s)"
+    )
+    return labels
@@ -0,0 +1,472 @@
+"""
+Concurrent, rate-limited and idempotent seeding of an Azure Face API PersonGroup.
+
+Adds one face per (photo, person) pair from manually tagged photos:
+
+    photos  ->  sign URL  ->  get_or_create_person  ->  add persisted face  ->  ledger row
+
+- Requests run on a bounded thread pool; a token bucket shared by all
+  threads keeps the call rate under the resource's transactions-per-second
+  quota, so the pool never produces a burst of 429s.
+- 429 and 5xx responses are retried. A Retry-After header pauses the whole
+  bucket, not just the thread that was throttled; without one the retry
+  backs off exponentially with jitter. Calls that create something (adding
+  a face, creating a person) are only retried on 429 and on connection
+  failures before the request was sent: after a 5xx or a lost response
+  Azure may already have created it, so the item is reported as failed and
+  left to the next run.
+- Every added face is recorded in dbo.FaceSeedLedger as soon as Azure
+  returns its persistedFaceId. pending_photos() leaves those pairs out, so
+  a rerun (or a run after a crash) only sends what is still missing.
+- Azure person IDs live in dbo.AzureFacePersons and are cached per process;
+  a person is created at most once even when several threads reach it.
+
+The client only needs an endpoint and a key, so the whole pipeline can run
+against scripts/fake_face_api.py instead of a real Face resource.
+
+Configuration (environment variables):
+    FACE_API_ENDPOINT: Face resource endpoint (e.g. https://<name>.cognitiveservices.azure.com)
+    FACE_API_KEY: Face resource key
+    FACE_PERSON_GROUP_ID: PersonGroup to seed (default family-album)
+    FACE_API_TPS: Transactions per second allowed by the pricing tier (default 10)
+    FACE_API_BURST: Token bucket size (default = FACE_API_TPS)
+    FACE_SEED_CONCURRENCY: Requests in flight (default 8)
+    FACE_API_MAX_RETRIES: Retries per call on 429/5xx/connection errors (default 5; 429 and
+        unsent requests only for calls that create something)
+
+Requires database/add-azure-face-persons.sql and database/add-face-seed-ledger.sql.
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional
+
+from shared_python.utils import execute_db, query_db
+from shared_python.storage import sign_many
+
+PERSON_GROUP_ID = os.environ.get('FACE_PERSON_GROUP_ID', 'family-album')
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Photos whose URLs are signed together; small enough that a token never expires before use
+_SIGN_CHUNK = 200
+
+# Tagged (photo, person) pairs not yet in the ledger for the group
+_PENDING_SQL = """
+SELECT DISTINCT
+    p.PFileName,
+    ne.ID as PersonID,
+    ne.neName as PersonName
+FROM dbo.Pictures p
+INNER JOIN dbo.NamePhoto np ON p.PFileName = np.npFileName
+INNER JOIN dbo.NameEvent ne ON np.npID = ne.ID
+WHERE ne.neType = 'N' AND np.npID != 1
+AND NOT EXISTS (
+    SELECT 1 FROM dbo.FaceSeedLedger l
+    WHERE l.PersonGroupID = ? AND l.PersonID = ne.ID AND l.PFileName = p.PFileName
+)
+ORDER BY ne.ID, p.PFileName
+"""
+
+# Baseline seeding: the newest maxPerPerson photos of each person, minus those already seeded
+_PENDING_PER_PERSON_SQL = """
+WITH RankedPhotos AS (
+    SELECT
+        p.PFileName,
+        ne.ID as PersonID,
+        ne.neName as PersonName,
+        ROW_NUMBER() OVER (PARTITION BY ne.ID ORDER BY p.PYear DESC, p.PMonth DESC, p.PFileName) as Rank
+    FROM dbo.Pictures p
+    INNER JOIN dbo.NamePhoto np ON p.PFileName = np.npFileName
+    INNER JOIN dbo.NameEvent ne ON np.npID = ne.ID
+    WHERE ne.neType = 'N' AND np.npID != 1
+)
+SELECT PFileName, PersonID, PersonName
+FROM RankedPhotos r
+WHERE Rank <= ?
+AND NOT EXISTS (
+    SELECT 1 FROM dbo.FaceSeedLedger l
+    WHERE l.PersonGroupID = ? AND l.PersonID = r.PersonID AND l.PFileName = r.PFileName
+)
+ORDER BY PersonID, PFileName
+"""
+
+
+class FaceApiError(Exception):
+    """A Face API call failed with a non-retryable status or ran out of retries."""
+
+    def __init__(self, status: Optional[int], code: str, message: str):
+        super().__init__(f"{status} {code}: {message}")
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: rate tokens per second, at most burst saved up.
+
+    acquire() blocks until a token is available. defer() empties the bucket
+    and blocks every caller for a while (used for Retry-After).
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    delay = self._blocked_until - now
+                else:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    delay = (1 - self._tokens) / self.rate
+                self.waited += delay
+            time.sleep(delay)
+
+    def defer(self, seconds: float):
+        """Hold back all callers for seconds (e.g. the server's Retry-After)."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+            self._updated = self._blocked_until
+
+
+def _retry_after(response) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds form only), or None."""
+    value = response.headers.get('Retry-After')
+    try:
+        return max(float(value), 0.0) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _never_sent(error: requests.RequestException) -> bool:
+    """True if the request failed before it reached the server (no connection was made)."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class FaceApiClient:
+    """
+    Minimal Face API v1.0 REST client for PersonGroup seeding.
+
+    Every attempt (including retries) takes a token from the limiter, so
+    the limiter bounds the real request rate.
+
+    Args:
+        endpoint: Face resource endpoint
+        key: Face resource key
+        limiter: Shared token bucket
+        max_retries: Retries per call on 429/5xx/connection errors
+        timeout: Per-request timeout in seconds
+    """
+
+    def __init__(self, endpoint: str, key: str, limiter: TokenBucket, max_retries: int = 5, timeout: float = 30):
+        self.base_url = endpoint.rstrip('/') + '/face/v1.0'
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._session = requests.Session()
+        # The default pool (10) would serialize larger thread pools on connection checkout
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=64)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._session.headers.update({'Ocp-Apim-Subscription-Key': key})
+
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'throttled': 0, 'retries': 0}
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        # Summed over threads, so it can exceed the elapsed time
+        stats['limiterWaitSeconds'] = round(self.limiter.waited, 2)
+        return stats
+
+    def request(self, method: str, path: str, idempotent: Optional[bool] = None, **kwargs):
+        """
+        Send a request with rate limiting and retries; returns the parsed JSON body (or None).
+
+        Non-idempotent requests (POST unless idempotent=True) are retried only
+        on 429 and when the connection could not be made, so a request Azure
+        may have applied is never sent twice.
+        """
+        if idempotent is None:
+            idempotent = method != 'POST'
+        url = self.base_url + path
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            self._count('requests')
+            try:
+                response = self._session.request(method, url, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries or not (idempotent or _never_sent(e)):
+                    raise FaceApiError(None, 'ConnectionError', str(e))
+                delay = None
+            else:
+                if response.status_code < 400:
+                    return response.json() if response.content else None
+                retryable = response.status_code == 429 or (idempotent and response.status_code in RETRY_STATUSES)
+                if not retryable or attempt == self.max_retries:
+                    try:
+                        error = response.json().get('error', {})
+                    except ValueError:
+                        error = {}
+                    raise FaceApiError(
+                        response.status_code,
+                        error.get('code', str(response.status_code)),
+                        error.get('message', response.text[:200])
+                    )
+                delay = _retry_after(response)
+                if response.status_code == 429:
+                    self._count('throttled')
+                    if delay is not None:
+                        # The quota is per resource: every thread has to wait, not just this one
+                        self.limiter.defer(delay)
+
+            self._count('retries')
+            if delay is None:
+                delay = min(2 ** attempt, 30) * random.uniform(0.5, 1.5)
+            logging.warning(f"Face API {method} {path}: retrying in {delay:.1f}s (attempt {attempt + 1})")
+            time.sleep(delay)
+
+    def ensure_person_group(self, group_id: str, name: Optional[str] = None):
+        """Create the PersonGroup if it does not exist."""
+        try:
+            self.request('GET', f'/persongroups/{group_id}')
+        except FaceApiError as e:
+            if e.status != 404:
+                raise
+            self.request('PUT', f'/persongroups/{group_id}', json={
+                'name': name or group_id,
+                'recognitionModel': 'recognition_04',
+            })
+            logging.info(f"Created PersonGroup '{group_id}'")
+
+    def create_person(self, group_id: str, name: str, user_data: Optional[str] = None) -> str:
+        body = {'name': name[:128]}
+        if user_data is not None:
+            body['userData'] = user_data
+        return self.request('POST', f'/persongroups/{group_id}/persons', json=body)['personId']
+
+    def add_face(self, group_id: str, azure_person_id: str, image_url: str) -> str:
+        result = self.request(
+            'POST',
+            f'/persongroups/{group_id}/persons/{azure_person_id}/persistedFaces',
+            params={'detectionModel': 'detection_03'},
+            json={'url': image_url}
+        )
+        return result['persistedFaceId']
+
+    def train(self, group_id: str):
+        # Starting training again is harmless
+        self.request('POST', f'/persongroups/{group_id}/train', idempotent=True)
+
+    def training_status(self, group_id: str) -> Dict:
+        return self.request('GET', f'/persongroups/{group_id}/training')
+
+
+def get_face_api_client(endpoint: Optional[str] = None, key: Optional[str] = None) -> FaceApiClient:
+    """Client configured from the environment (arguments override)."""
+    endpoint = endpoint or os.environ.get('FACE_API_ENDPOINT')
+    key = key or os.environ.get('FACE_API_KEY')
+    if not endpoint or not key:
+        raise Exception('FACE_API_ENDPOINT and FACE_API_KEY environment variables must be set')
+
+    tps = float(os.environ.get('FACE_API_TPS', '10'))
+    burst = float(os.environ.get('FACE_API_BURST', str(tps)))
+    return FaceApiClient(
+        endpoint, key,
+        limiter=TokenBucket(tps, burst),
+        max_retries=int(os.environ.get('FACE_API_MAX_RETRIES', '5'))
+    )
+
+
+# (group, PersonID) -> Azure personId, loaded from AzureFacePersons once per group
+_persons: Dict[tuple, str] = {}
+_loaded_groups = set()
+_persons_lock = threading.Lock()
+_person_locks: Dict[tuple, threading.Lock] = {}
+
+
+def _load_persons(group_id: str):
+    with _persons_lock:
+        if group_id in _loaded_groups:
+            return
+        rows = query_db(
+            "SELECT PersonID, AzurePersonID FROM dbo.AzureFacePersons WHERE PersonGroupID = ?",
+            (group_id,)
+        )
+        for row in rows:
+            _persons[(group_id, row['PersonID'])] = row['AzurePersonID']
+        _loaded_groups.add(group_id)
+        logging.info(f"Loaded {len(rows)} Azure persons for PersonGroup '{group_id}'")
+
+
+def get_or_create_person(client: FaceApiClient, person_id: int, person_name: str,
+                         group_id: str = PERSON_GROUP_ID) -> str:
+    """
+    Azure personId for a NameEvent person, creating it on first use.
+
+    Cached per process; a per-person lock makes concurrent callers for the
+    same person wait for one creation instead of creating duplicates.
+    """
+    _load_persons(group_id)
+    key = (group_id, person_id)
+
+    azure_person_id = _persons.get(key)
+    if azure_person_id is not None:
+        return azure_person_id
+
+    with _persons_lock:
+        lock = _person_locks.setdefault(key, threading.Lock())
+    with lock:
+        azure_person_id = _persons.get(key)
+        if azure_person_id is not None:
+            return azure_person_id
+
+        azure_person_id = client.create_person(group_id, person_name, user_data=str(person_id))
+        execute_db(
+            "INSERT INTO dbo.AzureFacePersons (PersonID, AzurePersonID, PersonGroupID) VALUES (?, ?, ?)",
+            (person_id, azure_person_id, group_id)
+        )
+        _persons[key] = azure_person_id
+        logging.info(f"Created Azure person {azure_person_id} for {person_name} ({person_id})")
+        return azure_person_id
+
+
+def clear_person_cache():
+    """Forget cached Azure person IDs (e.g. after the PersonGroup was recreated)."""
+    with _persons_lock:
+        _persons.clear()
+        _loaded_groups.clear()
+        _person_locks.clear()
+
+
+def pending_photos(group_id: str = PERSON_GROUP_ID, limit: Optional[int] = None,
+                   max_per_person: Optional[int] = None) -> List[Dict]:
+    """Tagged (PFileName, PersonID, PersonName) pairs not yet seeded into group_id."""
+    if max_per_person:
+        return query_db(_PENDING_PER_PERSON_SQL, (max_per_person, group_id), limit=limit)
+    return query_db(_PENDING_SQL, (group_id,), limit=limit)
+
+
+def record_seeded_face(group_id: str, person_id: int, filename: str, persisted_face_id: str):
+    execute_db(
+        "INSERT INTO dbo.FaceSeedLedger (PersonGroupID, PersonID, PFileName, PersistedFaceID) "
+        "VALUES (?, ?, ?, ?)",
+        (group_id, person_id, filename, persisted_face_id)
+    )
+
+
+def _seed_one(client: FaceApiClient, group_id: str, photo: Dict, image_url: str) -> Optional[str]:
+    """Add one face and record it; returns the persistedFaceId."""
+    azure_person_id = get_or_create_person(client, photo['PersonID'], photo['PersonName'], group_id)
+    persisted_face_id = client.add_face(group_id, azure_person_id, image_url)
+    record_seeded_face(group_id, photo['PersonID'], photo['PFileName'], persisted_face_id)
+    return persisted_face_id
+
+
+def seed_faces(
+    client: FaceApiClient,
+    photos: Iterable[Dict],
+    group_id: str = PERSON_GROUP_ID,
+    concurrency: Optional[int] = None,
+    sign_urls: Callable[[Iterable[str]], Dict[str, str]] = sign_many
+) -> Dict:
+    """
+    Add a face for every (PFileName, PersonID, PersonName) row.
+
+    Args:
+        client: Face API client (its limiter sets the request rate)
+        photos: Rows as returned by pending_photos()
+        group_id: PersonGroup to add to
+        concurrency: Requests in flight (default FACE_SEED_CONCURRENCY or 8)
+        sign_urls: filenames -> {filename: readable URL}; signed in chunks as the run progresses
+
+    Returns:
+        Summary with photosProcessed, facesAdded, errors (by code), timings and client stats
+    """
+    concurrency = concurrency or int(os.environ.get('FACE_SEED_CONCURRENCY', '8'))
+    started = time.perf_counter()
+    faces_added = 0
+    errors: Dict[str, int] = {}
+    failed = []
+
+    def record_error(photo, error):
+        code = error.code if isinstance(error, FaceApiError) else type(error).__name__
+        errors[code] = errors.get(code, 0) + 1
+        if len(failed) < 20:
+            failed.append({'fileName': photo['PFileName'], 'personId': photo['PersonID'], 'error': str(error)})
+        logging.error(f"Failed {photo['PFileName']} (person {photo['PersonID']}): {error}")
+
+    photos = list(photos)
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='face-seed') as executor:
+        def drain(block):
+            nonlocal faces_added
+            done, _ = wait(in_flight, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+            for future in done:
+                photo = in_flight.pop(future)
+                try:
+                    future.result()
+                    faces_added += 1
+                except Exception as e:
+                    record_error(photo, e)
+
+        for start in range(0, len(photos), _SIGN_CHUNK):
+            chunk = photos[start:start + _SIGN_CHUNK]
+            urls = sign_urls(photo['PFileName'] for photo in chunk)
+            for photo in chunk:
+                # Keep the queue short so URLs are used soon after signing
+                while len(in_flight) >= concurrency * 2:
+                    drain(block=True)
+                future = executor.submit(_seed_one, client, group_id, photo, urls[photo['PFileName']])
+                in_flight[future] = photo
+
+        while in_flight:
+            drain(block=True)
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        'photosProcessed': len(photos),
+        'facesAdded': faces_added,
+        'errors': sum(errors.values()),
+        'errorsByCode': errors,
+        'failed': failed,
+        'elapsedSeconds': round(elapsed, 2),
+        'facesPerSecond': round(faces_added / elapsed, 2) if elapsed > 0 else 0.0,
+        'api': client.stats(),
+    }
+    logging.info(
+        f"Seeded {faces_added}/{len(photos)} faces into '{group_id}' in {elapsed:.1f}s "
+        f"({summary['facesPerSecond']}/s, {summary['api']['throttled']} throttled)"
+    )
+    return summary
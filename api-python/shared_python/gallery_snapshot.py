@@ -0,0 +1,197 @@
+"""
+On-disk, memory-mapped snapshots of the embedding gallery.
+
+Every Functions worker process on a host would otherwise hold a private copy
+of the gallery matrix. A snapshot is a versioned directory of .npy files
+that workers open with np.load(mmap_mode='r'), so all of them share one
+page-cache copy:
+
+    <root>/
+      CURRENT                      name of the live version (replaced atomically)
+      v20240101T120000-1234/
+        manifest.json              format, version, model, rows, max_id, max_updated,
+                                   skipped_ids
+        embeddings.npy             (N, D) float32, L2-normalized, ordered by ID
+        ids.npy                    (N,) int64 FaceEmbeddings.ID
+        person_ids.npy             (N,) int64
+        person_names.json          {PersonID: name}
+
+A new version is written to a temporary directory, renamed to its versioned
+name (so it is only ever visible complete), and published by replacing
+CURRENT. Readers that still map an older version keep working; all but the
+newest few versions are pruned.
+"""
+
+import os
+import json
+import time
+import shutil
+import logging
+import datetime
+import numpy as np
+from typing import Dict, Iterable, Optional
+
+FORMAT_VERSION = 1
+
+_CURRENT = 'CURRENT'
+_MANIFEST = 'manifest.json'
+_KEEP_VERSIONS = 3
+
+
+def _version_name() -> str:
+    return f"v{datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}-{os.getpid()}"
+
+
+def _encode_timestamp(value) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _decode_timestamp(value: Optional[str]):
+    return datetime.datetime.fromisoformat(value) if value is not None else None
+
+
+def read_manifest(root: str) -> Optional[Dict]:
+    """Manifest of the live snapshot under root, or None if there is none."""
+    try:
+        with open(os.path.join(root, _CURRENT), encoding='utf-8') as f:
+            version = f.read().strip()
+        with open(os.path.join(root, version, _MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get('format') != FORMAT_VERSION:
+        logging.warning(f"Ignoring gallery snapshot {version}: unsupported format {manifest.get('format')}")
+        return None
+    manifest['path'] = os.path.join(root, version)
+    return manifest
+
+
+def write_snapshot(
+    root: str,
+    ids: np.ndarray,
+    person_ids: np.ndarray,
+    person_names: np.ndarray,
+    embeddings: np.ndarray,
+    model_version: str,
+    max_id: Optional[int] = None,
+    max_updated=None,
+    skipped_ids: Iterable[int] = ()
+) -> Dict:
+    """
+    Write a gallery as a new snapshot version and make it the live one.
+
+    Args:
+        root: Snapshot directory (created if needed)
+        ids, person_ids, person_names, embeddings: Parallel gallery arrays
+            (embeddings already L2-normalized)
+        model_version: FaceEmbeddings.ModelVersion of the rows
+        max_id, max_updated: Change-probe high-water marks of the rows
+        skipped_ids: IDs of stored rows left out because they failed to decode;
+            they count towards the stored rows the snapshot reflects
+
+    Returns:
+        The manifest of the new version
+    """
+    os.makedirs(root, exist_ok=True)
+    version = _version_name()
+    staging = os.path.join(root, f".tmp-{version}")
+    os.makedirs(staging)
+
+    try:
+        np.save(os.path.join(staging, 'embeddings.npy'), np.ascontiguousarray(embeddings, dtype=np.float32))
+        np.save(os.path.join(staging, 'ids.npy'), np.asarray(ids, dtype=np.int64))
+        np.save(os.path.join(staging, 'person_ids.npy'), np.asarray(person_ids, dtype=np.int64))
+
+        names = {str(int(p)): n for p, n in zip(person_ids, person_names)}
+        with open(os.path.join(staging, 'person_names.json'), 'w', encoding='utf-8') as f:
+            json.dump(names, f, ensure_ascii=False)
+
+        manifest = {
+            'format': FORMAT_VERSION,
+            'version': version,
+            'modelVersion': model_version,
+            'rows': int(len(ids)),
+            'dimensions': int(embeddings.shape[1]) if embeddings.ndim == 2 else 0,
+            'maxId': max_id,
+            'maxUpdated': _encode_timestamp(max_updated),
+            'skippedIds': sorted(int(i) for i in skipped_ids),
+            'createdAt': datetime.datetime.utcnow().isoformat() + 'Z',
+        }
+        with open(os.path.join(staging, _MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+        # The directory rename publishes a complete version; CURRENT then points at it
+        os.rename(staging, os.path.join(root, version))
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    pointer = os.path.join(root, f".{_CURRENT}.{os.getpid()}.tmp")
+    with open(pointer, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(pointer, os.path.join(root, _CURRENT))
+
+    logging.info(f"Published gallery snapshot {version} ({manifest['rows']} rows)")
+    _prune(root, version)
+    manifest['path'] = os.path.join(root, version)
+    return manifest
+
+
+def _prune(root: str, live: str):
+    """Remove all but the newest versions (mapped files stay readable on POSIX)."""
+    versions = sorted(
+        (name for name in os.listdir(root) if name.startswith('v') and name != live),
+        reverse=True
+    )
+    for name in versions[_KEEP_VERSIONS - 1:]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def load_snapshot(root: str, model_version: Optional[str] = None) -> Optional[Dict]:
+    """
+    Memory-map the live snapshot.
+
+    Returns:
+        Dict with the manifest fields plus ids, person_ids, person_names and
+        embeddings (read-only memory maps, except the small names array), and
+        maxUpdated as a datetime; None if there is no usable snapshot
+    """
+    manifest = read_manifest(root)
+    if manifest is None:
+        return None
+    if model_version is not None and manifest['modelVersion'] != model_version:
+        logging.warning(
+            f"Ignoring gallery snapshot {manifest['version']}: model {manifest['modelVersion']}, "
+            f"expected {model_version}"
+        )
+        return None
+
+    path = manifest['path']
+    started = time.perf_counter()
+    try:
+        embeddings = np.load(os.path.join(path, 'embeddings.npy'), mmap_mode='r')
+        ids = np.load(os.path.join(path, 'ids.npy'), mmap_mode='r')
+        person_ids = np.load(os.path.join(path, 'person_ids.npy'), mmap_mode='r')
+        with open(os.path.join(path, 'person_names.json'), encoding='utf-8') as f:
+            names = json.load(f)
+    except (OSError, ValueError) as e:
+        # Pruned between reading CURRENT and opening the files, or damaged
+        logging.warning(f"Could not load gallery snapshot {manifest['version']}: {e}")
+        return None
+
+    # One reference per row to a shared string per person; small next to the matrix
+    person_names = np.array([names[str(p)] for p in person_ids.tolist()], dtype=object)
+
+    logging.info(
+        f"Mapped gallery snapshot {manifest['version']} ({len(ids)} rows) in "
+        f"{(time.perf_counter() - started) * 1000:.0f}ms"
+    )
+    return {
+        **manifest,
+        'maxUpdated': _decode_timestamp(manifest['maxUpdated']),
+        'ids': ids,
+        'person_ids': person_ids,
+        'person_names': person_names,
+        'embeddings': embeddings,
+    }
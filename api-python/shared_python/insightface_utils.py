@@ -1,7 +1,8 @@
 """
 InsightFace utilities for state-of-the-art face recognition.
 
-Uses ArcFace model (buffalo_l) for 512-dimensional face embeddings.
+Uses ArcFace model (buffalo_l by default, see INSIGHTFACE_MODEL_PACK) for
+512-dimensional face embeddings.
 Much better accuracy than face-api.js (128-dim FaceNet), especially across age progression.
 
 Key improvements:
@@ -13,55 +14,401 @@ Key improvements:
 
 import insightface
 from insightface.app import FaceAnalysis
+from insightface.app.common import Face
 import numpy as np
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, NamedTuple, Optional, Sequence, Tuple, Union
+import os
 import logging
-import cv2
+import threading
 from io import BytesIO
-from PIL import Image
+from PIL import Image, ImageOps
 
-# Global model instance (loaded once, reused across requests)
-_face_app: Optional[FaceAnalysis] = None
-_model_loaded = False
+from shared_python.embedding_codec import decode_embedding
+from shared_python.onnx_sessions import tuned_sessions
+from shared_python.embedding_cache import get_embedding_cache, make_key
 
-def load_insightface_model() -> FaceAnalysis:
+# Model pack (buffalo_l: ResNet50 ArcFace, best accuracy; buffalo_s: MobileFaceNet, faster)
+MODEL_PACK = os.environ.get('INSIGHTFACE_MODEL_PACK', 'buffalo_l')
+
+# Modules the pipeline uses: the detector also provides the 5 keypoints used for
+# alignment, so landmark_3d_68 / landmark_2d_106 / genderage are skipped by default
+DEFAULT_MODULES = ('detection', 'recognition')
+DETECTION_ONLY = ('detection',)
+ALL_MODULES = ('detection', 'recognition', 'landmark_3d_68', 'landmark_2d_106', 'genderage')
+
+# Loaded models, one per (pack, modules) configuration, reused across requests
+_face_apps: Dict[Tuple[str, Optional[Tuple[str, ...]]], FaceAnalysis] = {}
+_face_apps_lock = threading.Lock()
+
+# Number of best scores averaged per person when matching
+TOP_N_AVERAGE = 3
+
+# Longer side images are decoded to before detection (detection runs at 640x640;
+# the margin keeps small faces in group photos sharp enough for recognition)
+DECODE_MAX_SIDE = int(os.environ.get('INSIGHTFACE_DECODE_MAX_SIDE', '1280'))
+
+# Faces whose shorter side is below this in the downscaled image would be upsampled
+# into the 112x112 recognition crop; they are re-embedded from a full-resolution decode
+# so their embeddings match gallery rows computed at full resolution (0 disables)
+RECROP_MIN_FACE = int(os.environ.get('INSIGHTFACE_RECROP_MIN_FACE', '112'))
+
+
+def _configured_modules() -> Optional[Tuple[str, ...]]:
+    """INSIGHTFACE_ALLOWED_MODULES as a tuple; None (all modules) for 'all'."""
+    value = os.environ.get('INSIGHTFACE_ALLOWED_MODULES', ','.join(DEFAULT_MODULES)).strip()
+    if value.lower() == 'all':
+        return None
+    return tuple(module.strip() for module in value.split(',') if module.strip())
+
+
+def get_model_version(pack: Optional[str] = None) -> str:
+    """
+    ModelVersion stored with embeddings from a model pack.
+    
+    buffalo_l keeps the historical 'insightface-arcface' so existing rows stay
+    comparable; other packs produce incompatible embeddings and get their own
+    value (e.g. 'insightface-buffalo_s').
+    """
+    pack = pack or MODEL_PACK
+    return 'insightface-arcface' if pack == 'buffalo_l' else f'insightface-{pack}'
+
+
+def load_insightface_model(
+    pack: Optional[str] = None,
+    allowed_modules: Optional[Sequence[str]] = None
+) -> FaceAnalysis:
     """
-    Load InsightFace model (buffalo_l with ArcFace).
-    Model is loaded once and cached for subsequent requests.
+    Load an InsightFace model pack, once per configuration.
+    
+    Args:
+        pack: Model pack name (default INSIGHTFACE_MODEL_PACK, buffalo_l)
+        allowed_modules: Modules to load, e.g. DETECTION_ONLY for face counting
+            (default INSIGHTFACE_ALLOWED_MODULES, detection + recognition)
     
     Returns:
         FaceAnalysis: Loaded InsightFace model
     """
-    global _face_app, _model_loaded
+    pack = pack or MODEL_PACK
+    modules = tuple(allowed_modules) if allowed_modules is not None else _configured_modules()
+    key = (pack, modules)
     
-    if _model_loaded and _face_app is not None:
-        logging.info("InsightFace model already loaded")
-        return _face_app
+    face_app = _face_apps.get(key)
+    if face_app is not None:
+        return face_app
     
     try:
-        logging.info("Loading InsightFace model (buffalo_l)...")
-        
-        # Initialize FaceAnalysis with ArcFace model
-        # buffalo_l is the large variant with best accuracy
-        _face_app = FaceAnalysis(
-            name='buffalo_l',
-            providers=['CPUExecutionProvider']  # Use CPU for Azure Functions
-        )
-        
-        # Prepare model with image size 640x640 (good balance of speed/accuracy)
-        _face_app.prepare(ctx_id=0, det_size=(640, 640))
-        
-        _model_loaded = True
-        logging.info("✓ InsightFace model loaded successfully")
-        return _face_app
+        with _face_apps_lock:
+            face_app = _face_apps.get(key)
+            if face_app is not None:
+                return face_app
+            
+            logging.info(f"Loading InsightFace model ({pack}, modules: {', '.join(modules) if modules else 'all'})...")
+            
+            # Sessions use the configured ONNX Runtime options and optimized-graph cache
+            with tuned_sessions():
+                face_app = FaceAnalysis(
+                    name=pack,
+                    allowed_modules=list(modules) if modules else None,
+                    providers=['CPUExecutionProvider']  # Use CPU for Azure Functions
+                )
+            
+            # Prepare model with image size 640x640 (good balance of speed/accuracy)
+            face_app.prepare(ctx_id=0, det_size=(640, 640))
+            
+            _face_apps[key] = face_app
+            logging.info("✓ InsightFace model loaded successfully")
+            return face_app
         
     except Exception as e:
         logging.error(f"Failed to load InsightFace model: {e}")
         raise RuntimeError(f"Failed to load InsightFace model: {e}")
 
 
+def is_model_loaded(pack: Optional[str] = None, allowed_modules: Optional[Sequence[str]] = None) -> bool:
+    """Whether load_insightface_model has already loaded this configuration in this process."""
+    modules = tuple(allowed_modules) if allowed_modules is not None else _configured_modules()
+    return (pack or MODEL_PACK, modules) in _face_apps
+
+
+class DecodedImage(NamedTuple):
+    """
+    Detection input produced by decode_image.
+    
+    pixels: Read-only BGR uint8 array, possibly downscaled
+    scale: Factor from pixels coordinates back to the full-resolution
+        (EXIF-oriented) image
+    source: The encoded image, kept when pixels are downscaled so small
+        faces can be re-embedded at full resolution
+    """
+    pixels: np.ndarray
+    scale: float
+    cache_key: Optional[str] = None
+    source: Optional[bytes] = None
+
+
+class CachedFaces(NamedTuple):
+    """Detection results served from the embedding cache; no decode or inference needed."""
+    faces: List
+
+
+def decode_image(image_bytes: bytes, max_side: Optional[int] = None) -> DecodedImage:
+    """
+    Decode image bytes to the BGR uint8 array InsightFace expects.
+    
+    JPEGs are decoded in draft mode, i.e. downscaled by 1/2, 1/4 or 1/8 in
+    the DCT domain, to the smallest size that keeps the longer side at least
+    max_side; other formats are box-reduced by an integer factor. EXIF
+    orientation is applied, and the pixels are packed straight to BGR so no
+    second full-size copy is made for the channel swap.
+    
+    Safe to call from worker threads; only inference needs the shared model.
+    
+    Args:
+        image_bytes: Raw image bytes (JPEG, PNG, etc.)
+        max_side: Target longer side in pixels (default DECODE_MAX_SIDE; 0 = full resolution)
+    
+    Returns:
+        DecodedImage(pixels, scale)
+    """
+    max_side = DECODE_MAX_SIDE if max_side is None else max_side
+    
+    image = Image.open(BytesIO(image_bytes))
+    full_width = image.size[0]
+    
+    longest = max(image.size)
+    if max_side and longest > max_side:
+        # Request the aspect-preserving target so the DCT scale does all the work;
+        # no-op for non-JPEG and must happen before the pixels are loaded
+        image.draft('RGB', (
+            -(-image.size[0] * max_side // longest),
+            -(-image.size[1] * max_side // longest)
+        ))
+        factor = max(image.size) // max_side
+        if factor >= 2:
+            image = image.reduce(factor)
+    
+    # Draft (1/2, 1/4, 1/8) and reduce() both shrink by integer factors
+    scale = float(round(full_width / image.size[0]))
+    
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    
+    width, height = image.size
+    pixels = np.frombuffer(image.tobytes('raw', 'BGR'), dtype=np.uint8).reshape(height, width, 3)
+    
+    return DecodedImage(pixels, scale, source=image_bytes if scale != 1.0 else None)
+
+
+def _cache_namespace() -> str:
+    """Everything besides the image bytes that changes the default model's output."""
+    modules = _configured_modules()
+    return (
+        f"{MODEL_PACK}/{'+'.join(modules) if modules else 'all'}/side{DECODE_MAX_SIDE}"
+        f"/recrop{RECROP_MIN_FACE}/det640"
+    )
+
+
+def _cached_faces(key: str) -> Optional[List]:
+    cache = get_embedding_cache()
+    records = cache.get(key) if cache is not None else None
+    if records is None:
+        return None
+    return [Face(**record) for record in records]
+
+
+def _store_faces(key: str, faces: List):
+    cache = get_embedding_cache()
+    if cache is not None:
+        cache.put(key, [
+            {
+                'bbox': face.bbox,
+                'kps': getattr(face, 'kps', None),
+                'det_score': face.det_score,
+                'embedding': getattr(face, 'embedding', None)
+            }
+            for face in faces
+        ])
+
+
+def load_detection_input(image_bytes: bytes) -> Union[DecodedImage, CachedFaces]:
+    """
+    Embedding-cache lookup, else decode_image() tagged with the cache key.
+    
+    For decode stages that run ahead of inference (see embedding_pipeline):
+    a hit skips the decode, and a miss lets _detect_faces store the result.
+    """
+    if get_embedding_cache() is None:
+        return decode_image(image_bytes)
+    
+    key = make_key(image_bytes, _cache_namespace())
+    faces = _cached_faces(key)
+    if faces is not None:
+        return CachedFaces(faces)
+    return decode_image(image_bytes)._replace(cache_key=key)
+
+
+def _recrop_small_faces(app: FaceAnalysis, image: DecodedImage, faces: List):
+    """
+    Re-embed faces that were smaller than RECROP_MIN_FACE in the downscaled
+    pixels, using an aligned crop of a full-resolution decode.
+    
+    Expects bbox/kps already in full-resolution coordinates. The full decode
+    only happens for images that have such faces.
+    """
+    recognizer = app.models.get('recognition')
+    if recognizer is None or image.source is None:
+        return
+    
+    small = [
+        face for face in faces
+        if getattr(face, 'kps', None) is not None
+        and min(face.bbox[2] - face.bbox[0], face.bbox[3] - face.bbox[1]) / image.scale < RECROP_MIN_FACE
+    ]
+    if not small:
+        return
+    
+    full = decode_image(image.source, max_side=0).pixels
+    for face in small:
+        # Same alignment and model call FaceAnalysis.get uses, on full-resolution pixels
+        recognizer.get(full, face)
+    logging.info(f"Re-embedded {len(small)} small face(s) from the full-resolution image")
+
+
+def _detect_faces(
+    image: Union[bytes, np.ndarray, DecodedImage, CachedFaces],
+    app: Optional[FaceAnalysis] = None
+) -> List:
+    """
+    Run the model once on image bytes, a BGR array or a DecodedImage.
+    
+    Results for image bytes are looked up in and stored to the embedding
+    cache. Only the default model's results are stored; other apps (e.g. the
+    detector-only one) may still read them, since their output is a subset.
+    
+    Bounding boxes and landmarks are returned in full-resolution coordinates,
+    and faces that were small in the downscaled image are re-embedded at full
+    resolution (see RECROP_MIN_FACE).
+    """
+    if isinstance(image, CachedFaces):
+        return image.faces
+    
+    cache_key = None
+    if isinstance(image, np.ndarray):
+        image = DecodedImage(image, 1.0)
+    elif isinstance(image, DecodedImage):
+        cache_key = image.cache_key
+    elif get_embedding_cache() is not None:
+        cache_key = make_key(image, _cache_namespace())
+        faces = _cached_faces(cache_key)
+        if faces is not None:
+            return faces
+        image = decode_image(image)
+    else:
+        image = decode_image(image)
+    
+    store = cache_key is not None and app is None
+    app = app or load_insightface_model()
+    faces = app.get(image.pixels)
+    
+    if image.scale != 1.0:
+        for face in faces:
+            face.bbox = face.bbox * image.scale
+            if getattr(face, 'kps', None) is not None:
+                face.kps = face.kps * image.scale
+        if RECROP_MIN_FACE:
+            _recrop_small_faces(app, image, faces)
+    
+    if store:
+        _store_faces(cache_key, faces)
+    
+    return faces
+
+
+def _face_area(face) -> float:
+    return float((face.bbox[2] - face.bbox[0]) * (face.bbox[3] - face.bbox[1]))
+
+
+def extract_all_faces(
+    image_bytes: Union[bytes, np.ndarray, DecodedImage, CachedFaces],
+    min_face_size: int = 0,
+    min_det_score: float = 0.0,
+    max_faces: Optional[int] = None
+) -> List[Dict]:
+    """
+    Return every detected face with its embedding from a single detection pass.
+    
+    Unlike generate_face_embedding, group photos are not discarded: each face
+    that passes the filters is returned, largest first.
+    
+    Args:
+        image_bytes: Raw image bytes (JPEG, PNG, etc.), a decode_image() or load_detection_input() result
+        min_face_size: Skip faces whose shorter bbox side is below this (pixels)
+        min_det_score: Skip faces with detection confidence below this
+        max_faces: Keep at most this many faces (largest first)
+    
+    Returns:
+        List of dicts with:
+            - embedding: 512-dim numpy array (float32, L2 normalized)
+            - bbox: Bounding box [x1, y1, x2, y2]
+            - landmarks: Five (x, y) keypoints (eyes, nose, mouth corners)
+            - det_score: Detection confidence (0-1)
+    """
+    faces = _detect_faces(image_bytes)
+    
+    kept = []
+    for face in faces:
+        width = face.bbox[2] - face.bbox[0]
+        height = face.bbox[3] - face.bbox[1]
+        if min(width, height) < min_face_size or face.det_score < min_det_score:
+            continue
+        if face.embedding is None:
+            continue
+        kept.append(face)
+    
+    kept.sort(key=_face_area, reverse=True)
+    if max_faces is not None:
+        kept = kept[:max_faces]
+    
+    logging.info(f"Extracted {len(kept)} of {len(faces)} detected faces")
+    
+    return [
+        {
+            'embedding': face.embedding,
+            'bbox': face.bbox.tolist(),
+            'landmarks': face.kps.tolist() if getattr(face, 'kps', None) is not None else None,
+            'det_score': float(face.det_score)
+        }
+        for face in kept
+    ]
+
+
+def count_faces(
+    image_bytes: Union[bytes, np.ndarray, DecodedImage, CachedFaces],
+    min_face_size: int = 0,
+    min_det_score: float = 0.0
+) -> int:
+    """
+    Count faces with the detector only (no recognition model is run).
+    
+    Args:
+        image_bytes: Raw image bytes, a decode_image() or load_detection_input() result
+        min_face_size: Ignore faces whose shorter bbox side is below this (pixels)
+        min_det_score: Ignore faces with detection confidence below this
+    
+    Returns:
+        Number of faces passing the filters
+    """
+    faces = _detect_faces(image_bytes, app=load_insightface_model(allowed_modules=DETECTION_ONLY))
+    return sum(
+        1 for face in faces
+        if min(face.bbox[2] - face.bbox[0], face.bbox[3] - face.bbox[1]) >= min_face_size
+        and face.det_score >= min_det_score
+    )
+
+
 def generate_face_embedding(
-    image_bytes: bytes,
+    image_bytes: Union[bytes, np.ndarray, DecodedImage, CachedFaces],
     max_faces: int = 3
 ) -> Optional[Dict]:
     """
@@ -72,8 +419,10 @@ def generate_face_embedding(
     - Skip if more than max_faces (likely irrelevant group photo)
     - Select the largest face (by bounding box area) as the main subject
     
+    Use extract_all_faces to index every face of a group photo instead.
+    
     Args:
-        image_bytes: Raw image bytes (JPEG, PNG, etc.)
+        image_bytes: Raw image bytes (JPEG, PNG, etc.), a decode_image() or load_detection_input() result
         max_faces: Maximum allowed faces (default 3, skip if more)
     
     Returns:
@@ -85,19 +434,8 @@ def generate_face_embedding(
         Or None if no suitable face found
     """
     try:
-        # Load model if not already loaded
-        app = load_insightface_model()
-        
-        # Convert bytes to numpy array (OpenCV format)
-        image = Image.open(BytesIO(image_bytes))
-        image_np = np.array(image)
-        
-        # Convert RGB to BGR (OpenCV uses BGR)
-        if len(image_np.shape) == 3 and image_np.shape[2] == 3:
-            image_np = cv2.cvtColor(image_np, cv2.COLOR_RGB2BGR)
-        
         # Detect all faces
-        faces = app.get(image_np)
+        faces = _detect_faces(image_bytes)
         
         if len(faces) == 0:
             logging.info("No faces detected in image")
@@ -109,7 +447,7 @@ def generate_face_embedding(
             return None
         
         # Select the largest face (by bounding box area)
-        largest_face = max(faces, key=lambda f: (f.bbox[2] - f.bbox[0]) * (f.bbox[3] - f.bbox[1]))
+        largest_face = max(faces, key=_face_area)
         
         # Extract embedding (already 512-dim, L2 normalized by InsightFace)
         embedding = largest_face.embedding
@@ -158,70 +496,276 @@ def cosine_similarity(embedding1: np.ndarray, embedding2: np.ndarray) -> float:
     return float(similarity)
 
 
-def match_face_against_embeddings(
+def normalize_embeddings(embeddings: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize embeddings row-wise (or a single vector).
+    
+    Zero vectors are left as zeros rather than producing NaNs.
+    
+    Args:
+        embeddings: (N, D) matrix or (D,) vector
+    
+    Returns:
+        New float32 array with unit-length rows
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(embeddings / norms, dtype=np.float32)
+
+
+def group_by_person(person_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Precompute the person-sorted layout used for segment aggregation.
+    
+    Args:
+        person_ids: PersonID per stored embedding row
+    
+    Returns:
+        Tuple of:
+            - order: row indices sorted by PersonID (stable)
+            - starts: offset of each person's segment within order
+            - counts: number of rows per person segment
+    """
+    person_ids = np.asarray(person_ids)
+    order = np.argsort(person_ids, kind='stable')
+    sorted_ids = person_ids[order]
+    
+    if len(sorted_ids) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return order, empty, empty
+    
+    boundaries = np.flatnonzero(sorted_ids[1:] != sorted_ids[:-1]) + 1
+    starts = np.concatenate(([0], boundaries)).astype(np.int64)
+    counts = np.diff(np.append(starts, len(sorted_ids))).astype(np.int64)
+    return order, starts, counts
+
+
+def _aggregate_person_scores(
+    scores: np.ndarray,
+    groups: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    top_n: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute per-person top-N average and max similarity with segment operations.
+    
+    Args:
+        scores: Similarity per stored row, shape (N,) or (Q, N) for Q queries
+        groups: Output of group_by_person for the same rows
+        top_n: Number of best scores averaged per person
+    
+    Returns:
+        (averages, maxima) per person segment, as float64 with shape (P,) or (Q, P)
+    """
+    order, starts, counts = groups
+    segment = np.repeat(np.arange(len(starts)), counts)
+    
+    # Sort scores descending within each person segment. Cosine scores lie in
+    # [-1, 1], so offsetting each segment by 4 gives a single sort key that
+    # keeps segments apart (much cheaper than a two-key lexsort).
+    sorted_scores = scores[..., order].astype(np.float64)
+    ranked = np.take_along_axis(
+        sorted_scores, np.argsort(segment * 4.0 - sorted_scores, axis=-1), axis=-1
+    )
+    
+    rank = np.arange(len(segment)) - starts[segment]
+    top_sums = np.add.reduceat(np.where(rank < top_n, ranked, 0.0), starts, axis=-1)
+    
+    averages = top_sums / np.minimum(counts, top_n)
+    maxima = ranked[..., starts]
+    return averages, maxima
+
+
+def _select_matches(
+    averages: np.ndarray,
+    maxima: np.ndarray,
+    groups: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    person_ids: np.ndarray,
+    person_names: np.ndarray,
+    threshold: float,
+    top_k: Optional[int]
+) -> List[Dict]:
+    """Filter persons by threshold and return the best top_k as match dicts."""
+    order, starts, counts = groups
+    candidates = np.flatnonzero(averages >= threshold)
+    
+    # Partial selection: only the top_k candidates get fully sorted
+    if top_k is not None and top_k < len(candidates):
+        if top_k <= 0:
+            return []
+        keep = np.argpartition(-averages[candidates], top_k - 1)[:top_k]
+        candidates = candidates[keep]
+    
+    candidates = candidates[np.argsort(-averages[candidates], kind='stable')]
+    first_rows = order[starts[candidates]]
+    
+    return [
+        {
+            'personId': int(person_ids[row]),
+            'personName': person_names[row],
+            'similarity': float(averages[seg]),
+            'maxSimilarity': float(maxima[seg]),
+            'embeddingCount': int(counts[seg])
+        }
+        for seg, row in zip(candidates, first_rows)
+    ]
+
+
+def row_segments(groups: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> np.ndarray:
+    """
+    Map each stored row to its person segment index.
+    
+    Args:
+        groups: Output of group_by_person
+    
+    Returns:
+        Array with the segment index of every row (in original row order)
+    """
+    order, starts, counts = groups
+    segments = np.empty(len(order), dtype=np.int64)
+    segments[order] = np.repeat(np.arange(len(starts)), counts)
+    return segments
+
+
+def subset_person_rows(
+    groups: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    segments: np.ndarray
+) -> Tuple[np.ndarray, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Collect every row belonging to the given person segments.
+    
+    Used to rescore a shortlist of persons exactly, so their top-3 averages
+    match a full scan.
+    
+    Args:
+        groups: Output of group_by_person for the full gallery
+        segments: Person segment indices to keep
+    
+    Returns:
+        (rows, sub_groups): gallery row indices grouped by person, and the
+        group_by_person layout for those rows taken in that order
+    """
+    order, starts, counts = groups
+    segments = np.asarray(segments, dtype=np.int64)
+    
+    if len(segments) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, (empty, empty, empty)
+    
+    sub_counts = counts[segments]
+    sub_starts = np.concatenate(([0], np.cumsum(sub_counts)[:-1])).astype(np.int64)
+    
+    # Position of each kept row inside the person-sorted order
+    offsets = np.arange(sub_counts.sum()) - np.repeat(sub_starts, sub_counts)
+    rows = order[np.repeat(starts[segments], sub_counts) + offsets]
+    
+    return rows, (np.arange(len(rows)), sub_starts, sub_counts)
+
+
+def match_faces_against_matrix(
+    query_embeddings: np.ndarray,
+    embeddings: np.ndarray,
+    person_ids: np.ndarray,
+    person_names: np.ndarray,
+    thresholds: Union[float, Sequence[float]] = 0.3,
+    top_ks: Union[Optional[int], Sequence[Optional[int]]] = None,
+    groups: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None,
+    normalized: bool = False
+) -> List[List[Dict]]:
+    """
+    Match several query embeddings against a gallery matrix in one pass.
+    
+    Scores all queries with a single matrix-matrix product, then aggregates
+    per person (top-3 average and max) over person-sorted segments.
+    
+    Args:
+        query_embeddings: (Q, 512) query embeddings
+        embeddings: (N, 512) float32 gallery matrix
+        person_ids: PersonID per row
+        person_names: PersonName per row
+        thresholds: Minimum similarity, one value for all queries or one per query
+        top_ks: Max persons returned, one value for all queries or one per query (None = all)
+        groups: Precomputed group_by_person(person_ids), to skip regrouping
+        normalized: True if gallery rows are already L2-normalized
+    
+    Returns:
+        One list of matches per query, sorted by similarity, each with:
+            - personId, personName, similarity, maxSimilarity, embeddingCount
+    """
+    queries = normalize_embeddings(np.atleast_2d(query_embeddings))
+    num_queries = len(queries)
+    
+    if isinstance(thresholds, (int, float)):
+        thresholds = [thresholds] * num_queries
+    if top_ks is None or isinstance(top_ks, int):
+        top_ks = [top_ks] * num_queries
+    
+    if len(embeddings) == 0:
+        return [[] for _ in range(num_queries)]
+    
+    if not normalized:
+        embeddings = normalize_embeddings(embeddings)
+    if groups is None:
+        groups = group_by_person(person_ids)
+    
+    scores = queries @ embeddings.T
+    averages, maxima = _aggregate_person_scores(scores, groups, TOP_N_AVERAGE)
+    
+    return [
+        _select_matches(
+            averages[q], maxima[q], groups,
+            person_ids, person_names, thresholds[q], top_ks[q]
+        )
+        for q in range(num_queries)
+    ]
+
+
+def match_face_against_matrix(
     query_embedding: np.ndarray,
-    stored_embeddings: List[Dict],
-    threshold: float = 0.3
+    embeddings: np.ndarray,
+    person_ids: np.ndarray,
+    person_names: np.ndarray,
+    threshold: float = 0.3,
+    top_k: Optional[int] = None,
+    groups: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None,
+    normalized: bool = False
 ) -> List[Dict]:
     """
-    Match a query face embedding against stored embeddings.
+    Match a query embedding against a gallery matrix in one vectorized pass.
     
-    Uses cosine similarity with per-person aggregation (top-3 average).
+    Scores every row with a single matrix-vector product, then aggregates
+    per person (top-3 average and max) over person-sorted segments.
     
     Args:
         query_embedding: 512-dim query embedding
-        stored_embeddings: List of dicts with PersonID, PersonName, Embedding (512-dim JSON array)
+        embeddings: (N, 512) float32 gallery matrix
+        person_ids: PersonID per row
+        person_names: PersonName per row
         threshold: Minimum similarity threshold (default 0.3 for cosine similarity)
+        top_k: Return only the best top_k persons (default: all above threshold)
+        groups: Precomputed group_by_person(person_ids), to skip regrouping
+        normalized: True if gallery rows are already L2-normalized
     
     Returns:
         List of matches sorted by similarity, each with:
-            - personId, personName, similarity, embeddingCount
+            - personId, personName, similarity, maxSimilarity, embeddingCount
     """
     try:
-        # Group embeddings by person
-        scores_by_person = {}
+        if len(embeddings) == 0:
+            return []
         
-        for stored in stored_embeddings:
-            person_id = stored['PersonID']
-            person_name = stored['PersonName']
-            embedding_json = stored['Embedding']
-            
-            # Parse embedding from JSON
-            stored_embedding = np.array(embedding_json, dtype=np.float32)
-            
-            # Calculate cosine similarity
-            similarity = cosine_similarity(query_embedding, stored_embedding)
-            
-            # Group by person
-            if person_id not in scores_by_person:
-                scores_by_person[person_id] = {
-                    'personId': person_id,
-                    'personName': person_name,
-                    'scores': []
-                }
-            
-            scores_by_person[person_id]['scores'].append(similarity)
-        
-        # Calculate top-3 average for each person
-        TOP_N = 3
-        person_matches = []
+        if not normalized:
+            embeddings = normalize_embeddings(embeddings)
+        if groups is None:
+            groups = group_by_person(person_ids)
         
-        for person_id, data in scores_by_person.items():
-            scores = sorted(data['scores'], reverse=True)  # Sort descending
-            top_scores = scores[:min(TOP_N, len(scores))]
-            avg_similarity = sum(top_scores) / len(top_scores)
-            
-            person_matches.append({
-                'personId': data['personId'],
-                'personName': data['personName'],
-                'similarity': avg_similarity,
-                'maxSimilarity': scores[0],
-                'embeddingCount': len(scores)
-            })
+        query = normalize_embeddings(query_embedding)
+        scores = embeddings @ query
         
-        # Sort by similarity and filter by threshold
-        person_matches.sort(key=lambda x: x['similarity'], reverse=True)
-        matches = [m for m in person_matches if m['similarity'] >= threshold]
+        averages, maxima = _aggregate_person_scores(scores, groups, TOP_N_AVERAGE)
+        matches = _select_matches(
+            averages, maxima, groups, person_ids, person_names, threshold, top_k
+        )
         
         logging.info(f"Found {len(matches)} matches above threshold {threshold}")
         return matches
@@ -229,3 +773,37 @@ def match_face_against_embeddings(
     except Exception as e:
         logging.error(f"Error matching faces: {e}")
         return []
+
+
+def match_face_against_embeddings(
+    query_embedding: np.ndarray,
+    stored_embeddings: List[Dict],
+    threshold: float = 0.3
+) -> List[Dict]:
+    """
+    Match a query face embedding against stored embeddings.
+    
+    Uses cosine similarity with per-person aggregation (top-3 average).
+    Convenience wrapper over match_face_against_matrix for list-of-dict input.
+    
+    Args:
+        query_embedding: 512-dim query embedding
+        stored_embeddings: List of dicts with PersonID, PersonName, Embedding
+            (512-dim array, JSON string or binary-format bytes)
+        threshold: Minimum similarity threshold (default 0.3 for cosine similarity)
+    
+    Returns:
+        List of matches sorted by similarity, each with:
+            - personId, personName, similarity, embeddingCount
+    """
+    if not stored_embeddings:
+        logging.info(f"Found 0 matches above threshold {threshold}")
+        return []
+    
+    embeddings = np.vstack([decode_embedding(stored['Embedding']) for stored in stored_embeddings])
+    person_ids = np.array([stored['PersonID'] for stored in stored_embeddings])
+    person_names = np.array([stored['PersonName'] for stored in stored_embeddings], dtype=object)
+    
+    return match_face_against_matrix(
+        query_embedding, embeddings, person_ids, person_names, threshold=threshold
+    )
@@ -0,0 +1,141 @@
+"""
+Worker start-up for the InsightFace model.
+
+Function modules call start_background_load() at import time, so the model
+is loaded and warmed up on a daemon thread while the worker is starting
+instead of inside the first request. get_readiness() reports progress for
+the model-ready endpoint, and record_embedding() logs the process's
+time-to-first-embedding once.
+
+A failed load is retried by the next forced start_background_load() once
+its backoff has passed (doubling per consecutive failure). Readiness is
+taken from the loaded-model cache, so a model loaded later by a request
+counts as ready too.
+
+Configuration (environment variables):
+    INSIGHTFACE_EAGER_LOAD: Load the model at worker start (default true)
+    INSIGHTFACE_LOAD_RETRY_SECONDS: Backoff after the first failed load (default 30; capped at 10 minutes)
+"""
+
+import os
+import time
+import logging
+import threading
+import numpy as np
+from typing import Dict, Optional
+
+from shared_python.insightface_utils import MODEL_PACK, _configured_modules, is_model_loaded, load_insightface_model
+from shared_python.onnx_sessions import get_session_stats
+from shared_python.embedding_cache import get_embedding_cache_stats
+
+LOAD_RETRY_SECONDS = float(os.environ.get('INSIGHTFACE_LOAD_RETRY_SECONDS', '30'))
+LOAD_RETRY_MAX_SECONDS = 600.0
+
+# Close enough to worker start: function modules are imported while the host starts the worker
+_PROCESS_STARTED = time.monotonic()
+
+_state = {
+    'status': 'idle',  # idle -> loading -> ready | failed
+    'pack': MODEL_PACK,
+    'loadMs': None,
+    'warmupMs': None,
+    'timeToFirstEmbeddingMs': None,
+    'error': None,
+    'failures': 0,
+}
+_state_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+_retry_at = 0.0
+
+
+def warm_up(app):
+    """
+    Run one synthetic inference through the detector and the recognizer.
+
+    The first run of an ONNX session allocates buffers and picks kernels;
+    doing it here keeps that cost out of the first real request. A blank
+    image has no faces, so the recognizer is called directly.
+    """
+    app.get(np.zeros((640, 640, 3), dtype=np.uint8))
+
+    recognizer = app.models.get('recognition')
+    if recognizer is not None:
+        recognizer.get_feat(np.zeros((112, 112, 3), dtype=np.uint8))
+
+
+def _load_and_warm_up():
+    global _thread, _retry_at
+
+    try:
+        started = time.perf_counter()
+        app = load_insightface_model()
+        load_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        started = time.perf_counter()
+        warm_up(app)
+        warmup_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        with _state_lock:
+            _state.update(status='ready', loadMs=load_ms, warmupMs=warmup_ms, error=None, failures=0)
+        logging.info(f"InsightFace model ready: load {load_ms} ms, warm-up {warmup_ms} ms")
+    except Exception as e:
+        with _state_lock:
+            _state.update(status='failed', error=str(e), failures=_state['failures'] + 1)
+            backoff = min(LOAD_RETRY_SECONDS * 2 ** (_state['failures'] - 1), LOAD_RETRY_MAX_SECONDS)
+            _retry_at = time.monotonic() + backoff
+            # Let a later forced start retry
+            _thread = None
+        logging.error(f"Background model load failed: {e}; retry allowed in {backoff:.0f}s")
+
+
+def start_background_load(force: bool = False):
+    """
+    Load and warm up the configured model on a daemon thread.
+
+    Does nothing if a load is running or succeeded, or if INSIGHTFACE_EAGER_LOAD
+    is false and force is not set. After a failed load only a forced call
+    retries, and only once the backoff has passed. Requests arriving earlier
+    simply wait on the model lock in load_insightface_model.
+    """
+    global _thread
+
+    if not force and os.environ.get('INSIGHTFACE_EAGER_LOAD', 'true').lower() not in ('1', 'true', 'yes'):
+        return
+
+    with _state_lock:
+        if _thread is not None:
+            return
+        if _state['status'] == 'failed' and (not force or time.monotonic() < _retry_at):
+            return
+        _state['status'] = 'loading'
+        _thread = threading.Thread(target=_load_and_warm_up, name='insightface-load', daemon=True)
+        _thread.start()
+
+
+def record_embedding():
+    """Log time-to-first-embedding (ms since worker start) the first time it is called."""
+    with _state_lock:
+        if _state['timeToFirstEmbeddingMs'] is not None:
+            return
+        elapsed_ms = round((time.monotonic() - _PROCESS_STARTED) * 1000, 1)
+        _state['timeToFirstEmbeddingMs'] = elapsed_ms
+
+    logging.info(f"Metric time_to_first_embedding_ms={elapsed_ms}")
+
+
+def get_readiness() -> Dict:
+    """Load status, timings, configuration and cache stats for the readiness endpoint."""
+    modules = _configured_modules()
+    with _state_lock:
+        readiness = dict(_state)
+
+    # A request may have loaded the model after (or instead of) the background load;
+    # while the background load is still warming up the model is not ready yet
+    readiness['ready'] = readiness['status'] != 'loading' and is_model_loaded()
+    if readiness['ready']:
+        readiness['status'] = 'ready'
+    readiness['modules'] = list(modules) if modules else 'all'
+    readiness['uptimeMs'] = round((time.monotonic() - _PROCESS_STARTED) * 1000, 1)
+    readiness['onnxCache'] = get_session_stats()
+    readiness['embeddingCache'] = get_embedding_cache_stats()
+    return readiness
@@ -0,0 +1,149 @@
+"""
+ONNX Runtime session tuning for InsightFace models.
+
+insightface creates one InferenceSession per .onnx file with ONNX Runtime
+defaults and re-runs graph optimization on every cold start. While
+tuned_sessions() is active, those sessions are instead created with
+configured SessionOptions, and the optimized graph of each model is saved
+to a local cache directory so later workers load it with optimization
+disabled.
+
+Configuration (environment variables):
+    ORT_INTRA_OP_THREADS: Threads used inside an operator (default 0 = ONNX Runtime default)
+    ORT_INTER_OP_THREADS: Threads used across operators (default 0 = ONNX Runtime default)
+    ORT_GRAPH_OPTIMIZATION_LEVEL: disable | basic | extended | all (default all)
+    INSIGHTFACE_ORT_CACHE_DIR: Where optimized graphs are kept (default <tmp>/insightface-ort-cache;
+        empty disables the cache). Keep it on local disk: 'all' may produce
+        CPU-specific graphs.
+"""
+
+import os
+import logging
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import onnxruntime
+from insightface.model_zoo import model_zoo
+
+_LEVELS = {
+    'disable': onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+_stats = {'cache_hits': 0, 'cache_writes': 0, 'cache_errors': 0}
+
+# Config of the tuned_sessions() block in progress, if any
+_active_config: Optional[Dict] = None
+
+
+def get_session_config() -> Dict:
+    """Session settings from the environment (see module docstring)."""
+    level = os.environ.get('ORT_GRAPH_OPTIMIZATION_LEVEL', 'all').lower()
+    if level not in _LEVELS:
+        logging.warning(f"Unknown ORT_GRAPH_OPTIMIZATION_LEVEL '{level}', using 'all'")
+        level = 'all'
+
+    return {
+        'intra_op_threads': int(os.environ.get('ORT_INTRA_OP_THREADS', '0')),
+        'inter_op_threads': int(os.environ.get('ORT_INTER_OP_THREADS', '0')),
+        'optimization_level': level,
+        'cache_dir': os.environ.get(
+            'INSIGHTFACE_ORT_CACHE_DIR',
+            os.path.join(tempfile.gettempdir(), 'insightface-ort-cache')
+        ),
+    }
+
+
+def make_session_options(config: Dict, level: Optional[str] = None) -> onnxruntime.SessionOptions:
+    """SessionOptions for config, optionally overriding the optimization level."""
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = _LEVELS[level or config['optimization_level']]
+    if config['intra_op_threads'] > 0:
+        options.intra_op_num_threads = config['intra_op_threads']
+    if config['inter_op_threads'] > 0:
+        options.inter_op_num_threads = config['inter_op_threads']
+    return options
+
+
+def _cache_path(config: Dict, model_path: str) -> Optional[str]:
+    """Cache file for a model, keyed by file size, ONNX Runtime version and level."""
+    if not config['cache_dir'] or config['optimization_level'] == 'disable':
+        return None
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    size = os.path.getsize(model_path)
+    return os.path.join(
+        config['cache_dir'],
+        f"{name}-{size}-ort{onnxruntime.__version__}-{config['optimization_level']}.onnx"
+    )
+
+
+def _init_session(session, model_path: str, config: Dict, kwargs: Dict):
+    """Initialize an InferenceSession from the cached optimized graph, or build and cache it."""
+    cache_path = _cache_path(config, model_path)
+
+    if cache_path and os.path.exists(cache_path):
+        try:
+            options = make_session_options(config, level='disable')
+            onnxruntime.InferenceSession.__init__(session, cache_path, sess_options=options, **kwargs)
+            _stats['cache_hits'] += 1
+            return
+        except Exception as e:
+            _stats['cache_errors'] += 1
+            logging.warning(f"Ignoring unusable optimized graph {cache_path}: {e}")
+            try:
+                os.remove(cache_path)
+            except OSError:
+                pass
+
+    options = make_session_options(config)
+    tmp_path = None
+    if cache_path:
+        os.makedirs(config['cache_dir'], exist_ok=True)
+        # Written under a per-process name and renamed, so concurrent workers never see a partial file
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        options.optimized_model_filepath = tmp_path
+
+    onnxruntime.InferenceSession.__init__(session, model_path, sess_options=options, **kwargs)
+
+    if tmp_path and os.path.exists(tmp_path):
+        os.replace(tmp_path, cache_path)
+        _stats['cache_writes'] += 1
+        logging.info(f"Saved optimized ONNX graph to {cache_path}")
+
+
+class TunedInferenceSession(model_zoo.PickableInferenceSession):
+    """insightface's picklable session, created with the configured options and cache."""
+
+    def __init__(self, model_path, **kwargs):
+        _init_session(self, model_path, _active_config or get_session_config(), kwargs)
+        self.model_path = model_path
+
+
+@contextmanager
+def tuned_sessions(config: Optional[Dict] = None):
+    """
+    Apply configured SessionOptions and the optimized-graph cache to insightface
+    model loads made inside the with-block (e.g. FaceAnalysis(...)).
+
+    The model file path seen by insightface is unchanged, so it can still read
+    the original graph for input normalization. Callers serialize model loads
+    (see load_insightface_model), so swapping the module attribute is safe.
+    """
+    global _active_config
+
+    original = model_zoo.PickableInferenceSession
+    _active_config = config or get_session_config()
+    model_zoo.PickableInferenceSession = TunedInferenceSession
+    try:
+        yield _active_config
+    finally:
+        model_zoo.PickableInferenceSession = original
+        _active_config = None
+
+
+def get_session_stats() -> Dict:
+    """Optimized-graph cache hits/writes/errors for this process."""
+    return dict(_stats)
@@ -0,0 +1,206 @@
+"""
+Two-stage identify with per-person prototypes.
+
+Every person in the gallery gets a prototype: the L2-normalized centroid of
+their embeddings plus a few exemplars, stored embeddings picked to cover the
+ways the person looks unlike the centroid (childhood photos, profile shots).
+A query is first scored against the prototypes only, which is P * (1 + E)
+dot products instead of N. The `shortlist` persons with the best prototype
+score are then rescored exactly over all of their stored embeddings, so the
+top-3 average reported for a match is identical to the brute-force result;
+the prototype stage can only cause a person to be missed, never mis-scored.
+
+When embeddings are added, replaced or removed, only the prototypes of
+the persons involved are recomputed (from their rows alone); everyone
+else's carries over.
+"""
+
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from shared_python.insightface_utils import (
+    match_faces_against_matrix,
+    normalize_embeddings,
+    subset_person_rows
+)
+
+DEFAULT_EXEMPLARS = 3
+
+
+def _pick_exemplars(rows: np.ndarray, centroid: np.ndarray, count: int) -> np.ndarray:
+    """
+    Farthest-point selection: repeatedly take the embedding least similar to
+    the centroid and the exemplars picked so far.
+
+    Returns (count, D); persons with fewer embeddings are padded with the
+    centroid, which never changes a max-score.
+    """
+    picked = np.repeat(centroid[None, :], count, axis=0)
+    if len(rows) <= count:
+        picked[:len(rows)] = rows
+        return picked
+
+    closest = rows @ centroid
+    for i in range(count):
+        best = int(np.argmin(closest))
+        picked[i] = rows[best]
+        closest = np.maximum(closest, rows @ rows[best])
+    return picked
+
+
+class PersonPrototypes:
+    """
+    Centroid and exemplars of every person in a gallery.
+
+    Persons are kept in ascending PersonID order, which is also the segment
+    order of group_by_person, so prototype i describes gallery segment i.
+    Instances are immutable: with_changes() returns a new object, so each
+    gallery snapshot can carry its own prototypes without locking.
+
+    Args:
+        person_ids: (P,) ascending unique PersonIDs
+        centroids: (P, D) normalized mean embedding per person
+        exemplars: (P, E, D) exemplar embeddings per person
+    """
+
+    def __init__(self, person_ids: np.ndarray, centroids: np.ndarray, exemplars: np.ndarray):
+        self.person_ids = person_ids
+        self.centroids = centroids
+        self.exemplars = exemplars
+        self._exemplar_matrix = exemplars.reshape(-1, exemplars.shape[-1])
+
+    def __len__(self) -> int:
+        return len(self.person_ids)
+
+    @property
+    def num_exemplars(self) -> int:
+        return self.exemplars.shape[1]
+
+    @staticmethod
+    def _compute(
+        embeddings: np.ndarray,
+        groups: Tuple[np.ndarray, np.ndarray, np.ndarray],
+        segments: np.ndarray,
+        centroids: np.ndarray,
+        exemplars: np.ndarray
+    ):
+        """Fill centroids/exemplars of the given person segments from their gallery rows."""
+        order, starts, counts = groups
+        for p in segments:
+            rows = embeddings[order[starts[p]:starts[p] + counts[p]]]
+            centroids[p] = normalize_embeddings(rows.sum(axis=0, dtype=np.float64))
+            exemplars[p] = _pick_exemplars(rows, centroids[p], exemplars.shape[1])
+
+    @classmethod
+    def build(
+        cls,
+        embeddings: np.ndarray,
+        person_ids: np.ndarray,
+        groups: Tuple[np.ndarray, np.ndarray, np.ndarray],
+        exemplars: int = DEFAULT_EXEMPLARS
+    ) -> 'PersonPrototypes':
+        """Compute prototypes for a whole gallery (rows normalized, groups = group_by_person(person_ids))."""
+        order, starts, counts = groups
+        num_persons, dimensions = len(starts), embeddings.shape[1]
+
+        centroids = np.empty((num_persons, dimensions), dtype=np.float32)
+        picked = np.empty((num_persons, exemplars, dimensions), dtype=np.float32)
+        cls._compute(embeddings, groups, range(num_persons), centroids, picked)
+        return cls(np.asarray(person_ids)[order[starts]].astype(np.int64), centroids, picked)
+
+    def with_changes(
+        self,
+        embeddings: np.ndarray,
+        person_ids: np.ndarray,
+        groups: Tuple[np.ndarray, np.ndarray, np.ndarray],
+        changed_person_ids: np.ndarray
+    ) -> 'PersonPrototypes':
+        """
+        Return prototypes for the gallery after embeddings were added, replaced or removed.
+
+        Only the persons in changed_person_ids (the old and new PersonID of
+        every touched row) are recomputed; everyone else's prototype is
+        carried over. Persons left without embeddings disappear.
+
+        Args:
+            embeddings, person_ids, groups: The gallery after the change
+            changed_person_ids: PersonIDs whose embeddings changed
+        """
+        order, starts, counts = groups
+        new_person_ids = np.asarray(person_ids)[order[starts]].astype(np.int64)
+        dimensions = embeddings.shape[1]
+
+        centroids = np.empty((len(new_person_ids), dimensions), dtype=np.float32)
+        exemplars = np.empty((len(new_person_ids), self.num_exemplars, dimensions), dtype=np.float32)
+        kept = np.zeros(len(new_person_ids), dtype=bool)
+        if len(self.person_ids):
+            old = np.minimum(np.searchsorted(self.person_ids, new_person_ids), len(self.person_ids) - 1)
+            kept = self.person_ids[old] == new_person_ids
+            centroids[kept] = self.centroids[old[kept]]
+            exemplars[kept] = self.exemplars[old[kept]]
+
+        kept[np.isin(new_person_ids, np.asarray(changed_person_ids, dtype=np.int64))] = False
+        self._compute(embeddings, groups, np.flatnonzero(~kept), centroids, exemplars)
+        return PersonPrototypes(new_person_ids, centroids, exemplars)
+
+    def score(self, query_embeddings: np.ndarray) -> np.ndarray:
+        """(Q, P) prototype score: best of the centroid and exemplar similarities."""
+        centroid_scores = query_embeddings @ self.centroids.T
+        exemplar_scores = (query_embeddings @ self._exemplar_matrix.T).reshape(
+            len(query_embeddings), len(self), self.num_exemplars
+        )
+        return np.maximum(centroid_scores, exemplar_scores.max(axis=2))
+
+    def shortlist(self, query_embeddings: np.ndarray, size: int) -> np.ndarray:
+        """(Q, min(size, P)) person segments with the best prototype scores per query."""
+        scores = self.score(query_embeddings)
+        if size >= len(self):
+            return np.broadcast_to(np.arange(len(self)), scores.shape)
+        return np.argpartition(-scores, size - 1, axis=1)[:, :size]
+
+
+def match_faces_prototypes(
+    query_embeddings: np.ndarray,
+    embeddings: np.ndarray,
+    person_ids: np.ndarray,
+    person_names: np.ndarray,
+    groups: Tuple[np.ndarray, np.ndarray, np.ndarray],
+    prototypes: PersonPrototypes,
+    thresholds: Sequence[float],
+    top_ks: Sequence[Optional[int]],
+    shortlist: int
+) -> List[List[Dict]]:
+    """
+    Match queries by shortlisting persons on their prototypes, then rescoring exactly.
+
+    Args:
+        query_embeddings: (Q, D) query embeddings
+        embeddings: (N, D) normalized gallery matrix
+        person_ids, person_names: Per-row person data
+        groups: group_by_person(person_ids)
+        prototypes: Prototypes of the same gallery
+        thresholds, top_ks: Per-query threshold and result limit
+        shortlist: Persons rescored exactly per query
+
+    Returns:
+        One list of matches per query, same format as match_faces_against_matrix
+    """
+    queries = normalize_embeddings(np.atleast_2d(query_embeddings))
+    if len(prototypes) == 0:
+        return [[] for _ in range(len(queries))]
+
+    results = []
+    for q, segments in enumerate(prototypes.shortlist(queries, max(1, shortlist))):
+        rows, sub_groups = subset_person_rows(groups, np.sort(segments))
+        results.append(match_faces_against_matrix(
+            queries[q:q + 1],
+            embeddings[rows],
+            person_ids[rows],
+            person_names[rows],
+            thresholds=thresholds[q],
+            top_ks=top_ks[q],
+            groups=sub_groups,
+            normalized=True
+        )[0])
+
+    return results
@@ -0,0 +1,189 @@
+"""
+Perceptual hashes for near-duplicate photo detection.
+
+Two 64-bit hashes per image, both computed on a small grayscale copy so
+re-encoded, resized and re-scanned copies of a photo land within a few bits
+of each other:
+
+- dHash: sign of the horizontal gradient on a 9x8 thumbnail
+- pHash: sign of the 8x8 lowest-frequency DCT coefficients of a 32x32
+  thumbnail relative to their median
+
+HashIndex finds every stored hash within a Hamming radius without scanning
+them all (multi-index hashing): each hash is split into radius + 1 chunks,
+and by the pigeonhole principle any hash within the radius matches the query
+exactly on at least one chunk, so only the entries sharing a chunk with the
+query are compared.
+
+Hashes are unsigned 64-bit ints in Python; SQL Server stores them as BIGINT
+(see to_signed64 / from_signed64).
+"""
+
+import numpy as np
+from io import BytesIO
+from typing import Dict, Hashable, List, Optional, Tuple
+from PIL import Image, ImageOps
+
+HASH_BITS = 64
+DEFAULT_RADIUS = 6
+
+# 32x32 orthonormal DCT-II basis; only its first 8 rows are needed for pHash
+_DCT_SIZE = 32
+_DCT = (np.sqrt(2 / _DCT_SIZE) * np.cos(
+    np.pi * (2 * np.arange(_DCT_SIZE)[None, :] + 1) * np.arange(8)[:, None] / (2 * _DCT_SIZE)
+)).astype(np.float64)
+_DCT[0] /= np.sqrt(2)
+
+_BIT_WEIGHTS = 1 << np.arange(HASH_BITS - 1, -1, -1, dtype=np.uint64)
+
+
+def _pack_bits(bits: np.ndarray) -> int:
+    """64 booleans (most significant first) -> unsigned int."""
+    return int((bits.ravel().astype(np.uint64) * _BIT_WEIGHTS).sum())
+
+
+def _grayscale(image: Image.Image, size: Tuple[int, int]) -> np.ndarray:
+    return np.asarray(image.resize(size, Image.LANCZOS), dtype=np.float64)
+
+
+def load_grayscale(image_bytes: bytes) -> Image.Image:
+    """
+    Decode image bytes to a small upright grayscale image for hashing.
+
+    JPEGs are decoded in draft mode (DCT-domain downscale), which makes
+    hashing cost a fraction of a full decode. EXIF orientation is applied so
+    a rotated copy hashes like the original.
+    """
+    image = Image.open(BytesIO(image_bytes))
+    image.draft('L', (128, 128))
+    image = ImageOps.exif_transpose(image)
+    return image.convert('L')
+
+
+def dhash(image: Image.Image) -> int:
+    """Difference hash of a grayscale image."""
+    pixels = _grayscale(image, (9, 8))
+    return _pack_bits(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(image: Image.Image) -> int:
+    """DCT hash of a grayscale image."""
+    pixels = _grayscale(image, (_DCT_SIZE, _DCT_SIZE))
+    low = _DCT @ pixels @ _DCT.T
+    # The DC term only encodes overall brightness, keep it out of the median
+    median = np.median(low.ravel()[1:])
+    return _pack_bits(low > median)
+
+
+def compute_hashes(image_bytes: bytes) -> Tuple[int, int]:
+    """(dHash, pHash) of encoded image bytes."""
+    image = load_grayscale(image_bytes)
+    return dhash(image), phash(image)
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits."""
+    return bin(a ^ b).count('1')
+
+
+def to_signed64(value: int) -> int:
+    """Unsigned 64-bit hash -> BIGINT value."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def from_signed64(value: int) -> int:
+    """BIGINT value -> unsigned 64-bit hash."""
+    return value + (1 << 64) if value < 0 else value
+
+
+class HashIndex:
+    """
+    Multi-index hash table for Hamming-radius lookups of 64-bit hashes.
+
+    The hash is split into radius + 1 chunks with one dict per chunk
+    (chunk value -> entry positions). A lookup gathers the entries that
+    share at least one chunk with the query and verifies their full
+    distance, so cost grows with the number of near candidates instead of
+    the number of entries.
+
+    Args:
+        radius: Largest distance query() supports
+    """
+
+    def __init__(self, radius: int = DEFAULT_RADIUS):
+        if not 0 <= radius < HASH_BITS:
+            raise ValueError(f"radius must be between 0 and {HASH_BITS - 1}")
+        self.radius = radius
+        chunks = radius + 1
+        bounds = [HASH_BITS * i // chunks for i in range(chunks + 1)]
+        self._chunks = [(lo, (1 << (hi - lo)) - 1) for lo, hi in zip(bounds, bounds[1:])]
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in self._chunks]
+        self._keys: List[Hashable] = []
+        self._hashes: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: Hashable, value: int):
+        position = len(self._keys)
+        self._keys.append(key)
+        self._hashes.append(value)
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            table.setdefault((value >> shift) & mask, []).append(position)
+
+    def query(self, value: int, radius: Optional[int] = None) -> List[Tuple[Hashable, int]]:
+        """(key, distance) of every entry within radius, closest first."""
+        radius = self.radius if radius is None else radius
+        if radius > self.radius:
+            raise ValueError(f"radius {radius} exceeds the index radius {self.radius}")
+
+        candidates = set()
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            candidates.update(table.get((value >> shift) & mask, ()))
+
+        matches = []
+        for position in candidates:
+            distance = hamming(value, self._hashes[position])
+            if distance <= radius:
+                matches.append((self._keys[position], distance))
+        matches.sort(key=lambda match: match[1])
+        return matches
+
+
+def find_duplicates(
+    hashes: List[Tuple[Hashable, int, int]],
+    radius: int = DEFAULT_RADIUS,
+    dhash_radius: Optional[int] = None
+) -> Dict[Hashable, Hashable]:
+    """
+    Map every near-duplicate to the original it copies.
+
+    Items are taken in the given order (earliest first); an item whose pHash
+    is within radius of an original, and whose dHash is within dhash_radius
+    of it as well, becomes that original's duplicate. Only originals are
+    indexed, so similar photos never chain into one group through a series
+    of small differences.
+
+    Args:
+        hashes: (key, dHash, pHash) in canonical order
+        radius: pHash distance for a duplicate
+        dhash_radius: dHash distance for a duplicate (default 2 * radius)
+
+    Returns:
+        {duplicate key: original key}
+    """
+    dhash_radius = 2 * radius if dhash_radius is None else dhash_radius
+    index = HashIndex(radius)
+    dhashes = {}
+    duplicates = {}
+    for key, d, p in hashes:
+        original = next(
+            (match for match, _ in index.query(p) if hamming(d, dhashes[match]) <= dhash_radius),
+            None
+        )
+        if original is None:
+            index.add(key, p)
+            dhashes[key] = d
+        else:
+            duplicates[key] = original
+    return duplicates
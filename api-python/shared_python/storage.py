@@ -0,0 +1,165 @@
+"""
+Blob storage access layer.
+
+Keeps one BlobServiceClient per connection string (the client and its HTTP
+connection pool are thread-safe and meant to be reused), parses account
+credentials once, and signs read SAS tokens per container instead of per
+blob. A container token is reused until shortly before it would no longer
+cover the lifetime a caller asked for, so signing N blob URLs costs at most
+one HMAC.
+
+Container-scoped tokens grant read access to every blob in the container,
+not just the one in the URL; they are only handed to trusted services
+(e.g. Azure Face API) and are never writable.
+"""
+
+import os
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from azure.storage.blob import BlobServiceClient, ContainerSasPermissions, generate_container_sas
+
+# Extra validity added to every signed container token; a cached token is
+# reused as long as it still covers the requested lifetime
+SAS_REUSE_WINDOW = timedelta(minutes=int(os.environ.get('STORAGE_SAS_REUSE_MINUTES', '15')))
+
+_clients: Dict[str, BlobServiceClient] = {}
+_credentials: Dict[str, Tuple[str, str, str]] = {}
+_sas_tokens: Dict[Tuple[str, str, str], Tuple[str, datetime]] = {}
+_lock = threading.Lock()
+
+_sas_stats = {'signed': 0, 'reused': 0}
+
+
+def get_service_client(connection_string: str) -> BlobServiceClient:
+    """Return the shared BlobServiceClient for a connection string."""
+    client = _clients.get(connection_string)
+    if client is None:
+        with _lock:
+            client = _clients.get(connection_string)
+            if client is None:
+                client = BlobServiceClient.from_connection_string(connection_string)
+                _clients[connection_string] = client
+    return client
+
+
+def get_account_credentials(connection_string: str) -> Tuple[str, str, str]:
+    """
+    Parse a storage connection string once.
+
+    Returns:
+        (account_name, account_key, blob_endpoint) where blob_endpoint has no trailing slash
+    """
+    credentials = _credentials.get(connection_string)
+    if credentials is not None:
+        return credentials
+
+    parts = dict(item.split('=', 1) for item in connection_string.split(';') if '=' in item)
+    account_name = parts.get('AccountName')
+    account_key = parts.get('AccountKey')
+
+    if not account_name or not account_key:
+        raise Exception('Could not extract account name and key from connection string')
+
+    blob_endpoint = parts.get('BlobEndpoint')
+    if not blob_endpoint:
+        suffix = parts.get('EndpointSuffix', 'core.windows.net')
+        blob_endpoint = f"https://{account_name}.blob.{suffix}"
+
+    credentials = (account_name, account_key, blob_endpoint.rstrip('/'))
+    _credentials[connection_string] = credentials
+    return credentials
+
+
+def get_container_sas(connection_string: str, container_name: str, expiry_hours: float = 1) -> str:
+    """
+    Read-only SAS token for a container, valid for at least expiry_hours.
+
+    Args:
+        connection_string: Storage connection string with AccountName/AccountKey
+        container_name: Container the token is scoped to
+        expiry_hours: Minimum remaining validity of the returned token
+
+    Returns:
+        SAS query string (without leading '?')
+    """
+    needed_until = datetime.utcnow() + timedelta(hours=expiry_hours)
+    key = (connection_string, container_name, 'r')
+
+    cached = _sas_tokens.get(key)
+    if cached is not None and cached[1] >= needed_until:
+        _sas_stats['reused'] += 1
+        return cached[0]
+
+    account_name, account_key, _ = get_account_credentials(connection_string)
+    expiry = needed_until + SAS_REUSE_WINDOW
+    token = generate_container_sas(
+        account_name=account_name,
+        container_name=container_name,
+        account_key=account_key,
+        permission=ContainerSasPermissions(read=True),
+        expiry=expiry
+    )
+
+    with _lock:
+        _sas_tokens[key] = (token, expiry)
+    _sas_stats['signed'] += 1
+    return token
+
+
+def sign_blob_url(connection_string: str, container_name: str, blob_name: str, expiry_hours: float = 1) -> str:
+    """Return a read URL for one blob using the (cached) container SAS token."""
+    _, _, blob_endpoint = get_account_credentials(connection_string)
+    sas_token = get_container_sas(connection_string, container_name, expiry_hours)
+    return f"{blob_endpoint}/{container_name}/{blob_name}?{sas_token}"
+
+
+def sign_many(
+    filenames: Iterable[str],
+    expiry_hours: float = 1,
+    container_name: Optional[str] = None,
+    connection_string: Optional[str] = None
+) -> Dict[str, str]:
+    """
+    Read URLs for many blobs with a single SAS token.
+
+    Defaults to the media container (AZURE_STORAGE_CONNECTION_STRING and
+    BLOB_CONTAINER_NAME), same as get_blob_with_sas.
+
+    Args:
+        filenames: Blob names
+        expiry_hours: Minimum validity of every URL
+        container_name: Container override
+        connection_string: Connection string override
+
+    Returns:
+        Dict of filename -> URL with SAS token
+    """
+    connection_string = connection_string or os.environ.get('AZURE_STORAGE_CONNECTION_STRING')
+    container_name = container_name or os.environ.get('BLOB_CONTAINER_NAME', 'family-album-media')
+
+    if not connection_string:
+        raise Exception('AZURE_STORAGE_CONNECTION_STRING environment variable not set')
+
+    _, _, blob_endpoint = get_account_credentials(connection_string)
+    sas_token = get_container_sas(connection_string, container_name, expiry_hours)
+    return {
+        filename: f"{blob_endpoint}/{container_name}/{filename}?{sas_token}"
+        for filename in filenames
+    }
+
+
+def get_sas_stats() -> Dict:
+    """Number of container tokens signed vs served from cache."""
+    return dict(_sas_stats)
+
+
+def clear_storage_cache():
+    """Forget cached clients, credentials and SAS tokens (e.g. after a key rotation)."""
+    with _lock:
+        _clients.clear()
+        _credentials.clear()
+        _sas_tokens.clear()
+    logging.info('Cleared cached storage clients and SAS tokens')
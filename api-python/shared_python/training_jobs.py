@@ -0,0 +1,221 @@
+"""
+Background Azure Face API PersonGroup training jobs.
+
+start_training() asks Azure to train and returns a job at once; a daemon
+thread then polls the training status with exponential backoff (with
+jitter) until it succeeds, fails or times out. Request threads never wait
+on training.
+
+Jobs are rows in dbo.FaceTrainingProgress (TrainingType 'FaceApiTrain',
+SessionID is the job ID), so any worker can answer a status request. The
+polling thread updates UpdatedAt on every poll as a heartbeat.
+
+Concurrent train requests are coalesced: while a job is in progress (and
+its heartbeat is recent) every request gets that job instead of starting
+another training run. A job whose heartbeat stopped (the worker running it
+was recycled) is settled by the next status read with a single Azure GET.
+
+Configuration (environment variables):
+    FACE_TRAIN_POLL_INITIAL_SECONDS: First status poll delay (default 1)
+    FACE_TRAIN_POLL_MAX_SECONDS: Longest delay between polls (default 30)
+    FACE_TRAIN_TIMEOUT_SECONDS: Give up on a job after this long (default 3600)
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from shared_python.utils import db_transaction, execute_db, query_db
+from shared_python.face_seeding import PERSON_GROUP_ID, FaceApiClient, get_face_api_client
+
+TRAINING_TYPE = 'FaceApiTrain'
+
+POLL_INITIAL_SECONDS = float(os.environ.get('FACE_TRAIN_POLL_INITIAL_SECONDS', '1'))
+POLL_MAX_SECONDS = float(os.environ.get('FACE_TRAIN_POLL_MAX_SECONDS', '30'))
+TIMEOUT_SECONDS = float(os.environ.get('FACE_TRAIN_TIMEOUT_SECONDS', '3600'))
+
+# A heartbeat older than this means the polling thread is gone
+_STALE_SECONDS = int(POLL_MAX_SECONDS * 3 + 30)
+
+# Job statuses (dbo.FaceTrainingProgress.Status -> API)
+_STATUSES = {'InProgress': 'running', 'Completed': 'succeeded', 'Failed': 'failed', 'Cancelled': 'cancelled'}
+
+_INSERT_JOB_SQL = """
+INSERT INTO dbo.FaceTrainingProgress (TrainingType)
+OUTPUT INSERTED.SessionID
+SELECT ?
+WHERE NOT EXISTS (
+    SELECT 1 FROM dbo.FaceTrainingProgress WITH (UPDLOCK, HOLDLOCK)
+    WHERE TrainingType = ? AND Status = 'InProgress'
+    AND UpdatedAt > DATEADD(SECOND, -?, GETDATE())
+)
+"""
+
+# Jobs whose polling worker went away before finishing
+_CANCEL_STALE_SQL = """
+UPDATE dbo.FaceTrainingProgress
+SET Status = 'Cancelled', ErrorMessage = 'Abandoned: no status poll', UpdatedAt = GETDATE()
+WHERE TrainingType = ? AND Status = 'InProgress'
+AND UpdatedAt <= DATEADD(SECOND, -?, GETDATE())
+"""
+
+_ACTIVE_JOB_SQL = """
+SELECT TOP 1 SessionID FROM dbo.FaceTrainingProgress
+WHERE TrainingType = ? AND Status = 'InProgress'
+AND UpdatedAt > DATEADD(SECOND, -?, GETDATE())
+ORDER BY StartedAt DESC
+"""
+
+_JOB_SQL = """
+SELECT SessionID, Status, StartedAt, CompletedAt, UpdatedAt, ErrorMessage,
+       DATEDIFF(SECOND, UpdatedAt, GETDATE()) AS HeartbeatAge
+FROM dbo.FaceTrainingProgress
+WHERE SessionID = ? AND TrainingType = ?
+"""
+
+_HEARTBEAT_SQL = """
+UPDATE dbo.FaceTrainingProgress SET UpdatedAt = GETDATE()
+WHERE SessionID = ? AND Status = 'InProgress'
+"""
+
+_COMPLETE_SQL = """
+UPDATE dbo.FaceTrainingProgress
+SET Status = ?, CompletedAt = GETDATE(), ErrorMessage = ?, UpdatedAt = GETDATE()
+WHERE SessionID = ? AND Status = 'InProgress'
+"""
+
+# Jobs polled by this process: job ID -> thread
+_pollers: Dict[int, threading.Thread] = {}
+_pollers_lock = threading.Lock()
+
+
+def _backoff_delays(initial: float, maximum: float):
+    """Exponential delays with +/-25% jitter, capped at maximum."""
+    delay = initial
+    while True:
+        yield min(delay, maximum) * random.uniform(0.75, 1.25)
+        delay *= 2
+
+
+def _complete(job_id: int, status: str, error: Optional[str] = None):
+    execute_db(_COMPLETE_SQL, (status, error, job_id))
+    logging.info(f"Training job {job_id}: {status}" + (f" ({error})" if error else ''))
+
+
+def _settle(job_id: int, azure_status: Dict) -> bool:
+    """Record a finished Azure training status on the job; False while still running."""
+    status = azure_status.get('status')
+    if status == 'succeeded':
+        _complete(job_id, 'Completed')
+        return True
+    if status == 'failed':
+        _complete(job_id, 'Failed', azure_status.get('message') or 'Training failed')
+        return True
+    return False
+
+
+def _poll(job_id: int, group_id: str, client: FaceApiClient):
+    """Poll Azure until the job finishes (runs on a daemon thread)."""
+    deadline = time.monotonic() + TIMEOUT_SECONDS
+    try:
+        for delay in _backoff_delays(POLL_INITIAL_SECONDS, POLL_MAX_SECONDS):
+            if time.monotonic() + delay > deadline:
+                _complete(job_id, 'Failed', f'Training did not finish within {TIMEOUT_SECONDS:.0f}s')
+                return
+            time.sleep(delay)
+            if _settle(job_id, client.training_status(group_id)):
+                return
+            execute_db(_HEARTBEAT_SQL, (job_id,))
+    except Exception as e:
+        logging.error(f"Training job {job_id}: polling failed: {e}")
+        try:
+            _complete(job_id, 'Failed', f'Polling failed: {e}')
+        except Exception as e2:
+            logging.error(f"Training job {job_id}: could not record failure: {e2}")
+    finally:
+        with _pollers_lock:
+            _pollers.pop(job_id, None)
+
+
+def start_training(
+    group_id: str = PERSON_GROUP_ID,
+    client_factory: Callable[[], FaceApiClient] = get_face_api_client
+) -> Tuple[Dict, bool]:
+    """
+    Start training group_id in the background, or join the run in progress.
+
+    Returns:
+        (job, coalesced): the job as returned by get_training_job, and True
+        if it was already running
+    """
+    with db_transaction():
+        execute_db(_CANCEL_STALE_SQL, (TRAINING_TYPE, _STALE_SECONDS))
+        rows = query_db(_INSERT_JOB_SQL, (TRAINING_TYPE, TRAINING_TYPE, _STALE_SECONDS))
+        if not rows:
+            rows = query_db(_ACTIVE_JOB_SQL, (TRAINING_TYPE, _STALE_SECONDS))
+            coalesced = True
+        else:
+            coalesced = False
+    job_id = rows[0]['SessionID']
+
+    if coalesced:
+        logging.info(f"Training already in progress, joining job {job_id}")
+        return get_training_job(job_id), True
+
+    client = client_factory()
+    try:
+        client.train(group_id)
+    except Exception as e:
+        _complete(job_id, 'Failed', f'Could not start training: {e}')
+        raise
+
+    thread = threading.Thread(
+        target=_poll, args=(job_id, group_id, client), name=f'face-train-{job_id}', daemon=True
+    )
+    with _pollers_lock:
+        _pollers[job_id] = thread
+    thread.start()
+    logging.info(f"Training job {job_id} started for PersonGroup '{group_id}'")
+    return get_training_job(job_id), False
+
+
+def get_training_job(
+    job_id: int,
+    group_id: str = PERSON_GROUP_ID,
+    client_factory: Callable[[], FaceApiClient] = get_face_api_client
+) -> Optional[Dict]:
+    """
+    Job status from the database (one indexed row read), or None if unknown.
+
+    If the job is in progress but nobody has polled it recently, Azure is
+    asked once and the result recorded.
+    """
+    rows = query_db(_JOB_SQL, (job_id, TRAINING_TYPE))
+    if not rows:
+        return None
+    row = rows[0]
+
+    with _pollers_lock:
+        polled_here = job_id in _pollers
+    if row['Status'] == 'InProgress' and not polled_here and row['HeartbeatAge'] > _STALE_SECONDS:
+        try:
+            if _settle(job_id, client_factory().training_status(group_id)):
+                row = query_db(_JOB_SQL, (job_id, TRAINING_TYPE))[0]
+            else:
+                execute_db(_HEARTBEAT_SQL, (job_id,))
+        except Exception as e:
+            logging.warning(f"Training job {job_id}: could not refresh stale job: {e}")
+
+    status = _STATUSES.get(row['Status'], row['Status'].lower())
+    return {
+        'jobId': row['SessionID'],
+        'status': status,
+        'done': status != 'running',
+        'startedAt': row['StartedAt'].isoformat() if row['StartedAt'] else None,
+        'completedAt': row['CompletedAt'].isoformat() if row['CompletedAt'] else None,
+        'updatedAt': row['UpdatedAt'].isoformat() if row['UpdatedAt'] else None,
+        'error': row['ErrorMessage'],
+    }
@@ -4,18 +4,20 @@ Provides database connection, storage access, and authentication
 """
 
 import os
+import re
 import pyodbc
 import logging
-from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions
-from datetime import datetime, timedelta
+import threading
+from collections import namedtuple
+
+from shared_python.cache import TTLCache
+from shared_python.db_pool import get_connection_string, get_pool
+from shared_python.storage import get_service_client, sign_blob_url, sign_many
 
 # Database connection string
 def get_db_connection():
-    """Create and return a database connection"""
-    connection_string = os.environ.get('AZURE_SQL_CONNECTIONSTRING')
-    
-    if not connection_string:
-        raise Exception('AZURE_SQL_CONNECTIONSTRING environment variable not set')
+    """Create and return a new, unpooled database connection (for long-running scripts)"""
+    connection_string = get_connection_string()
     
     try:
         conn = pyodbc.connect(connection_string)
@@ -24,11 +26,118 @@ def get_db_connection():
         logging.error(f"Database connection failed: {str(e)}")
         raise
 
-def query_db(sql, params=None):
-    """Execute a SELECT query and return results as list of dicts"""
-    conn = None
+def db_transaction(timeout=None):
+    """
+    Run several statements on one pooled connection and transaction
+    
+    query_db/execute_db calls inside the block share the connection; the
+    transaction commits when the block exits and rolls back if it raises.
+    
+        with db_transaction():
+            execute_db(sql1, params1)
+            execute_db(sql2, params2)
+    """
+    return get_pool().connection(timeout)
+
+ROW_FORMATS = ('dict', 'namedtuple', 'tuple', 'row')
+
+_ORDER_BY = re.compile(r'\border\s+by\b', re.IGNORECASE)
+# Clauses that cannot follow the final ORDER BY of a query
+_AFTER_ORDER_BY = re.compile(r'\b(select|from|where|group|having|union|except|intersect|offset)\b', re.IGNORECASE)
+_LITERALS_AND_COMMENTS = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/", re.DOTALL)
+
+def _top_level_sql(sql):
+    """sql without literals, comments and parenthesized parts (subqueries, OVER (...), CTE bodies)"""
+    sql = _LITERALS_AND_COMMENTS.sub(' ', sql)
+    depth = 0
+    kept = []
+    for char in sql:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth = max(depth - 1, 0)
+        elif depth == 0:
+            kept.append(char)
+    return ''.join(kept)
+
+def _ends_in_order_by(sql):
+    """True if the query's own (outermost) ORDER BY is its last clause"""
+    top_level = _top_level_sql(sql)
+    matches = list(_ORDER_BY.finditer(top_level))
+    return bool(matches) and not _AFTER_ORDER_BY.search(top_level, matches[-1].end())
+
+def _push_down_limit(sql, params, limit=None, offset=None):
+    """
+    Append OFFSET/FETCH so SQL Server returns only the requested rows
+    
+    T-SQL only allows OFFSET/FETCH after an ORDER BY, so the query must end
+    with one; queries without an order should use TOP (?) themselves.
+    """
+    if limit is None and not offset:
+        return sql, params
+    if not _ends_in_order_by(sql):
+        raise ValueError('limit/offset require a query ending in ORDER BY (use TOP (?) otherwise)')
+    
+    params = list(params or [])
+    sql = sql.rstrip().rstrip(';') + '\nOFFSET ? ROWS'
+    params.append(int(offset or 0))
+    if limit is not None:
+        sql += ' FETCH NEXT ? ROWS ONLY'
+        params.append(int(limit))
+    return sql, params
+
+def query_db(sql, params=None, limit=None, offset=None):
+    """
+    Execute a SELECT query and return results as list of dicts
+    
+    limit/offset are pushed down into the query as OFFSET/FETCH (see
+    _push_down_limit) instead of slicing the full result in Python.
+    """
+    sql, params = _push_down_limit(sql, params, limit, offset)
+    try:
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            
+            if params:
+                cursor.execute(sql, params)
+            else:
+                cursor.execute(sql)
+            
+            columns = [column[0] for column in cursor.description]
+            results = []
+            for row in cursor.fetchall():
+                results.append(dict(zip(columns, row)))
+            
+            cursor.close()
+            return results
+    except Exception as e:
+        logging.error(f"Query failed: {str(e)}")
+        raise
+
+def query_db_iter(sql, params=None, row_format='dict', batch_size=500, limit=None, offset=None):
+    """
+    Stream a SELECT query's rows in fetchmany batches (generator)
+    
+    Rows are yielded as they arrive instead of being collected first, so
+    memory stays flat on large results and the first row is available after
+    the first batch. row_format is 'dict' (like query_db), 'namedtuple',
+    'tuple' or 'row' (the pyodbc Row itself: no conversion, attribute access).
+    limit/offset are pushed down like in query_db.
+    
+    Uses its own pooled connection, not the one of an enclosing db_transaction:
+    SQL Server cannot run other statements on a connection while a result is
+    still being read. The connection is returned when the generator is
+    exhausted or closed; close it (or use contextlib.closing) to stop early.
+    
+        for photo in query_db_iter(sql, params, row_format='namedtuple'):
+            process(photo.PFileName)
+    """
+    if row_format not in ROW_FORMATS:
+        raise ValueError(f"row_format must be one of {', '.join(ROW_FORMATS)}")
+    sql, params = _push_down_limit(sql, params, limit, offset)
+    
+    conn = get_pool().acquire()
     try:
-        conn = get_db_connection()
         cursor = conn.cursor()
         
         if params:
@@ -37,79 +146,81 @@ def query_db(sql, params=None):
             cursor.execute(sql)
         
         columns = [column[0] for column in cursor.description]
-        results = []
-        for row in cursor.fetchall():
-            results.append(dict(zip(columns, row)))
+        if row_format == 'namedtuple':
+            row_type = namedtuple('Row', columns, rename=True)
+        
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            if row_format == 'dict':
+                for row in rows:
+                    yield dict(zip(columns, row))
+            elif row_format == 'namedtuple':
+                for row in rows:
+                    yield row_type._make(row)
+            elif row_format == 'tuple':
+                for row in rows:
+                    yield tuple(row)
+            else:
+                yield from rows
         
-        return results
+        cursor.close()
     except Exception as e:
         logging.error(f"Query failed: {str(e)}")
         raise
     finally:
-        if conn:
-            conn.close()
+        conn.close()
 
 def execute_db(sql, params=None):
-    """Execute an INSERT/UPDATE/DELETE query"""
-    conn = None
+    """Execute an INSERT/UPDATE/DELETE query (committed unless inside db_transaction)"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        if params:
-            cursor.execute(sql, params)
-        else:
-            cursor.execute(sql)
-        
-        conn.commit()
-        
-        # Return the number of affected rows
-        return cursor.rowcount
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            
+            if params:
+                cursor.execute(sql, params)
+            else:
+                cursor.execute(sql)
+            
+            # Return the number of affected rows
+            rowcount = cursor.rowcount
+            cursor.close()
+            return rowcount
     except Exception as e:
-        if conn:
-            conn.rollback()
         logging.error(f"Execute failed: {str(e)}")
         raise
-    finally:
-        if conn:
-            conn.close()
 
 def execute_db_with_identity(sql, params=None):
     """Execute an INSERT query and return the identity value"""
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        if params:
-            cursor.execute(sql, params)
-        else:
-            cursor.execute(sql)
-        
-        # Get the identity value
-        cursor.execute("SELECT @@IDENTITY AS id")
-        identity = cursor.fetchone()[0]
-        
-        conn.commit()
-        return identity
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            
+            if params:
+                cursor.execute(sql, params)
+            else:
+                cursor.execute(sql)
+            
+            # Get the identity value
+            cursor.execute("SELECT @@IDENTITY AS id")
+            identity = cursor.fetchone()[0]
+            
+            cursor.close()
+            return identity
     except Exception as e:
-        if conn:
-            conn.rollback()
         logging.error(f"Execute with identity failed: {str(e)}")
         raise
-    finally:
-        if conn:
-            conn.close()
 
 # Storage utilities
 def get_blob_service_client():
-    """Create and return a blob service client"""
+    """Return the shared blob service client for AzureWebJobsStorage"""
     connection_string = os.environ.get('AzureWebJobsStorage')
     
     if not connection_string:
         raise Exception('AzureWebJobsStorage environment variable not set')
     
-    return BlobServiceClient.from_connection_string(connection_string)
+    return get_service_client(connection_string)
 
 def download_blob(container_name, blob_name):
     """Download a blob and return its content as bytes"""
@@ -146,42 +257,93 @@ def upload_blob(container_name, blob_name, data, content_type=None):
         raise
 
 def generate_blob_url(container_name, blob_name, expiry_hours=1):
-    """Generate a SAS URL for a blob"""
+    """Generate a SAS URL for a blob (container token reused across calls)"""
     try:
-        blob_service_client = get_blob_service_client()
-        
-        # Extract account name and key from connection string
         connection_string = os.environ.get('AzureWebJobsStorage')
-        parts = dict(item.split('=', 1) for item in connection_string.split(';') if '=' in item)
-        account_name = parts.get('AccountName')
-        account_key = parts.get('AccountKey')
-        
-        if not account_name or not account_key:
-            raise Exception('Could not extract account name and key from connection string')
         
-        # Generate SAS token
-        sas_token = generate_blob_sas(
-            account_name=account_name,
-            container_name=container_name,
-            blob_name=blob_name,
-            account_key=account_key,
-            permission=BlobSasPermissions(read=True),
-            expiry=datetime.utcnow() + timedelta(hours=expiry_hours)
-        )
+        if not connection_string:
+            raise Exception('AzureWebJobsStorage environment variable not set')
         
-        # Construct URL
-        url = f"https://{account_name}.blob.core.windows.net/{container_name}/{blob_name}?{sas_token}"
-        return url
+        return sign_blob_url(connection_string, container_name, blob_name, expiry_hours)
     except Exception as e:
         logging.error(f"SAS URL generation failed: {str(e)}")
         raise
 
 # Authentication utilities
+
+# Role hierarchy: Admin > Full > Read
+ROLE_LEVELS = {'Admin': 3, 'Full': 2, 'Read': 1}
+
+# Role and status changes are made by the Node API, which cannot reach this
+# cache. A cached row is therefore only trusted to allow checks up to
+# AUTH_CACHE_MAX_ROLE; higher checks and every denial re-read dbo.Users
+AUTH_CACHE_MAX_ROLE = os.environ.get('AUTH_CACHE_MAX_ROLE', 'Read')
+
+# Users rows keyed by lower-cased email; unknown emails are not cached
+_user_cache = TTLCache(
+    max_entries=int(os.environ.get('AUTH_CACHE_MAX_ENTRIES', '1024')),
+    ttl=float(os.environ.get('AUTH_CACHE_TTL_SECONDS', '15')),
+    negative_ttl=0
+)
+# Checks allowed from a cached row, i.e. dbo.Users queries actually saved
+_cached_allows = 0
+_cached_allows_lock = threading.Lock()
+
+def _load_user(email):
+    """Fetch a Users row by email, or None if there is no such user"""
+    users = query_db(
+        "SELECT UserID, Email, Role, Status FROM dbo.Users WHERE Email = ?",
+        (email,)
+    )
+    if not users:
+        return None
+    
+    user = users[0]
+    # Resolve the role level once so checks on cache hits are a dict lookup
+    user['RoleLevel'] = ROLE_LEVELS.get(user['Role'], 0)
+    return user
+
+def invalidate_user_cache(email=None):
+    """
+    Drop cached authorization data for one user, or for everyone if email is None
+    
+    Call after changing a user's Role or Status in-process. Only this worker
+    process is affected; elsewhere, cached rows only ever allow checks up to
+    AUTH_CACHE_MAX_ROLE, for at most AUTH_CACHE_TTL_SECONDS.
+    """
+    _user_cache.invalidate(email.lower() if email else None)
+
+def get_user_cache_stats():
+    """Hit/miss counters for the authorization cache (each hit saved one dbo.Users query)"""
+    stats = _user_cache.stats()
+    # Hits on a row that would deny (or checks above AUTH_CACHE_MAX_ROLE) still query the database
+    with _cached_allows_lock:
+        stats['db_calls_saved'] = _cached_allows
+    return stats
+
+def _authorization_error(user, required_role):
+    """Why user (a Users row or None) may not act with required_role, or None if allowed"""
+    if user is None:
+        return 'User not found in database'
+    if user['Status'] != 'Active':
+        return f"User status is {user['Status']}"
+    if user['RoleLevel'] < ROLE_LEVELS.get(required_role, 0):
+        return f"Insufficient permissions. Required: {required_role}, User has: {user['Role']}"
+    return None
+
 def check_authorization(req, required_role='Read'):
     """
     Check if the user is authorized based on Azure Static Web Apps authentication
+    
+    A cached Users row (see AUTH_CACHE_* settings) is only used to allow checks
+    up to AUTH_CACHE_MAX_ROLE. Higher roles, and any check the cached row
+    would deny, read the current row, so a blocked or demoted user loses
+    Full/Admin access immediately and a newly approved one gains it.
+    
     Returns: (authorized: bool, user: dict, error: str)
     """
+    global _cached_allows
+    
     # Check for dev mode
     dev_mode = os.environ.get('DEV_MODE', '').lower() == 'true'
     
@@ -200,30 +362,24 @@ def check_authorization(req, required_role='Read'):
     if not user_id or not user_email:
         return (False, None, 'Not authenticated')
     
-    # Look up user in database
+    key = user_email.lower()
     try:
-        users = query_db(
-            "SELECT UserID, Email, Role, Status FROM dbo.Users WHERE Email = ?",
-            (user_email,)
-        )
-        
-        if not users:
-            return (False, None, 'User not found in database')
-        
-        user = users[0]
+        user = None
+        if ROLE_LEVELS.get(required_role, 0) <= ROLE_LEVELS.get(AUTH_CACHE_MAX_ROLE, 0):
+            user = _user_cache.get(key)
         
-        if user['Status'] != 'Active':
-            return (False, None, f"User status is {user['Status']}")
-        
-        user_role = user['Role']
-        
-        # Check role hierarchy: Admin > Full > Read
-        role_hierarchy = {'Admin': 3, 'Full': 2, 'Read': 1}
+        if user is None or _authorization_error(user, required_role):
+            user = _load_user(user_email)
+            _user_cache.set(key, user)
+        else:
+            with _cached_allows_lock:
+                _cached_allows += 1
         
-        if role_hierarchy.get(user_role, 0) < role_hierarchy.get(required_role, 0):
-            return (False, None, f"Insufficient permissions. Required: {required_role}, User has: {user_role}")
+        error = _authorization_error(user, required_role)
+        if error:
+            return (False, None, error)
         
-        return (True, user, None)
+        return (True, dict(user), None)
     
     except Exception as e:
         logging.error(f"Authorization check failed: {str(e)}")
@@ -233,6 +389,9 @@ def get_blob_with_sas(filename, expiry_hours=1):
     """
     Get blob URL with SAS token for temporary access
     
+    The SAS token is container-scoped and cached, so repeated calls do not
+    re-sign; use storage.sign_many() to sign a whole batch of filenames.
+    
     Args:
         filename: Name of the file in blob storage
         expiry_hours: Hours until SAS token expires (default: 1)
@@ -240,29 +399,8 @@ def get_blob_with_sas(filename, expiry_hours=1):
     Returns:
         str: Full URL with SAS token for Azure Face API to access
     """
-    connection_string = os.environ.get('AZURE_STORAGE_CONNECTION_STRING')
-    container_name = os.environ.get('BLOB_CONTAINER_NAME', 'family-album-media')
-    
-    if not connection_string:
-        raise Exception('AZURE_STORAGE_CONNECTION_STRING environment variable not set')
-    
     try:
-        blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-        
-        # Generate SAS token for read access
-        sas_token = generate_blob_sas(
-            account_name=blob_service_client.account_name,
-            container_name=container_name,
-            blob_name=filename,
-            account_key=blob_service_client.credential.account_key,
-            permission=BlobSasPermissions(read=True),
-            expiry=datetime.utcnow() + timedelta(hours=expiry_hours)
-        )
-        
-        # Construct full URL with SAS token
-        blob_url = f"https://{blob_service_client.account_name}.blob.core.windows.net/{container_name}/{filename}?{sas_token}"
-        
-        return blob_url
+        return sign_many([filename], expiry_hours=expiry_hours)[filename]
     except Exception as e:
         logging.error(f"Failed to generate SAS URL for {filename}: {str(e)}")
         raise
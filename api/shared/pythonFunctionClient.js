@@ -124,6 +124,21 @@ async function reviewFace(data, context = null) {
     );
 }
 
+/**
+ * Confirm or reject several face suggestions in one request and transaction
+ * @param {Array<Object>} actions - Items like { faceId, action: 'confirm'|'reject', personId }
+ * @param {Object} context - Azure Function context
+ * @returns {Promise<Object>} { applied, failed, results: [{ index, success, error? }] }
+ */
+async function reviewFaces(actions, context = null) {
+    return callPythonFunction(
+        '/api/faces/review',
+        'POST',
+        { actions },
+        context
+    );
+}
+
 /**
  * Trigger training to regenerate person encodings
  * @param {Object} context - Azure Function context
@@ -157,6 +172,7 @@ module.exports = {
     detectFaces,
     getPendingFaces,
     reviewFace,
+    reviewFaces,
     trainFaces,
     getImageFaces,
     callPythonFunction
@@ -751,8 +751,9 @@ export default function AdminSettings({ onRequestsChange }: AdminSettingsProps)
             }
             
             embeddingArray = generateData.embedding;
-            modelVersion = 'insightface-arcface';
-            embeddingDimensions = 512;
+            // Reflects the server's configured model pack (buffalo_l -> 'insightface-arcface')
+            modelVersion = generateData.modelVersion || 'insightface-arcface';
+            embeddingDimensions = generateData.dimensions || 512;
             
           } else {
             // Use face-api.js (128-dim, browser-based)
@@ -0,0 +1,60 @@
+-- Add compact binary storage for face embeddings alongside the JSON column
+-- EmbeddingBinary holds an 8-byte header + raw little-endian float32/float16 values
+-- (see api-python/shared_python/embedding_codec.py). Python readers prefer it and
+-- fall back to the JSON Embedding column for rows that have not been converted.
+-- Existing rows are converted by api-python/scripts/backfill_embedding_binary.py
+
+-- Step 1: Add the nullable binary column
+IF NOT EXISTS (SELECT * FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = 'FaceEmbeddings' AND COLUMN_NAME = 'EmbeddingBinary')
+BEGIN
+    ALTER TABLE FaceEmbeddings
+    ADD EmbeddingBinary VARBINARY(MAX) NULL;
+    PRINT 'Added EmbeddingBinary column';
+END
+ELSE
+BEGIN
+    PRINT 'EmbeddingBinary column already exists';
+END
+GO
+
+-- Step 2: Index to find rows still waiting for conversion (used by the backfill)
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_FaceEmbeddings_Unconverted')
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_FaceEmbeddings_Unconverted
+    ON FaceEmbeddings(ID)
+    WHERE EmbeddingBinary IS NULL;
+    PRINT 'Added index IX_FaceEmbeddings_Unconverted';
+END
+ELSE
+BEGIN
+    PRINT 'Index IX_FaceEmbeddings_Unconverted already exists';
+END
+GO
+
+-- Step 3: Writers that only update the JSON column (e.g. api/faces-add-embedding)
+-- would otherwise leave a stale binary copy behind; clear it so readers use the JSON
+IF OBJECT_ID('dbo.TR_FaceEmbeddings_ClearStaleBinary', 'TR') IS NOT NULL
+    DROP TRIGGER dbo.TR_FaceEmbeddings_ClearStaleBinary;
+GO
+
+CREATE TRIGGER dbo.TR_FaceEmbeddings_ClearStaleBinary
+ON dbo.FaceEmbeddings
+AFTER UPDATE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    IF UPDATE(Embedding) AND NOT UPDATE(EmbeddingBinary)
+    BEGIN
+        UPDATE fe
+        SET EmbeddingBinary = NULL
+        FROM dbo.FaceEmbeddings fe
+        INNER JOIN inserted i ON fe.ID = i.ID
+        WHERE fe.EmbeddingBinary IS NOT NULL;
+    END
+END;
+GO
+
+PRINT '';
+PRINT '✅ Migration completed successfully!';
+PRINT 'Run api-python/scripts/backfill_embedding_binary.py to convert existing rows';
+GO
@@ -0,0 +1,40 @@
+-- Add ClusterID to FaceEncodings
+-- api-python/scripts/cluster_faces.py groups unlabeled faces (PersonID IS NULL)
+-- by identity and stores the group here, so faces-review can list clusters
+-- and confirm a whole cluster as one person. Each run numbers its clusters
+-- above every ID used before, so a confirm sent with a stale ID matches
+-- nothing instead of another run's cluster.
+
+IF NOT EXISTS (
+    SELECT * FROM INFORMATION_SCHEMA.COLUMNS
+    WHERE TABLE_NAME = 'FaceEncodings'
+    AND COLUMN_NAME = 'ClusterID'
+)
+BEGIN
+    ALTER TABLE dbo.FaceEncodings
+    ADD ClusterID INT NULL;
+    PRINT 'Added ClusterID column to FaceEncodings';
+END
+ELSE
+BEGIN
+    PRINT 'ClusterID column already exists';
+END
+GO
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_FaceEncodings_ClusterID')
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_FaceEncodings_ClusterID
+    ON dbo.FaceEncodings(ClusterID)
+    INCLUDE (PersonID, PFileName)
+    WHERE ClusterID IS NOT NULL;
+    PRINT 'Added index IX_FaceEncodings_ClusterID';
+END
+ELSE
+BEGIN
+    PRINT 'Index IX_FaceEncodings_ClusterID already exists';
+END
+GO
+
+PRINT '';
+PRINT '✅ Migration completed successfully!';
+GO
@@ -0,0 +1,30 @@
+-- One FaceEmbeddings row per (PhotoFileName, PersonID, ModelVersion)
+-- api-python/shared_python/embedding_writer.py upserts on this key, so
+-- re-running an embedding job updates rows instead of adding copies. Existing
+-- duplicates are removed first, keeping the most recently updated row.
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'UX_FaceEmbeddings_Photo_Person_Model')
+BEGIN
+    WITH Ranked AS (
+        SELECT ROW_NUMBER() OVER (
+            PARTITION BY PhotoFileName, PersonID, ModelVersion
+            ORDER BY UpdatedDate DESC, ID DESC
+        ) AS rn
+        FROM dbo.FaceEmbeddings
+    )
+    DELETE FROM Ranked WHERE rn > 1;
+    PRINT CONCAT('Removed ', @@ROWCOUNT, ' duplicate FaceEmbeddings rows');
+
+    CREATE UNIQUE NONCLUSTERED INDEX UX_FaceEmbeddings_Photo_Person_Model
+    ON dbo.FaceEmbeddings(PhotoFileName, PersonID, ModelVersion);
+    PRINT 'Added unique index UX_FaceEmbeddings_Photo_Person_Model';
+END
+ELSE
+BEGIN
+    PRINT 'Unique index UX_FaceEmbeddings_Photo_Person_Model already exists';
+END
+GO
+
+PRINT '';
+PRINT '✅ Migration completed successfully!';
+GO
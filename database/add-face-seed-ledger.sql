@@ -0,0 +1,29 @@
+-- Ledger of faces added to Azure Face API PersonGroups
+-- api-python/shared_python/face_seeding.py records every persisted face as
+-- soon as Azure returns it, and leaves recorded (photo, person) pairs out of
+-- the next seeding run, so reruns do not add the same face again.
+
+IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'FaceSeedLedger')
+BEGIN
+    CREATE TABLE dbo.FaceSeedLedger (
+        PersonGroupID NVARCHAR(50) NOT NULL,
+        PersonID INT NOT NULL,  -- References NameEvent.ID
+        PFileName NVARCHAR(500) NOT NULL,
+        PersistedFaceID NVARCHAR(36) NOT NULL,  -- UUID from Azure Face API
+        CreatedDate DATETIME2 NOT NULL DEFAULT GETDATE(),
+
+        PRIMARY KEY (PersonGroupID, PersonID, PFileName),
+        FOREIGN KEY (PersonID) REFERENCES NameEvent(ID) ON DELETE CASCADE
+    );
+
+    PRINT 'Created FaceSeedLedger table';
+END
+ELSE
+BEGIN
+    PRINT 'FaceSeedLedger table already exists';
+END
+GO
+
+PRINT '';
+PRINT '✅ Migration completed successfully!';
+GO
@@ -0,0 +1,42 @@
+-- Perceptual hashes of pictures for near-duplicate detection
+-- api-python/scripts/compute_picture_hashes.py fills DHash/PHash for every
+-- image in dbo.Pictures and sets DuplicateOf to the original of each
+-- re-uploaded or re-scanned copy. Jobs can then leave copies out, e.g.
+-- scripts/reembed_gallery.py --skip-duplicates.
+
+IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'PictureHashes')
+BEGIN
+    CREATE TABLE dbo.PictureHashes (
+        PFileName NVARCHAR(500) NOT NULL PRIMARY KEY,
+        DHash BIGINT NOT NULL,  -- 64-bit hashes stored as signed BIGINT
+        PHash BIGINT NOT NULL,
+        DuplicateOf NVARCHAR(500) NULL,  -- PFileName of the original; NULL for originals
+        HashedDate DATETIME2 NOT NULL DEFAULT GETDATE(),
+
+        FOREIGN KEY (PFileName) REFERENCES dbo.Pictures(PFileName) ON DELETE CASCADE
+    );
+
+    PRINT 'Created PictureHashes table';
+END
+ELSE
+BEGIN
+    PRINT 'PictureHashes table already exists';
+END
+GO
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_PictureHashes_DuplicateOf')
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_PictureHashes_DuplicateOf
+    ON dbo.PictureHashes(DuplicateOf)
+    WHERE DuplicateOf IS NOT NULL;
+    PRINT 'Added index IX_PictureHashes_DuplicateOf';
+END
+ELSE
+BEGIN
+    PRINT 'Index IX_PictureHashes_DuplicateOf already exists';
+END
+GO
+
+PRINT '';
+PRINT '✅ Migration completed successfully!';
+GO
@@ -0,0 +1,38 @@
+-- Widen FaceTrainingProgress.LastProcessedPhoto to match Pictures.PFileName
+-- api-python/scripts/reembed_gallery.py stores its keyset checkpoint (the last
+-- committed PFileName) here; VARCHAR(255) would truncate or mangle long and
+-- non-ASCII file names and break resuming.
+
+IF EXISTS (
+    SELECT * FROM INFORMATION_SCHEMA.COLUMNS
+    WHERE TABLE_NAME = 'FaceTrainingProgress'
+    AND COLUMN_NAME = 'LastProcessedPhoto'
+    AND (DATA_TYPE <> 'nvarchar' OR CHARACTER_MAXIMUM_LENGTH < 500)
+)
+BEGIN
+    ALTER TABLE dbo.FaceTrainingProgress
+    ALTER COLUMN LastProcessedPhoto NVARCHAR(500) NULL;
+    PRINT 'Widened LastProcessedPhoto to NVARCHAR(500)';
+END
+ELSE
+BEGIN
+    PRINT 'LastProcessedPhoto is already NVARCHAR(500)';
+END
+GO
+
+-- Index for finding the in-progress session of a training type (resume)
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_FaceTrainingProgress_Type_Status')
+BEGIN
+    CREATE NONCLUSTERED INDEX IX_FaceTrainingProgress_Type_Status
+    ON dbo.FaceTrainingProgress(TrainingType, Status, StartedAt DESC);
+    PRINT 'Added index IX_FaceTrainingProgress_Type_Status';
+END
+ELSE
+BEGIN
+    PRINT 'Index IX_FaceTrainingProgress_Type_Status already exists';
+END
+GO
+
+PRINT '';
+PRINT '✅ Migration completed successfully!';
+GO
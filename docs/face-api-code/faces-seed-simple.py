@@ -6,12 +6,11 @@ import os
 
 # Add parent directory to path for shared utilities
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from shared_python.utils import check_authorization, query_db, get_blob_with_sas
-from shared_python.face_client import (
-    get_face_client, 
-    ensure_person_group_exists,
-    get_or_create_person,
-    add_face_from_blob_url,
+from shared_python.utils import check_authorization
+from shared_python.face_seeding import (
+    get_face_api_client,
+    pending_photos,
+    seed_faces,
     PERSON_GROUP_ID
 )
 
@@ -46,45 +45,8 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         max_per_person = None
     
     try:
-        # Initialize Face API
-        face_client = get_face_client()
-        ensure_person_group_exists(face_client)
-        
-        # Get tagged photos that haven't been added to Azure yet
-        if max_per_person:
-            # Baseline training: limit per person
-            query_sql = """
-            WITH RankedPhotos AS (
-                SELECT 
-                    p.PFileName,
-                    ne.ID as PersonID,
-                    ne.neName as PersonName,
-                    ROW_NUMBER() OVER (PARTITION BY ne.ID ORDER BY p.PYear DESC, p.PMonth DESC) as Rank
-                FROM dbo.Pictures p
-                INNER JOIN dbo.NamePhoto np ON p.PFileName = np.npFileName
-                INNER JOIN dbo.NameEvent ne ON np.npID = ne.ID
-                WHERE ne.neType = 'N' AND np.npID != 1
-            )
-            SELECT PFileName, PersonID, PersonName
-            FROM RankedPhotos
-            WHERE Rank <= ?
-            ORDER BY PersonID
-            """
-            photos = query_db(query_sql, (max_per_person,))
-        else:
-            # Full training: all photos
-            query_sql = """
-            SELECT DISTINCT
-                p.PFileName,
-                ne.ID as PersonID,
-                ne.neName as PersonName
-            FROM dbo.Pictures p
-            INNER JOIN dbo.NamePhoto np ON p.PFileName = np.npFileName
-            INNER JOIN dbo.NameEvent ne ON np.npID = ne.ID
-            WHERE ne.neType = 'N' AND np.npID != 1
-            ORDER BY ne.ID
-            """
-            photos = query_db(query_sql)
+        # Photos already in the seed ledger are left out, so reruns only add what is missing
+        photos = pending_photos(PERSON_GROUP_ID, limit=limit, max_per_person=max_per_person)
         
         if not photos:
             return func.HttpResponse(
@@ -98,51 +60,18 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
                 mimetype='application/json'
             )
         
-        # Process photos
-        photos_processed = 0
-        faces_added = 0
-        errors = 0
-        current_person_id = None
-        azure_person_id = None
+        # Initialize Face API
+        face_client = get_face_api_client()
+        face_client.ensure_person_group(PERSON_GROUP_ID)
         
-        for photo in photos[:limit]:
-            try:
-                filename = photo['PFileName']
-                person_id = photo['PersonID']
-                person_name = photo['PersonName']
-                
-                # Get or create Azure Person
-                if person_id != current_person_id:
-                    current_person_id = person_id
-                    azure_person_id = get_or_create_person(
-                        face_client, person_id, person_name, PERSON_GROUP_ID
-                    )
-                
-                # Get image URL with SAS token
-                image_url = get_blob_with_sas(filename)
-                
-                # Add face to Azure
-                result = add_face_from_blob_url(
-                    face_client, PERSON_GROUP_ID, azure_person_id, image_url
-                )
-                
-                if result['success']:
-                    faces_added += 1
-                    photos_processed += 1
-                else:
-                    errors += 1
-                    
-            except Exception as e:
-                logging.error(f"Failed {filename}: {str(e)}")
-                errors += 1
+        # Concurrent, rate-limited adds; each added face is recorded in the ledger
+        summary = seed_faces(face_client, photos, PERSON_GROUP_ID)
         
         return func.HttpResponse(
             json.dumps({
                 'success': True,
-                'message': f'Added {faces_added} faces',
-                'photosProcessed': photos_processed,
-                'facesAdded': faces_added,
-                'errors': errors
+                'message': f"Added {summary['facesAdded']} faces",
+                **summary
             }),
             status_code=200,
             mimetype='application/json'
@@ -6,11 +6,7 @@ import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from shared_python.utils import check_authorization
-from shared_python.face_client import (
-    get_face_client,
-    wait_for_training,
-    PERSON_GROUP_ID
-)
+from shared_python.training_jobs import start_training
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """
@@ -18,6 +14,10 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     
     POST /api/faces/train
     Body: { "quickTrain": true }  // Optional - not used by Azure, but kept for compatibility
+    
+    Returns 202 with a job ID as soon as Azure accepts the request; training
+    is polled in the background. Requests made while a run is in progress
+    join that run. Poll GET /api/faces/train/{jobId} for the result.
     """
     logging.info('Face training (Azure Face API) starting')
     
@@ -31,46 +31,20 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         )
     
     try:
-        # Initialize Face API client
-        face_client = get_face_client()
-        
-        # Start training
-        logging.info(f"Starting training for PersonGroup '{PERSON_GROUP_ID}'")
-        face_client.person_group.train(PERSON_GROUP_ID)
-        
-        # Wait for training to complete
-        result = wait_for_training(face_client, PERSON_GROUP_ID, timeout=300)
+        job, coalesced = start_training()
         
-        if result['status'] == 'succeeded':
-            logging.info("Training completed successfully")
-            return func.HttpResponse(
-                json.dumps({
-                    'success': True,
-                    'message': 'Training completed successfully'
-                }),
-                status_code=200,
-                mimetype='application/json'
-            )
-        elif result['status'] == 'timeout':
-            logging.warning("Training timed out")
-            return func.HttpResponse(
-                json.dumps({
-                    'success': False,
-                    'error': result['message']
-                }),
-                status_code=408,
-                mimetype='application/json'
-            )
-        else:  # failed
-            logging.error(f"Training failed: {result['message']}")
-            return func.HttpResponse(
-                json.dumps({
-                    'success': False,
-                    'error': result['message']
-                }),
-                status_code=500,
-                mimetype='application/json'
-            )
+        return func.HttpResponse(
+            json.dumps({
+                'success': True,
+                'message': 'Training already in progress' if coalesced else 'Training started',
+                'coalesced': coalesced,
+                'statusUrl': f"/api/faces/train/{job['jobId']}",
+                **job
+            }),
+            status_code=202,
+            headers={'Location': f"/api/faces/train/{job['jobId']}"},
+            mimetype='application/json'
+        )
             
     except Exception as e:
         logging.error(f"Training failed: {str(e)}")
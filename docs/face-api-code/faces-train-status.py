@@ -0,0 +1,62 @@
+import json
+import logging
+import azure.functions as func
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from shared_python.utils import check_authorization
+from shared_python.training_jobs import get_training_job
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Status of an Azure Face API training job started by faces-train
+    
+    GET /api/faces/train/{jobId}
+    
+    Reads one database row; polling Azure happens in the background on the
+    worker that started the job. Clients should poll with backoff until
+    "done" is true ("status": running, succeeded, failed or cancelled).
+    """
+    # Check authorization
+    authorized, user, error = check_authorization(req, 'Full')
+    if not authorized:
+        return func.HttpResponse(
+            json.dumps({'error': error}),
+            status_code=403,
+            mimetype='application/json'
+        )
+    
+    try:
+        job_id = int(req.route_params.get('jobId'))
+    except (TypeError, ValueError):
+        return func.HttpResponse(
+            json.dumps({'error': 'jobId must be an integer'}),
+            status_code=400,
+            mimetype='application/json'
+        )
+    
+    try:
+        job = get_training_job(job_id)
+        if job is None:
+            return func.HttpResponse(
+                json.dumps({'error': f'Training job {job_id} not found'}),
+                status_code=404,
+                mimetype='application/json'
+            )
+        
+        headers = {} if job['done'] else {'Retry-After': '5'}
+        return func.HttpResponse(
+            json.dumps(job),
+            status_code=200,
+            headers=headers,
+            mimetype='application/json'
+        )
+        
+    except Exception as e:
+        logging.error(f"Training status failed: {str(e)}")
+        return func.HttpResponse(
+            json.dumps({'error': f'Training status failed: {str(e)}'}),
+            status_code=500,
+            mimetype='application/json'
+        )